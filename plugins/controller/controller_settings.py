@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+
+from plugins.model.dataset_cache import DatasetCache
+
+
+@dataclass(frozen=True)
+class ControllerSettings:
+    """
+    Settings shared by the DataControllers of a plugin instance and their collaborators (SnapshotLoader, UploadStaging,
+    FollowedFile), built once from the plugin arguments.
+    \nAttributes:
+    cache_directory: folder of the persistent dataset cache. None disables the cache.
+    cache_max_bytes: size cap of the persistent dataset cache
+    memmap_directory: folder where loaded data is memory-mapped instead of held in memory
+    materialize_aggregates: precomputes every heatmap matrix at load time (eager) instead of on request (lazy)
+    aggregate_workers: threads used to materialize aggregates. None is one per core.
+    heatmap_cache_max_bytes: size budget of the cache of gathered heatmap matrices, per dataset
+    lod_max_models: maximum number of Models axis entries sent to the browser, models above it are binned. None disables it.
+    tile_threshold_cells: heatmaps with more cells are drawn from server-side image tiles. None disables tiling.
+    tile_cache_max_bytes: size budget of the tile pyramids kept for serving tiles, per dataset
+    heatmap_workers: threads building the heatmaps of the selected iterations. None is one per core.
+    staging_directory: folder where uploads parsed in the background are handed over when the dataset cache is disabled
+    upload_directory: folder where uploads are decoded into files, when large or loaded lazily. Only files in it are
+        loaded from upload ids (see UploadStaging.staged_file).
+    lazy_loading: indexes uploaded files and parses each iteration on its first request instead of the whole file.
+        Parsed iterations are held in memory, memmap_directory does not apply to them.
+    shared_directory: folder where loaded datasets are published for the other server processes, which attach them
+        without parsing nor copying them (see SharedDatasetStore). Lazily loaded and followed files are not shared.
+    shared_max_bytes: size cap of the shared datasets folder
+    follow_directory: folder holding the files that can be followed, files outside it are rejected. None disables following.
+    """
+    cache_directory: str = DatasetCache.DEFAULT_DIRECTORY
+    cache_max_bytes: int = DatasetCache.DEFAULT_MAX_BYTES
+    memmap_directory: str = None
+    materialize_aggregates: bool = False
+    aggregate_workers: int = None
+    heatmap_cache_max_bytes: int = 256 * 2**20
+    lod_max_models: int = 1000
+    tile_threshold_cells: int = None
+    tile_cache_max_bytes: int = 512 * 2**20
+    heatmap_workers: int = None
+    staging_directory: str = None
+    upload_directory: str = None
+    lazy_loading: bool = False
+    shared_directory: str = None
+    shared_max_bytes: int = 8 * 2**30
+    follow_directory: str = None
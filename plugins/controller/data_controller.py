@@ -1,19 +1,32 @@
 from enum import Enum, auto
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import threading
 
-from plugins.model.data_loader import DataLoader
+import numpy as np
+
+from plugins.controller.controller_settings import ControllerSettings
+from plugins.controller.followed_file import FollowedFile
+from plugins.controller.snapshot_loader import SnapshotLoader
 from plugins.model.heatmap_exception import HeatmapException
-from plugins.model.heatmap_data_formatter import HeatmapDataFormatter
+from plugins.model.heatmap_data_formatter import HeatmapDataFormatter, HeatmapDataMode
+from plugins.model.running_aggregates import RunningAggregates
+from plugins.model.lru_cache import LRUCache
 from plugins.model.heatmap_builder import HeatmapBuilder
 from plugins.model.filter_builder import FilterBuilder
 from plugins.model.filter_handler import FilterHandler
-from dash import html
+from plugins.model.level_of_detail import LevelOfDetail
+from plugins.model.tile_pyramid import TilePyramid
+from plugins.model.tiled_heatmap_builder import TiledHeatmapBuilder
+from dash import html, dcc
 
 class DataControllerState(Enum):
     """
     Enum representing the current state of the DataController.
     """
     NULL = auto()                # Initial state (no data loaded)
-    LOADING = auto()             # Transition between heatmaps
+    LOADING = auto()             # First data being loaded (reloads keep serving the previous data)
     WELLS_MODELS = auto()        # Heatmap: Wells vs Models
     ATTRIBUTES_MODELS = auto()   # Heatmap: Attributes vs Models
     WELLS_ATTRIBUTES = auto()    # Heatmap: Wells vs Attributes
@@ -21,29 +34,54 @@ class DataControllerState(Enum):
 
 class DataController:
     """
-    Controller class, responsible for interacting with the application on main.py and other classes
+    Controller class, responsible for interacting with the application on main.py and other classes.
+    Each instance holds one dataset: DatasetRegistry keeps one per dataset loaded by the browser sessions.
+    The dataset is held in an immutable DatasetSnapshot. Loads and refreshes build a new snapshot and swap it in,
+    one at a time; rendering reads the snapshot it started with, without locks, so concurrent callbacks
+    never see a dataset being replaced. Snapshots are built by a SnapshotLoader, or by a FollowedFile for followed files.
     """
-    initialized = False  # Initialization flag
+    HEATMAP_AXES = {
+        DataControllerState.WELLS_MODELS: ('Wells', 'Models'),
+        DataControllerState.ATTRIBUTES_MODELS: ('Attributes', 'Models'),
+        DataControllerState.WELLS_ATTRIBUTES: ('Wells', 'Attributes')
+    } # Heatmap type -> (index, columns)
 
-    def __init__(self):
-        self.data_loader = DataLoader()
+    def __init__(self, settings = ControllerSettings(), snapshot_loader = None, heatmap_executor = None):
+        """
+        \nArgs:
+        settings (ControllerSettings, optional): settings of the controller
+        snapshot_loader (SnapshotLoader, optional): loader shared by the controllers of the plugin. Default is a loader of its own.
+        heatmap_executor (ThreadPoolExecutor, optional): threads building heatmaps, shared by the controllers of the plugin
+            so concurrent callbacks never run more than its workers. Default is an executor of its own.
+        """
+        self.settings = settings
+        self.snapshot_loader = snapshot_loader or SnapshotLoader(settings)
+        self.snapshot = None # DatasetSnapshot of the loaded data, None when no data is loaded
+        self.lod_max_models = settings.lod_max_models
+        self.heatmap_cache = LRUCache(settings.heatmap_cache_max_bytes, lambda data: int(data.memory_usage(index=True, deep=True).sum()))
+        self.tile_threshold_cells = settings.tile_threshold_cells
+        self.tile_pyramids = LRUCache(settings.tile_cache_max_bytes, lambda pyramid: pyramid.get_memory_usage()) # pyramid id -> TilePyramid
+        self.tile_url = '/tiles' # Set by the view to the URL of its tile route
+        self.heatmap_executor = heatmap_executor or DataController.create_heatmap_executor(settings)
+        self.followed_file = None # FollowedFile of the dataset, see follow_file
+        self.initialized = False # Initialization flag
         self.__current_state = DataControllerState.NULL
+        self.__write_lock = threading.RLock() # Snapshots are built one at a time, a refresh may reload the followed file
         self.initialize()
 
     def initialize(self, load_sample = False):
         """
-        Static block that executes default get data from file
+        Initialization block that executes default get data from file
         """
-        if not DataController.initialized:
+        if not self.initialized:
             print(f"[{self.__class__.__name__}] [INITIALIZE]: Static block executed: DataController is being initialized.")
             if load_sample:
-                self.data_loader.get_data_from_file('C:\\Code\\Studies\\IC\\webviz_nqdsheatmap\\plugins\\fullsample.txt')
+                self.load_uploaded_data('C:\\Code\\Studies\\IC\\webviz_nqdsheatmap\\plugins\\fullsample.txt')
                 print(f"[{self.__class__.__name__}] [INITIALIZE]: Sample data loaded successfully.")
-                self.set_state(DataControllerState.READY)
             else:
                 print(f"[{self.__class__.__name__}] [INITIALIZE]: Controller initialized without sample data.")
                 self.set_state(DataControllerState.NULL)
-            DataController.initialized = True
+            self.initialized = True
 
     def get_state(self):
         """
@@ -60,17 +98,144 @@ class DataController:
         self.__current_state = new_state
         print(f"[{self.__class__.__name__}] [SET_STATE]: State updated to: {self.__current_state.name}")  # Update notification
 
+    @property
+    def data_loader(self):
+        """
+        DataLoader of the current snapshot, None when no data is loaded.
+        """
+        snapshot = self.snapshot
+        return snapshot.data_loader if snapshot is not None else None
 
-    def load_uploaded_data(self, filepath):
+    @property
+    def cache_key(self):
         """
-        Receives a filepath to a data file and processes it in DataLoader
+        Dataset cache key of the loaded data, when it can be restored from the cache.
+        """
+        snapshot = self.snapshot
+        return snapshot.cache_key if snapshot is not None else None
+
+
+    def load_uploaded_data(self, filepath, progress_callback = None, cache_key = None, remove_file = False, staging_key = None):
+        """
+        Receives a data file (path or content in memory) and loads it into a new snapshot (see SnapshotLoader.load).
+        Files already parsed before, or staged by background uploads, are restored from the dataset cache instead.
+        With a shared store, files loaded by any server process are attached from it, and other files are published to it.
+        With lazy loading, other files are indexed and only parsed iteration by iteration (see DataLoader.index_file).
+        \nArgs:
+        filepath (str or bytes-like): path to the data file, or its content. May be None when cache_key is given.
+        progress_callback (callable, optional): forwarded to DataLoader, called with (bytes_read, total_bytes, rows_loaded)
+        cache_key (str, optional): cache key of the file, when already computed
+        remove_file (bool, optional): removes the file at filepath once it is no longer needed, for uploaded files
+        staging_key (str, optional): key of the upload staged in the background, as returned by UploadStaging.stage
         """
         print(f"[{self.__class__.__name__}] [LOAD_UPLOADED_DATA]: Received uploaded data. Processing...")
-        self.set_state(DataControllerState.LOADING)
-        self.data_loader.clear_data()
-        self.data_loader.get_data_from_file(filepath)
-        print(f"[{self.__class__.__name__}] [LOAD_UPLOADED_DATA]: Data successfully processed")
-        self.set_state(DataControllerState.READY)
+        with self.__write_lock:
+            if self.snapshot is None:
+                self.set_state(DataControllerState.LOADING)
+            try:
+                snapshot = self.snapshot_loader.load(filepath, progress_callback, cache_key, remove_file, staging_key)
+                self.followed_file = None
+                self.publish(snapshot)
+                print(f"[{self.__class__.__name__}] [LOAD_UPLOADED_DATA]: Data successfully processed")
+            finally:
+                self.set_state(DataControllerState.READY if self.snapshot is not None else DataControllerState.NULL)
+
+
+    def follow_file(self, path):
+        """
+        Loads a local file that keeps growing, such as the output of a DA run in progress, and follows it:
+        refresh_followed_file then loads the lines appended to it since.
+        Only files inside the settings' follow_directory can be followed.
+        \nArgs:
+        path (str): path to the data file, relative to the follow directory or absolute
+        """
+        if self.settings.follow_directory is None:
+            raise HeatmapException("Following files is disabled, no follow directory is set")
+        path = FollowedFile.resolve(path, self.settings.follow_directory)
+        print(f"[{self.__class__.__name__}] [FOLLOW_FILE]: Following {path}")
+        with self.__write_lock:
+            if self.snapshot is None:
+                self.set_state(DataControllerState.LOADING)
+            try:
+                followed_file = FollowedFile(path, self.settings.memmap_directory)
+                snapshot = followed_file.load()
+                self.followed_file = followed_file
+                self.publish(snapshot)
+            finally:
+                self.set_state(DataControllerState.READY if self.snapshot is not None else DataControllerState.NULL)
+
+
+    def refresh_followed_file(self):
+        """
+        Loads the lines appended to the followed file since the last refresh (see FollowedFile.refresh). Only the iterations
+        receiving rows get a new revision, so cached matrices of the other iterations are still used.
+        \nReturns:
+        list of the iterations that changed, empty when nothing was appended or no file is followed
+        """
+        with self.__write_lock:
+            if self.followed_file is None or self.snapshot is None:
+                return []
+            snapshot, iterations, reloaded = self.followed_file.refresh(self.snapshot)
+            if snapshot is not None:
+                self.publish(snapshot, release_previous=reloaded) # Appended data still uses the files of the previous snapshot
+        return iterations
+
+
+    def publish(self, snapshot, release_previous = True):
+        """
+        Swaps in a new snapshot: callbacks started before keep reading the previous one, later ones read the new one.
+        Heatmaps and tiles of a replaced dataset are dropped, and its files are removed; data already read stays
+        in memory until the callbacks reading it are done.
+        \nArgs:
+        snapshot (DatasetSnapshot): snapshot of the new data
+        release_previous (bool, optional): removes the files of the previous snapshot
+        """
+        with self.__write_lock:
+            previous, self.snapshot = self.snapshot, snapshot
+            if previous is None:
+                return
+            if previous.dataset_id != snapshot.dataset_id:
+                self.heatmap_cache.clear()
+                self.tile_pyramids.clear()
+            if release_previous:
+                previous.data_loader.release_files()
+
+
+    def clear_data(self):
+        """
+        Clears the loaded data and everything derived from it (aggregates, cached heatmap matrices and tile pyramids).
+        Callbacks still reading the cleared snapshot finish with the data they already read.
+        """
+        with self.__write_lock:
+            snapshot, self.snapshot = self.snapshot, None
+            self.followed_file = None
+            self.heatmap_cache.clear()
+            self.tile_pyramids.clear()
+            if snapshot is not None:
+                snapshot.data_loader.release_files()
+            self.set_state(DataControllerState.NULL)
+
+
+    def get_memory_usage(self):
+        """
+        Retrieves the memory held for the loaded dataset: its data, aggregates, cached heatmap matrices and tile pyramids.
+        Memory-mapped data is not counted (see get_mapped_memory_usage).
+        \nReturns:
+        int: size in bytes
+        """
+        snapshot = self.snapshot
+        snapshot_bytes = snapshot.get_memory_usage() if snapshot is not None else 0
+        return snapshot_bytes + self.heatmap_cache.get_memory_usage() + self.tile_pyramids.get_memory_usage()
+
+
+    def get_mapped_memory_usage(self):
+        """
+        Retrieves the size of the loaded data read from memory-mapped files, with memmap_directory or a shared store.
+        \nReturns:
+        int: size in bytes
+        """
+        snapshot = self.snapshot
+        return snapshot.get_mapped_memory_usage() if snapshot is not None else 0
 
 
     def build_filters(self):
@@ -80,12 +245,13 @@ class DataController:
         Returns:
             Filters HTML component or a placeholder message.
         """
-        if self.__current_state != DataControllerState.READY:
+        snapshot = self.snapshot
+        if snapshot is None:
             print(f"[{self.__class__.__name__}] [BUILD_FILTERS]: Data is not ready. Cannot build filters.")
             return html.Div("Please, upload data first.", style={'color': 'red', 'fontSize': '18px'})
 
         try:
-            wells, models, attributes = self.data_loader.get_indexes()
+            wells, models, attributes = snapshot.data_loader.get_indexes()
             return FilterBuilder.build_filters_based_on_index(wells, models, attributes)
         except ValueError as e:
             print(f"[{self.__class__.__name__}] [BUILD_FILTERS]: Error while building filters: " + str(e))
@@ -99,57 +265,222 @@ class DataController:
         Returns:
             Iteration Selector HTML component or a placeholder message.
         """
-        if self.__current_state != DataControllerState.READY:
+        snapshot = self.snapshot
+        if snapshot is None:
             print(f"[{self.__class__.__name__}] [BUILD_ITERATION_SELECTOR]: Data is not ready. Cannot build iteration selector.")
             return html.Div("Please, upload data first.", style={'color': 'red', 'fontSize': '18px'})
 
         try:
-            iteration_count = self.data_loader.get_iteration_count()
+            iteration_count = snapshot.data_loader.get_iteration_count()
             return FilterBuilder.build_iteration_selector(iteration_count)
         except ValueError as e:
             print(f"[{self.__class__.__name__}] [BUILD_ITERATION_SELECTOR]: Error while building iteration selector: " + str(e))
             return html.Div("Error while building iteration selector", style={'color': 'red', 'fontSize': '18px'})
 
 
-    def gather_heatmap_data(self, heatmap_type, iteration, heatmap_mode, transposed = False):
+    def gather_heatmap_data(self, heatmap_type, iteration, heatmap_mode, transposed = False, comparison = None, reference_iteration = None, snapshot = None):
         """
         Gathers data according to desired Heatmap type
         \nArgs:
         heatmap_type (DataControllerState): type of desired heatmap (Wells x Models, Models x Attributes, Wells x Atributes)
         iteration (int): desired iteration
+        comparison (HeatmapComparison, optional): compares the iteration with reference_iteration instead of showing its values
+        reference_iteration (int, optional): iteration compared with
+        snapshot (DatasetSnapshot, optional): snapshot read, so every iteration of a build reads the same data. Default is the current one.
         \nReturn:
         DataFrame formatted to according heatmap type
         """
-        if self.get_state() is DataControllerState.NULL:
-            raise HeatmapException("Gathering data while DataControllerState is NULL")
-        
-        # Sets LOADING state
-        self.set_state(DataControllerState.LOADING)
-        data = None
-
-        # Gathers data based on heatmap type selected
-        if heatmap_type is DataControllerState.WELLS_MODELS:
-            print(f"[{self.__class__.__name__}] [GATHER_HEATMAP_DATA]: Processing Wells X Models")
-            data = HeatmapDataFormatter.wells_models(self.data_loader.get_iteration(iteration), heatmap_mode)
-            self.set_state(DataControllerState.WELLS_MODELS)
-
-        elif heatmap_type is DataControllerState.ATTRIBUTES_MODELS:
-            print(f"[{self.__class__.__name__}] [GATHER_HEATMAP_DATA]: Processing Attributes X Models")
-            data = HeatmapDataFormatter.attributes_models(self.data_loader.get_iteration(iteration), heatmap_mode)
-            self.set_state(DataControllerState.ATTRIBUTES_MODELS)
-
-        elif heatmap_type is DataControllerState.WELLS_ATTRIBUTES:
-            print(f"[{self.__class__.__name__}] [GATHER_HEATMAP_DATA]: Processing Wells X Attributes")
-            data = HeatmapDataFormatter.wells_attributes(self.data_loader.get_iteration(iteration), heatmap_mode)
-            self.set_state(DataControllerState.WELLS_ATTRIBUTES)
-        
+        snapshot = snapshot or self.snapshot
+        if snapshot is None:
+            raise HeatmapException("Gathering data while no data is loaded")
+
+        if comparison is not None and reference_iteration is not None:
+            return self.gather_comparison_data(heatmap_type, iteration, reference_iteration, heatmap_mode, comparison, transposed, snapshot)
+
+        # Colorscale and ordering changes request the same matrix again
+        cache_key = (snapshot.dataset_id, heatmap_type, snapshot.iteration_key(iteration), heatmap_mode, transposed)
+        cached_data = self.heatmap_cache.get(cache_key)
+        if cached_data is not None:
+            print(f"[{self.__class__.__name__}] [GATHER_HEATMAP_DATA]: Cache hit ({self.heatmap_cache.hits} hits, {self.heatmap_cache.misses} misses)")
+            return cached_data
+
+        # Every mode is computed in the same pass, so switching modes afterwards is a cache hit
+        index, columns = DataController.HEATMAP_AXES[heatmap_type]
+        print(f"[{self.__class__.__name__}] [GATHER_HEATMAP_DATA]: Processing {index} X {columns}")
+        statistics = self.format_statistics([iteration], index, columns, self.gathered_modes(heatmap_mode, snapshot), snapshot)[iteration]
+
         if transposed:
-            data = data.transpose()
             print(f"[{self.__class__.__name__}] [GATHER_HEATMAP_DATA]: Transposed")
-        return data
+        for mode, data in statistics.items():
+            self.heatmap_cache.put((snapshot.dataset_id, heatmap_type, snapshot.iteration_key(iteration), mode, transposed),
+                                   data.transpose() if transposed else data)
+        data = statistics[heatmap_mode]
+        return data.transpose() if transposed else data
+
+
+    def gather_comparison_data(self, heatmap_type, iteration, reference_iteration, heatmap_mode, comparison, transposed = False, snapshot = None):
+        """
+        Gathers the comparison of an iteration's heatmap with a reference iteration's, from their (cached) matrices
+        \nArgs:
+        heatmap_type (DataControllerState): type of desired heatmap
+        iteration (int): desired iteration
+        reference_iteration (int): iteration compared with
+        heatmap_mode (HeatmapDataMode): display mode of the heatmap
+        comparison (HeatmapComparison): DELTA or RATIO
+        snapshot (DatasetSnapshot, optional): snapshot read. Default is the current one.
+        \nReturn:
+        DataFrame of the compared values
+        """
+        snapshot = snapshot or self.snapshot
+        cache_key = (snapshot.dataset_id, heatmap_type, snapshot.iteration_key(iteration), heatmap_mode, transposed, comparison,
+                     snapshot.iteration_key(reference_iteration))
+        cached_data = self.heatmap_cache.get(cache_key)
+        if cached_data is not None:
+            return cached_data
+
+        reference_data = self.gather_heatmap_data(heatmap_type, reference_iteration, heatmap_mode, transposed, snapshot=snapshot)
+        data = self.gather_heatmap_data(heatmap_type, iteration, heatmap_mode, transposed, snapshot=snapshot)
+        print(f"[{self.__class__.__name__}] [GATHER_COMPARISON_DATA]: Iteration {iteration} {comparison.name} from iteration {reference_iteration}")
+        compared_data = HeatmapDataFormatter.compare_iterations([reference_data, data], comparison)[0]
+        self.heatmap_cache.put(cache_key, compared_data)
+        return compared_data
+
+
+    def prefetch_heatmap_data(self, heatmap_type, iterations, heatmap_mode, transposed = False, snapshot = None):
+        """
+        Computes the matrices of several iterations missing from the heatmap cache in a single pass over the data,
+        in every mode, so they are gathered from the cache afterwards
+        \nArgs:
+        heatmap_type (DataControllerState): type of desired heatmap
+        iterations (list): desired iterations
+        heatmap_mode (HeatmapDataMode): display mode of the heatmap
+        snapshot (DatasetSnapshot, optional): snapshot read. Default is the current one.
+        """
+        snapshot = snapshot or self.snapshot
+        if snapshot is None or snapshot.aggregates is not None:
+            return
+        loaded_iterations = set(snapshot.data_loader.get_iteration_numbers())
+        cached_keys = set(self.heatmap_cache.keys())
+        missing = [iteration for iteration in iterations if iteration in loaded_iterations
+                   and (snapshot.dataset_id, heatmap_type, snapshot.iteration_key(iteration), heatmap_mode, transposed) not in cached_keys]
+        if len(missing) < 2: # A single iteration is gathered as usual
+            return
+
+        index, columns = DataController.HEATMAP_AXES[heatmap_type]
+        statistics = self.format_statistics(missing, index, columns, self.gathered_modes(heatmap_mode, snapshot), snapshot)
+        for iteration, matrices in statistics.items():
+            for mode, data in matrices.items():
+                self.heatmap_cache.put((snapshot.dataset_id, heatmap_type, snapshot.iteration_key(iteration), mode, transposed),
+                                       data.transpose() if transposed else data)
+        print(f"[{self.__class__.__name__}] [PREFETCH_HEATMAP_DATA]: Iterations {missing} computed in one pass")
+
+
+    @staticmethod
+    def iteration_comparison(iteration, iterations, comparison):
+        """
+        Gets the reference of an iteration when comparing the selected iterations: the previous selected iteration.
+        \nArgs:
+        iteration (int): compared iteration
+        iterations (list): selected iterations
+        comparison (HeatmapComparison): comparison requested, or None
+        \nReturns:
+        tuple (comparison, reference iteration), both None for the first selected iteration or when not comparing
+        """
+        previous_iterations = [selected for selected in iterations if selected < iteration]
+        if comparison is None or not previous_iterations:
+            return None, None
+        return comparison, max(previous_iterations)
+
 
+    def gathered_modes(self, heatmap_mode, snapshot = None):
+        """
+        Gets the modes computed when a heatmap is gathered: every mode, so switching modes afterwards is a cache hit.
+        A followed file only adds the requested mode to those of its running aggregates, as the other modes
+        are computed from the rows of the iteration.
+        """
+        snapshot = snapshot or self.snapshot
+        if snapshot is None or snapshot.running_aggregates is None:
+            return list(HeatmapDataMode)
+        return list(dict.fromkeys(RunningAggregates.MODES + [heatmap_mode]))
 
-    def build_heatmap(self, heatmap_type, iteration, heatmap_mode, filters, colorscale, order, transposed = False):
+
+    def format_statistics(self, iterations, index, columns, modes = None, snapshot = None):
+        """
+        Formats iterations as index by columns DataFrames, taken from the running aggregates of a followed file
+        or from the materialized aggregates when they were built at load time, or computed by HeatmapDataFormatter
+        in a single pass otherwise
+        \nArgs:
+        iterations (list): desired iterations
+        index (str): axis shown as rows
+        columns (str): axis shown as columns
+        modes (list, optional): HeatmapDataMode values formatted. Default is every mode.
+        snapshot (DatasetSnapshot, optional): snapshot read. Default is the current one.
+        \nReturn:
+        dictionary iteration -> (dictionary HeatmapDataMode -> DataFrame)
+        """
+        modes = list(HeatmapDataMode) if modes is None else modes
+        snapshot = snapshot or self.snapshot
+        if snapshot.running_aggregates is not None:
+            statistics = {iteration: snapshot.running_aggregates.statistics(iteration, index, columns) for iteration in iterations}
+            remaining = [mode for mode in modes if mode not in RunningAggregates.MODES]
+            if remaining:
+                for iteration, matrices in HeatmapDataFormatter.format_statistics(snapshot.data_loader, iterations, index, columns, remaining).items():
+                    statistics[iteration].update(matrices)
+            return statistics
+        if snapshot.aggregates is not None:
+            statistics = {iteration: {mode: snapshot.aggregates.get(iteration, index, columns, mode) for mode in modes}
+                          for iteration in iterations}
+            if all(data is not None for matrices in statistics.values() for data in matrices.values()):
+                return statistics
+        return HeatmapDataFormatter.format_statistics(snapshot.data_loader, iterations, index, columns, modes)
+
+
+    def build_heatmaps(self, heatmap_type, iterations, heatmap_mode, filters, colorscale, order, transposed = False, comparison = None):
+        """
+        Builds the heatmap HTML components of several iterations concurrently.
+        The iterations' matrices are computed in a single pass, then each iteration is filtered and built on a thread of heatmap_executor;
+        the NumPy and pandas work releases the GIL, so iterations are built in parallel across cores.
+        Every iteration reads the snapshot current when the build started, even if a new one is published meanwhile.
+        \nArgs:
+        heatmap_type (DataControllerState): heatmap type based on DataControllerState Enum
+        iterations (list): desired iterations
+        heatmap_mode (HeatmapDataMode): display mode of the heatmap
+        filters (map/dict): dictionary containing current filter state (KEYS: wells, models, attributes)
+        comparison (HeatmapComparison, optional): shows each iteration compared with the previous selected iteration
+        \nReturns:
+        list of Heatmap Dash HTML components, in the order of iterations. Iterations that failed are replaced by an error message.
+        """
+        snapshot = self.snapshot
+        try:
+            self.prefetch_heatmap_data(heatmap_type, iterations, heatmap_mode, transposed, snapshot)
+        except Exception as e: # Iterations are then gathered one by one, reporting their own errors
+            print(f"[{self.__class__.__name__}] [BUILD_HEATMAPS]: Error while prefetching iterations: {str(e)}")
+
+        def build(iteration):
+            try:
+                iteration_comparison, reference_iteration = DataController.iteration_comparison(iteration, iterations, comparison)
+                return self.build_heatmap(heatmap_type, iteration, heatmap_mode, filters, colorscale, order, transposed,
+                                          iteration_comparison, reference_iteration, snapshot)
+            except Exception as e:
+                print(f"[{self.__class__.__name__}] [BUILD_HEATMAPS]: Error while building iteration {iteration}: {str(e)}")
+                return html.Div(f"Error while building iteration {iteration}: {str(e)}", style={'color': 'red', 'fontSize': '18px'})
+
+        return list(self.heatmap_executor.map(build, iterations))
+
+
+    @staticmethod
+    def create_heatmap_executor(settings):
+        """
+        Creates the threads building heatmaps, heatmap_workers of them (one per core by default).
+        Their tasks never wait on each other, so concurrent builds sharing them only queue.
+        \nReturns:
+        ThreadPoolExecutor
+        """
+        return ThreadPoolExecutor(max_workers=settings.heatmap_workers or os.cpu_count(), thread_name_prefix='heatmap')
+
+
+    def build_heatmap(self, heatmap_type, iteration, heatmap_mode, filters, colorscale, order, transposed = False, comparison = None, reference_iteration = None,
+                      snapshot = None):
         """
         Method responsible for Gathering Data, applying filters and retrieving the heatmap HTML component
         \nArgs:
@@ -157,19 +488,165 @@ class DataController:
         iteration (int): desired iteration
         heatmap_mode (HeatmapDataMode): display mode of the heatmap
         filters (map/dict): dictionary containing current filter state (KEYS: wells, models, attributes)
+        comparison (HeatmapComparison, optional): shows the iteration compared with reference_iteration
+        reference_iteration (int, optional): iteration compared with
+        snapshot (DatasetSnapshot, optional): snapshot read. Default is the current one.
         \nReturns:
-        Heatmap Dash HTML component
+        Heatmap Dash HTML component: the graph and a store describing it, used to refine the level of detail on zoom,
+        or to fetch the tiles of the viewport when the heatmap is above tile_threshold_cells
         """
-        unfiltered_df = self.gather_heatmap_data(heatmap_type, iteration, heatmap_mode, transposed)
-        #print(unfiltered_df)
-        
-        # apply filter
-        filtered_df = FilterHandler.apply_filter_to_dataframe(unfiltered_df, filters)
+        snapshot = snapshot or self.snapshot
+        filtered_df = self.filter_heatmap_data(heatmap_type, iteration, heatmap_mode, filters, transposed, comparison, reference_iteration, snapshot)
 
-        ordered_df = FilterHandler.apply_ordering_to_dataframe(filtered_df, order)
+        if self.tile_threshold_cells is not None and filtered_df.size > self.tile_threshold_cells:
+            heatmap_graph, tile_state = self._build_tiled_heatmap_graph(filtered_df, heatmap_type, iteration, heatmap_mode, filters, colorscale, order, transposed,
+                                                                        comparison, reference_iteration, snapshot)
+            return html.Div([
+                heatmap_graph,
+                dcc.Store(id={'type': 'heatmap-tiles', 'iteration': iteration}, data=tile_state)
+            ])
+
+        heatmap_graph, lod_state = self._build_heatmap_graph(filtered_df, iteration, heatmap_mode, colorscale, order, transposed, comparison=comparison)
+        return html.Div([
+            heatmap_graph,
+            dcc.Store(id={'type': 'heatmap-lod', 'iteration': iteration}, data=lod_state)
+        ])
+
+
+    def filter_heatmap_data(self, heatmap_type, iteration, heatmap_mode, filters, transposed = False, comparison = None, reference_iteration = None,
+                            snapshot = None):
+        """
+        Gathers data according to desired Heatmap type and applies filters
+        \nReturns:
+        filtered DataFrame
+        """
+        unfiltered_df = self.gather_heatmap_data(heatmap_type, iteration, heatmap_mode, transposed, comparison, reference_iteration, snapshot)
+        return FilterHandler.apply_filter_to_dataframe(unfiltered_df, filters)
+
+
+    def build_heatmap_graph(self, heatmap_type, iteration, heatmap_mode, filters, colorscale, order, transposed = False, models_window = None,
+                            comparison = None, reference_iteration = None):
+        """
+        Gathers data, applies filters, the models window, level of detail and ordering, and builds the heatmap graph
+        \nArgs:
+        heatmap_type (DataControllerState): heatmap type based on DataControllerState Enum
+        iteration (int): desired iteration
+        heatmap_mode (HeatmapDataMode): display mode of the heatmap
+        filters (map/dict): dictionary containing current filter state (KEYS: wells, models, attributes)
+        models_window (list, optional): first and last model shown, when zoomed in
+        comparison (HeatmapComparison, optional): shows the iteration compared with reference_iteration
+        reference_iteration (int, optional): iteration compared with
+        \nReturns:
+        tuple (dcc.Graph, description of its Models axis built by LevelOfDetail.describe, with its transposition)
+        """
+        filtered_df = self.filter_heatmap_data(heatmap_type, iteration, heatmap_mode, filters, transposed, comparison, reference_iteration)
+        return self._build_heatmap_graph(filtered_df, iteration, heatmap_mode, colorscale, order, transposed, models_window, comparison)
+
+
+    def _build_heatmap_graph(self, filtered_df, iteration, heatmap_mode, colorscale, order, transposed = False, models_window = None, comparison = None):
+        """
+        Applies the models window, level of detail and ordering to filtered data, and builds the heatmap graph
+        """
+        # bins models beyond what the figure can display, at full resolution within the zoomed window
+        windowed_df = LevelOfDetail.restrict_models(filtered_df, models_window)
+        detailed_df = LevelOfDetail.downsample_models(windowed_df, self.lod_max_models, heatmap_mode)
+
+        ordered_df = FilterHandler.apply_ordering_to_dataframe(detailed_df, order)
 
         # build heatmap html component
-        heatmap_builder = HeatmapBuilder(ordered_df, colorscale)
-        heatmap_component = heatmap_builder.buildHeatmap(f'heatmap-{iteration}')
+        heatmap_builder = HeatmapBuilder(ordered_df, colorscale, comparison, heatmap_mode)
+        heatmap_component = heatmap_builder.buildHeatmap({'type': 'heatmap', 'iteration': iteration})
+        lod_state = LevelOfDetail.describe(ordered_df, models_window)
+        lod_state['transposed'] = transposed # Lets the browser tell whether the figure matches the axis inversion control
         print(f"[{self.__class__.__name__}] [BUILD_HEATMAP]: Heatmap built")
-        return heatmap_component
\ No newline at end of file
+        return heatmap_component, lod_state
+
+
+    def build_tiled_heatmap_graph(self, heatmap_type, iteration, heatmap_mode, filters, colorscale, order, transposed = False,
+                                  comparison = None, reference_iteration = None):
+        """
+        Gathers data, applies filters and ordering, and builds a heatmap graph drawn from image tiles
+        \nArgs:
+        heatmap_type (DataControllerState): heatmap type based on DataControllerState Enum
+        iteration (int): desired iteration
+        heatmap_mode (HeatmapDataMode): display mode of the heatmap
+        filters (map/dict): dictionary containing current filter state (KEYS: wells, models, attributes)
+        comparison (HeatmapComparison, optional): shows the iteration compared with reference_iteration
+        reference_iteration (int, optional): iteration compared with
+        \nReturns:
+        tuple (dcc.Graph, tile state built by TiledHeatmapBuilder.describe, with the pyramid id and transposition)
+        """
+        snapshot = self.snapshot
+        filtered_df = self.filter_heatmap_data(heatmap_type, iteration, heatmap_mode, filters, transposed, comparison, reference_iteration, snapshot)
+        return self._build_tiled_heatmap_graph(filtered_df, heatmap_type, iteration, heatmap_mode, filters, colorscale, order, transposed,
+                                               comparison, reference_iteration, snapshot)
+
+
+    def _build_tiled_heatmap_graph(self, filtered_df, heatmap_type, iteration, heatmap_mode, filters, colorscale, order, transposed = False,
+                                   comparison = None, reference_iteration = None, snapshot = None):
+        """
+        Orders filtered data and builds a heatmap graph drawn from image tiles.
+        The tile pyramid is kept in tile_pyramids for the tile route, and reused while the same view is requested.
+        """
+        ordered_df = FilterHandler.apply_ordering_to_dataframe(filtered_df, order)
+
+        snapshot = snapshot or self.snapshot
+        tiles_key = (snapshot.dataset_id, heatmap_type.name, snapshot.iteration_key(iteration), heatmap_mode.name, transposed, repr(filters), order,
+                     comparison.name if comparison else None, snapshot.iteration_key(reference_iteration)) # Followed iterations change with their revision
+        pyramid_id = hashlib.blake2b(repr(tiles_key).encode(), digest_size=16).hexdigest()
+        pyramid = self.tile_pyramids.get(pyramid_id)
+        if pyramid is None:
+            zmin, zmax, _ = HeatmapBuilder.value_scale(comparison, heatmap_mode)
+            values = ordered_df.to_numpy(dtype='float32')
+            if zmax is None: # Tiles are colored on the server, so a data-fitted range is fixed here
+                zmax = max(float(np.nanmax(values)), zmin + 1) if np.isfinite(values).any() else zmin + 1
+            pyramid = TilePyramid(values, heatmap_mode, zmin, zmax)
+            self.tile_pyramids.put(pyramid_id, pyramid)
+            print(f"[{self.__class__.__name__}] [BUILD_TILED_HEATMAP_GRAPH]: Tile pyramid {pyramid.shape} built with {pyramid.level_count()} levels, "
+                  f"{pyramid.get_memory_usage() / 2**20:.1f} MiB")
+
+        heatmap_builder = TiledHeatmapBuilder(ordered_df, pyramid, f"{self.tile_url}/{pyramid_id}", colorscale, comparison, heatmap_mode)
+        heatmap_component = heatmap_builder.buildHeatmap({'type': 'tiled-heatmap', 'iteration': iteration})
+        tile_state = heatmap_builder.describe()
+        tile_state['pyramid_id'] = pyramid_id
+        tile_state['transposed'] = transposed
+        print(f"[{self.__class__.__name__}] [BUILD_TILED_HEATMAP_GRAPH]: Tiled heatmap built")
+        return heatmap_component, tile_state
+
+
+    def tile_images(self, tile_state, colorscale):
+        """
+        Lists the tiles covering the current viewport of a tiled heatmap.
+        \nArgs:
+        tile_state (dict): tile state of the heatmap, as built by build_tiled_heatmap_graph
+        colorscale (str): plotly colorscale name
+        \nReturns:
+        list of layout images, or None when the pyramid was evicted
+        """
+        pyramid = self.tile_pyramids.get(tile_state['pyramid_id'])
+        if pyramid is None:
+            return None
+        return TiledHeatmapBuilder.build_images(pyramid, tile_state['tile_url'], colorscale, tile_state['row_range'], tile_state['column_range'])
+
+
+    def update_tiled_viewport(self, relayout_data, tile_state, colorscale):
+        """
+        Lists the tiles covering the viewport of a tiled heatmap after a zoom or pan.
+        \nArgs:
+        relayout_data (dict): relayoutData of the dcc.Graph
+        tile_state (dict): tile state of the heatmap, as built by build_tiled_heatmap_graph
+        colorscale (str): plotly colorscale name
+        \nReturns:
+        tuple (layout images, updated tile state), or None when the viewport did not change or the pyramid was evicted
+        """
+        if not relayout_data or not tile_state:
+            return None
+        changed, row_range, column_range = TiledHeatmapBuilder.viewport_from_relayout(relayout_data, tile_state)
+        if not changed:
+            return None
+
+        new_tile_state = dict(tile_state, row_range=row_range, column_range=column_range)
+        images = self.tile_images(new_tile_state, colorscale)
+        if images is None:
+            return None
+        return images, new_tile_state
@@ -0,0 +1,162 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+from plugins.model.heatmap_exception import HeatmapException
+
+
+class DatasetRegistry:
+    """
+    Datasets loaded by the browser sessions, each in its own DataController, keyed by the dataset id the session
+    keeps in its uploaded-data store, so sessions never replace each other's data.
+    Several datasets are held at once under a memory budget: registering a dataset evicts the least recently used
+    others above it. Memory-mapped data is reported apart and not counted in the budget, as the operating system
+    shares its pages between processes and reclaims them under memory pressure. An evicted dataset found in the dataset cache is restored from it when its session requests it again.
+    With a SharedDatasetStore, dataset ids are recorded in it, so a server process receiving a request for a dataset
+    registered by another process attaches it from the store.
+    \nAttributes:
+    max_bytes: memory budget of the registered datasets, memory-mapped data excluded
+    """
+    def __init__(self, create_controller, max_bytes, shared_store = None):
+        """
+        \nArgs:
+        create_controller (callable): builds an empty DataController for a dataset id
+        max_bytes (int): memory budget of the registered datasets
+        shared_store (SharedDatasetStore, optional): store of the datasets shared by the server processes
+        """
+        self.__create_controller = create_controller
+        self.__max_bytes = max_bytes
+        self.__shared_store = shared_store
+        self.__controllers = OrderedDict() # dataset id -> DataController, least recently used first
+        self.__evicted = {} # dataset id -> dataset cache key, for evicted datasets that can be restored
+        self.__lock = threading.Lock()
+
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
+
+
+    def create(self):
+        """
+        Creates an empty DataController for a new dataset, registered once its data is loaded.
+        \nReturns:
+        tuple (dataset id, DataController)
+        """
+        dataset_id = uuid.uuid4().hex
+        return dataset_id, self.__create_controller(dataset_id)
+
+
+    def register(self, dataset_id, controller):
+        """
+        Registers a loaded dataset, evicting least recently used datasets above the memory budget.
+        The registered dataset itself is never evicted by its own registration.
+        """
+        with self.__lock:
+            self.__controllers[dataset_id] = controller
+            self.__evicted.pop(dataset_id, None)
+            self._evict(dataset_id)
+        if self.__shared_store is not None and self.__shared_store.contains(controller.cache_key):
+            self.__shared_store.register_dataset(dataset_id, controller.cache_key)
+        print(f"[{self.__class__.__name__}] [REGISTER]: Dataset {dataset_id} registered, {len(self.__controllers)} datasets loaded, "
+              f"{self.get_memory_usage() / 2**20:.1f} MiB in memory, {self.get_mapped_memory_usage() / 2**20:.1f} MiB memory-mapped")
+
+
+    def get(self, dataset_id, restore = True):
+        """
+        Gets the controller of a dataset, marking it as recently used.
+        \nArgs:
+        dataset_id (str): id kept by the session, None before any upload
+        restore (bool, optional): restores an evicted dataset from the dataset cache, or a dataset of another server process
+            from the shared store
+        \nReturns:
+        DataController, or None when the dataset is unknown or was evicted without being restorable
+        """
+        if not isinstance(dataset_id, str):
+            return None
+        with self.__lock:
+            controller = self.__controllers.get(dataset_id)
+            if controller is not None:
+                self.__controllers.move_to_end(dataset_id)
+                return controller
+            cache_key = self.__evicted.get(dataset_id)
+        if not restore:
+            return None
+        if cache_key is None and self.__shared_store is not None:
+            cache_key = self.__shared_store.dataset_key(dataset_id) # Registered by another server process
+        if cache_key is None:
+            return None
+
+        print(f"[{self.__class__.__name__}] [GET]: Restoring dataset {dataset_id}")
+        controller = self.__create_controller(dataset_id)
+        try:
+            controller.load_uploaded_data(None, cache_key=cache_key)
+        except HeatmapException as e: # No longer in the dataset cache
+            print(f"[{self.__class__.__name__}] [GET]: Dataset {dataset_id} cannot be restored: {str(e)}")
+            with self.__lock:
+                self.__evicted.pop(dataset_id, None)
+            return None
+        with self.__lock:
+            restored = self.__controllers.get(dataset_id) # Restored by a concurrent request meanwhile
+            if restored is not None:
+                controller.clear_data()
+                return restored
+        self.register(dataset_id, controller)
+        return controller
+
+
+    def remove(self, dataset_id):
+        """
+        Removes a dataset and clears its data.
+        """
+        with self.__lock:
+            controller = self.__controllers.pop(dataset_id, None)
+            self.__evicted.pop(dataset_id, None)
+        if controller is not None:
+            controller.clear_data()
+
+
+    def get_memory_usage(self):
+        """
+        Retrieves the memory held by the registered datasets, memory-mapped data excluded.
+        \nReturns:
+        int: size in bytes
+        """
+        with self.__lock:
+            controllers = list(self.__controllers.values())
+        return sum(controller.get_memory_usage() for controller in controllers)
+
+
+    def get_mapped_memory_usage(self):
+        """
+        Retrieves the size of the registered datasets' data read from memory-mapped files, which the budget does not count.
+        \nReturns:
+        int: size in bytes
+        """
+        with self.__lock:
+            controllers = list(self.__controllers.values())
+        return sum(controller.get_mapped_memory_usage() for controller in controllers)
+
+
+    def __len__(self):
+        return len(self.__controllers)
+
+
+    def _evict(self, kept_id):
+        """
+        Evicts least recently used datasets until the registered datasets fit in the memory budget. Called with the lock held.
+        Datasets are measured now, as their cached heatmaps grow after registration.
+        """
+        sizes = {dataset_id: controller.get_memory_usage() for dataset_id, controller in self.__controllers.items()}
+        total_bytes = sum(sizes.values())
+        for dataset_id in list(self.__controllers):
+            if total_bytes <= self.__max_bytes:
+                break
+            if dataset_id == kept_id:
+                continue
+            controller = self.__controllers.pop(dataset_id)
+            total_bytes -= sizes[dataset_id]
+            if controller.cache_key is not None:
+                self.__evicted[dataset_id] = controller.cache_key
+            controller.clear_data()
+            print(f"[{self.__class__.__name__}] [EVICT]: Dataset {dataset_id} evicted ({sizes[dataset_id] / 2**20:.1f} MiB)")
@@ -0,0 +1,88 @@
+import os
+
+from plugins.model.data_loader import DataLoader
+from plugins.model.dataset_snapshot import DatasetSnapshot
+from plugins.model.file_follower import FileFollower
+from plugins.model.heatmap_exception import HeatmapException
+from plugins.model.running_aggregates import RunningAggregates
+
+
+class FollowedFile:
+    """
+    A local file that keeps growing, such as the output of a DA run in progress, loaded into DatasetSnapshots:
+    load reads the whole file, and refresh builds the snapshot with the lines appended since.
+    \nAttributes:
+    path: followed file
+    """
+    def __init__(self, path, memmap_directory = None):
+        self.__path = path
+        self.__memmap_directory = memmap_directory
+        self.__follower = None
+
+
+    @property
+    def path(self):
+        return self.__path
+
+
+    @staticmethod
+    def resolve(path, directory):
+        """
+        Resolves the path of a file to follow, which must be inside the folder of followable files. Symbolic links and
+        '..' are resolved first, so they cannot lead outside of it.
+        \nArgs:
+        path (str): path entered by the user, relative to directory or absolute
+        directory (str): folder of the files that can be followed
+        \nReturns:
+        str: resolved path of the file
+        """
+        directory = os.path.realpath(directory)
+        resolved_path = os.path.realpath(os.path.join(directory, path))
+        if os.path.commonpath([directory, resolved_path]) != directory:
+            raise HeatmapException(f"'{path}' is outside of the follow directory {directory}")
+        if not os.path.isfile(resolved_path):
+            raise HeatmapException(f"'{resolved_path}' is not a file")
+        return resolved_path
+
+
+    def load(self):
+        """
+        Loads the complete lines of the file, from its start.
+        \nReturns:
+        DatasetSnapshot of the file, with the running aggregates of its rows
+        """
+        with open(self.__path, 'rb') as file:
+            if DataLoader.detect_compression(file) is not None:
+                raise HeatmapException("Compressed files cannot be followed, appended lines are read as text")
+
+        follower = FileFollower(self.__path)
+        data_loader = DataLoader(self.__memmap_directory)
+        try:
+            data_loader.get_data_from_file(follower.read_appended())
+        except ValueError as e:
+            raise HeatmapException(f"Followed file cannot be loaded yet: {str(e)}")
+        self.__follower = follower
+        print(f"[{self.__class__.__name__}] [LOAD]: {follower.offset} bytes loaded from {self.__path}")
+        return DatasetSnapshot(data_loader, running_aggregates=RunningAggregates.build(data_loader.get_data()))
+
+
+    def refresh(self, snapshot):
+        """
+        Builds the snapshot of the file with the lines appended since the last load or refresh. Only the appended rows
+        are parsed and merged into the running aggregates. A truncated or replaced file is loaded again from its start.
+        \nArgs:
+        snapshot (DatasetSnapshot): current snapshot of the file
+        \nReturns:
+        tuple (new DatasetSnapshot, list of the iterations that changed, whether the file was loaded again),
+        the snapshot being None when nothing was appended
+        """
+        appended = self.__follower.read_appended()
+        if appended is None:
+            reloaded = self.load()
+            return reloaded, reloaded.data_loader.get_iteration_numbers(), True
+        if not appended:
+            return None, [], False
+
+        new_snapshot, iterations = snapshot.appended(DataLoader.parse_data_lines(appended))
+        print(f"[{self.__class__.__name__}] [REFRESH]: {len(appended)} bytes appended to iterations {iterations}")
+        return new_snapshot, iterations, False
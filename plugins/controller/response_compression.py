@@ -0,0 +1,92 @@
+import gzip
+
+from flask import g, request
+
+
+class ResponseCompression:
+    """
+    Gzip compression of the Dash server's dynamic text responses (callback outputs, layout) for browsers accepting it.
+    Heatmap figures are sent as callback outputs, so this is where their bytes on the wire are cut.
+    Dash's component bundles are left alone: they are the same on every request and cached by the browser,
+    so compressing them again on each request would only cost CPU.
+    The size of every callback response is logged whether it is compressed or not, as the baseline of the payload
+    size metric, with its compressed size as a second number when it is.
+    """
+    EXTENSION_NAME = 'davis_response_compression' # Marks servers where compression is already installed
+    COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/css', 'text/javascript', 'application/javascript'}
+    MIN_BYTES = 1024 # Smaller responses are sent as they are
+    SKIPPED_PATHS = ('/_dash-component-suites/',) # Static bundles, under the app's path prefix
+    CALLBACK_PATH = '_dash-update-component' # Callback responses, heatmap figures included
+    LEVEL = 6
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def init_app(server, compress = True, min_bytes = MIN_BYTES, level = LEVEL):
+        """
+        Installs payload size logging on a Flask server, and response compression unless disabled, once per server.
+        \nArgs:
+        server (Flask): the Dash app's server
+        compress (bool, optional): compresses the responses, otherwise only their sizes are logged
+        min_bytes (int, optional): smallest response compressed
+        level (int, optional): gzip compression level
+        """
+        if ResponseCompression.EXTENSION_NAME in server.extensions:
+            return
+        server.extensions[ResponseCompression.EXTENSION_NAME] = True
+        server.after_request(ResponseCompression.log_payload_size) # Hooks run in reverse order: after compression
+        if compress:
+            server.after_request(lambda response: ResponseCompression.compress_response(response, min_bytes, level))
+            print(f"[{ResponseCompression.__name__}] [INIT_APP]: Gzip compression installed on the server")
+
+
+    @staticmethod
+    def compress_response(response, min_bytes = MIN_BYTES, level = LEVEL):
+        """
+        Compresses a response when the request accepts gzip and the response is worth compressing.
+        \nArgs:
+        response (flask.Response): response about to be sent
+        \nReturns:
+        the response, compressed or not
+        """
+        if ('gzip' not in request.headers.get('Accept-Encoding', '').lower()
+                or response.status_code != 200
+                or response.direct_passthrough # Streamed files
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in ResponseCompression.COMPRESSIBLE_TYPES
+                or any(path in request.path for path in ResponseCompression.SKIPPED_PATHS)):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_bytes:
+            return response
+
+        compressed = gzip.compress(data, compresslevel=level)
+        g.uncompressed_bytes = len(data) # For log_payload_size
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        etag, _ = response.get_etag()
+        if etag is not None: # The compressed body differs from the one the tag was computed on, but means the same
+            response.set_etag(etag, weak=True)
+        return response
+
+
+    @staticmethod
+    def log_payload_size(response):
+        """
+        Logs the size of a callback response, and its compressed size when it was compressed.
+        \nArgs:
+        response (flask.Response): response about to be sent
+        \nReturns:
+        the response, unchanged
+        """
+        if not request.path.endswith(ResponseCompression.CALLBACK_PATH) or response.direct_passthrough:
+            return response
+        size = len(response.get_data())
+        if response.headers.get('Content-Encoding') == 'gzip' and 'uncompressed_bytes' in g:
+            print(f"[{ResponseCompression.__name__}] [PAYLOAD_SIZE]: Callback response {g.uncompressed_bytes} bytes, {size} gzipped")
+        else:
+            print(f"[{ResponseCompression.__name__}] [PAYLOAD_SIZE]: Callback response {size} bytes")
+        return response
@@ -0,0 +1,131 @@
+import os
+
+from plugins.controller.upload_staging import UploadStaging
+from plugins.model.data_loader import DataLoader
+from plugins.model.dataset_cache import DatasetCache
+from plugins.model.dataset_snapshot import DatasetSnapshot
+from plugins.model.heatmap_aggregates import HeatmapAggregates
+from plugins.model.heatmap_exception import HeatmapException
+from plugins.model.shared_dataset_store import SharedDatasetStore
+
+
+class SnapshotLoader:
+    """
+    Loads data files into new DatasetSnapshots, which DataController then publishes. A file is taken, in order,
+    indexed with lazy loading, from the shared store (loaded by another server process), from the dataset cache or
+    the upload staging, or parsed. Parsed files are cached, and published to the shared store.
+    One instance is shared by the controllers of a plugin.
+    \nAttributes:
+    settings: ControllerSettings of the plugin
+    dataset_cache: persistent DatasetCache, or None
+    staging: UploadStaging of the background uploads
+    shared_store: SharedDatasetStore shared with the other server processes, or None
+    """
+    def __init__(self, settings):
+        self.__settings = settings
+        self.__dataset_cache = None
+        if settings.cache_directory is not None:
+            self.__dataset_cache = DatasetCache(DataLoader.PARSER_VERSION, settings.cache_directory, settings.cache_max_bytes)
+        staging_cache = self.__dataset_cache
+        if staging_cache is None and settings.staging_directory is not None:
+            staging_cache = DatasetCache(DataLoader.PARSER_VERSION, settings.staging_directory, settings.cache_max_bytes)
+        self.__staging = UploadStaging(staging_cache, persistent=staging_cache is self.__dataset_cache,
+                                       upload_directory=settings.upload_directory)
+        self.__shared_store = None
+        if settings.shared_directory is not None:
+            self.__shared_store = SharedDatasetStore(DataLoader.PARSER_VERSION, settings.shared_directory, settings.shared_max_bytes)
+
+
+    @property
+    def settings(self):
+        return self.__settings
+
+
+    @property
+    def dataset_cache(self):
+        return self.__dataset_cache
+
+
+    @property
+    def staging(self):
+        return self.__staging
+
+
+    @property
+    def shared_store(self):
+        return self.__shared_store
+
+
+    def load(self, filepath, progress_callback = None, cache_key = None, remove_file = False, staging_key = None):
+        """
+        Loads a data file into a new DatasetSnapshot, without publishing it.
+        \nArgs:
+        filepath (str or bytes-like): path to the data file, or its content. May be None when cache_key is given.
+        progress_callback (callable, optional): forwarded to DataLoader, called with (bytes_read, total_bytes, rows_loaded)
+        cache_key (str, optional): cache key of the file, when already computed
+        remove_file (bool, optional): removes the file at filepath once it is no longer needed, for uploaded files
+        staging_key (str, optional): key of the upload staged in the background, as returned by UploadStaging.stage
+        \nReturns:
+        DatasetSnapshot
+        """
+        data_loader = DataLoader(self.__settings.memmap_directory)
+        indexed = False
+        shared_data = None
+        try:
+            if self.__settings.lazy_loading and filepath is not None and cache_key is None and staging_key is None:
+                # Indexed before any content hash, which would read the whole file. Indexed files are neither cached nor shared.
+                indexed = data_loader.index_file(filepath, progress_callback, remove_on_clear=remove_file)
+            if not indexed:
+                if cache_key is None and filepath is not None and (self.__staging.cache is not None or self.__shared_store is not None):
+                    cache_key = DatasetCache.file_key(filepath)
+                shared_data = self.__shared_store.attach(cache_key) if self.__shared_store is not None else None
+                staging_key = staging_key or cache_key
+                if shared_data is None:
+                    cached_data = self.__staging.restore(staging_key)
+                else:
+                    cached_data = None
+                    self.__staging.discard(staging_key)
+
+                if shared_data is not None: # Loaded by another server process
+                    data_loader.attach_shared_data(*shared_data)
+                elif cached_data is not None:
+                    data_loader.set_data(cached_data)
+                elif filepath is None:
+                    raise HeatmapException(f"Uploaded data {cache_key} is no longer cached")
+                else:
+                    data_loader.get_data_from_file(filepath, progress_callback=progress_callback)
+                    if self.__dataset_cache is not None:
+                        self.__dataset_cache.put(cache_key, data_loader.get_data())
+        finally:
+            # Iterations of an indexed file are still parsed from it, DataLoader removes it when cleared
+            if remove_file and not indexed and isinstance(filepath, str) and os.path.exists(filepath):
+                os.remove(filepath)
+
+        if shared_data is None and not indexed:
+            self.share(data_loader, cache_key)
+
+        aggregates = None
+        if self.__settings.materialize_aggregates:
+            aggregates = HeatmapAggregates.build(data_loader, self.__settings.aggregate_workers)
+        if not self.is_restorable(cache_key):
+            cache_key = None
+        return DatasetSnapshot(data_loader, aggregates=aggregates, cache_key=cache_key)
+
+
+    def share(self, data_loader, cache_key):
+        """
+        Publishes loaded data to the shared store, then reads it from there as the other server processes do,
+        releasing the private copy. Does nothing without a shared store.
+        """
+        if self.__shared_store is None or cache_key is None:
+            return
+        shared_data = self.__shared_store.publish(cache_key, data_loader.get_data(), data_loader.get_cube())
+        if shared_data is not None:
+            data_loader.attach_shared_data(*shared_data)
+
+
+    def is_restorable(self, cache_key):
+        """
+        Whether a dataset can be loaded again from its cache key alone, from the dataset cache or the shared store.
+        """
+        return any(cache is not None and cache.contains(cache_key) for cache in (self.__dataset_cache, self.__shared_store))
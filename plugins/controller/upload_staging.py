@@ -0,0 +1,122 @@
+import os
+import uuid
+
+from plugins.model.data_loader import DataLoader
+from plugins.model.heatmap_exception import HeatmapException
+from plugins.model.upload_decoder import UploadDecoder
+
+
+class UploadStaging:
+    """
+    Hands uploads parsed by background callbacks over to the server. Background callbacks run in another process,
+    so the parsed data goes through a DatasetCache: the persistent dataset cache when enabled, which keeps it,
+    or a private staging cache, whose entries are removed once restored. Each upload job gets its own entry in the
+    staging cache, so sessions uploading the same file at once never restore nor remove each other's entry.
+    Uploads loaded lazily are only decoded into a file of the upload directory, handed over by an opaque upload id:
+    server paths never reach the browser, and ids sent back can only designate files of that directory.
+    \nAttributes:
+    cache: DatasetCache receiving the parsed uploads, None when staging is unavailable
+    upload_directory: folder of the decoded upload files, None when uploads cannot be staged as files
+    """
+    def __init__(self, cache, persistent, upload_directory = None):
+        """
+        \nArgs:
+        cache (DatasetCache): cache receiving the parsed uploads, or None
+        persistent (bool): whether cache is the dataset cache, whose entries are kept once restored
+        upload_directory (str, optional): folder of the decoded upload files
+        """
+        self.__cache = cache
+        self.__persistent = persistent
+        self.__upload_directory = upload_directory
+
+
+    @property
+    def cache(self):
+        return self.__cache
+
+
+    @property
+    def upload_directory(self):
+        return self.__upload_directory
+
+
+    def stage(self, filepath, progress_callback = None):
+        """
+        Parses a data file into the staging cache. Files already in the persistent dataset cache are not parsed again.
+        \nArgs:
+        filepath (str or bytes-like): path to the data file, or its content
+        progress_callback (callable, optional): forwarded to DataLoader, called with (bytes_read, total_bytes, rows_loaded)
+        \nReturns:
+        tuple (cache key of the file, key of the staged entry to restore), the same in the persistent dataset cache
+        """
+        if self.__cache is None:
+            raise HeatmapException("Staging an upload requires a dataset cache or a staging directory")
+
+        cache_key = self.__cache.file_key(filepath)
+        if self.__persistent and self.__cache.contains(cache_key):
+            print(f"[{self.__class__.__name__}] [STAGE]: Upload {cache_key} already parsed")
+            return cache_key, cache_key
+
+        staging_key = cache_key if self.__persistent else f"{cache_key}-{uuid.uuid4().hex}" # Removed once restored by this job's session
+        data_loader = DataLoader()
+        data_loader.get_data_from_file(filepath, progress_callback=progress_callback)
+        self.__cache.put(staging_key, data_loader.get_data())
+        print(f"[{self.__class__.__name__}] [STAGE]: Upload {staging_key} parsed and staged")
+        return cache_key, staging_key
+
+
+    def restore(self, staging_key):
+        """
+        Restores a staged upload. Entries of the private staging cache are only kept until they are restored.
+        \nArgs:
+        staging_key (str): key of the staged entry, as returned by stage
+        \nReturns:
+        DataFrame, or None when the upload is not staged
+        """
+        if self.__cache is None or staging_key is None:
+            return None
+        data = self.__cache.get(staging_key)
+        if not self.__persistent:
+            self.__cache.remove(staging_key)
+        return data
+
+
+    def discard(self, staging_key):
+        """
+        Removes a staged upload that was loaded otherwise (e.g. attached from the shared store).
+        """
+        if self.__cache is not None and not self.__persistent and staging_key is not None:
+            self.__cache.remove(staging_key)
+
+
+    def stage_file(self, contents):
+        """
+        Decodes an upload into its own file of the upload directory, to be loaded from there (e.g. indexed with lazy loading).
+        \nArgs:
+        contents (str): dcc.Upload contents, 'data:<type>;base64,<payload>'
+        \nReturns:
+        str: upload id of the file, to be passed to staged_file
+        """
+        if self.__upload_directory is None:
+            raise HeatmapException("Staging an upload file requires an upload directory")
+        path = UploadDecoder.decode(contents, 0, self.__upload_directory)
+        print(f"[{self.__class__.__name__}] [STAGE_FILE]: Upload decoded to {path}")
+        return os.path.basename(path) # Unique file name, the folder stays on the server
+
+
+    def staged_file(self, upload_id):
+        """
+        Gets the file of an upload decoded by stage_file. Ids only designate files of the upload directory:
+        anything else (other folders, '..', symbolic links leading outside, missing files) is rejected.
+        \nArgs:
+        upload_id (str): upload id, as returned by stage_file
+        \nReturns:
+        str: path of the decoded upload file
+        """
+        if self.__upload_directory is None or not isinstance(upload_id, str) or os.path.basename(upload_id) != upload_id:
+            raise HeatmapException(f"Invalid upload id {upload_id!r}")
+        directory = os.path.realpath(self.__upload_directory)
+        path = os.path.realpath(os.path.join(directory, upload_id))
+        if os.path.dirname(path) != directory or not os.path.isfile(path):
+            raise HeatmapException(f"Upload {upload_id!r} is not staged")
+        return path
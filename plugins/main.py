@@ -1,27 +1,122 @@
-import base64
 import os
+import tempfile
 
 from webviz_config import WebvizPluginABC
-from dash import html, dcc, Input, Output, State
+from dash import html, dcc, Input, Output, State, MATCH, ALL, Patch, DiskcacheManager, no_update
+from dash.exceptions import PreventUpdate
+from flask import Response, abort, request
 import plotly.express as px
+import diskcache
 
-from plugins.model.heatmap_data_formatter import HeatmapDataMode
+from plugins.model.heatmap_data_formatter import HeatmapDataMode, HeatmapComparison
+from plugins.model.heatmap_builder import HeatmapBuilder
+from plugins.model.dataset_cache import DatasetCache
 from plugins.model.utilitary import Utilitary
+from plugins.model.level_of_detail import LevelOfDetail
+from plugins.model.upload_decoder import UploadDecoder
+from plugins.model.heatmap_exception import HeatmapException
 
+from plugins.controller.controller_settings import ControllerSettings
 from plugins.controller.data_controller import DataController, DataControllerState
+from plugins.controller.dataset_registry import DatasetRegistry
+from plugins.controller.response_compression import ResponseCompression
+from plugins.controller.snapshot_loader import SnapshotLoader
 
 
 class Heatmap(WebvizPluginABC):
     """
     Heatmap plugin built by webviz project.yaml
+    \nArgs:
+    cache_directory (str, optional): folder where parsed datasets are cached between uploads
+    cache_max_megabytes (int, optional): size cap of the dataset cache
+    memmap_directory (str, optional): folder where loaded datasets are memory-mapped, for datasets larger than RAM
+    materialize_aggregates (bool, optional): precomputes every heatmap matrix when a file is loaded
+    heatmap_cache_megabytes (int, optional): memory budget of the cache of gathered heatmap matrices, per dataset
+    lod_max_models (int, optional): maximum number of model columns sent per heatmap before models are binned (refined on zoom)
+    tile_threshold_cells (int, optional): heatmaps with more cells are drawn from image tiles served by the plugin. Disabled by default.
+    tile_cache_megabytes (int, optional): memory budget of the tile pyramids kept for serving tiles, per dataset
+    compress_responses (bool, optional): gzips the server's responses, heatmap figures included. Their sizes are logged either way.
+    heatmap_workers (int, optional): threads building heatmaps, shared by all sessions. Default is one per core.
+    upload_jobs_directory (str, optional): folder of the background upload jobs (progress, results and parsed uploads handed over to the server)
+    upload_spill_megabytes (int, optional): uploads larger than this are decoded into a file instead of being parsed from memory
+    lazy_loading (bool, optional): indexes uploaded files and parses each iteration when it is first displayed, instead of the whole file
+    follow_interval_seconds (int, optional): how often a followed file is checked for appended lines
+    dataset_memory_megabytes (int, optional): memory budget of the datasets loaded by all browser sessions, least recently used ones being evicted above it
+    shared_directory (str, optional): folder where loaded datasets are shared by the server's worker processes, such as a folder under /dev/shm.
+        Disabled by default.
+    shared_max_megabytes (int, optional): size cap of the shared datasets folder
+    follow_directory (str, optional): folder of the files that can be followed, such as the output folder of DA runs.
+        Files outside it cannot be followed. Following files is disabled by default.
     """
-    def __init__(self, app):
-        self.controller = DataController() # Controller instance
+    UPLOAD_JOBS_DIRECTORY = os.path.join(tempfile.gettempdir(), 'davis_upload_jobs')
+
+    def __init__(self, app, cache_directory: str = DatasetCache.DEFAULT_DIRECTORY, cache_max_megabytes: int = 2048, memmap_directory: str = None,
+                 materialize_aggregates: bool = False, heatmap_cache_megabytes: int = 256, lod_max_models: int = 1000,
+                 tile_threshold_cells: int = None, tile_cache_megabytes: int = 512, compress_responses: bool = True,
+                 heatmap_workers: int = None, upload_jobs_directory: str = UPLOAD_JOBS_DIRECTORY, upload_spill_megabytes: int = 256,
+                 lazy_loading: bool = False, follow_interval_seconds: int = 5, dataset_memory_megabytes: int = 4096,
+                 shared_directory: str = None, shared_max_megabytes: int = 8192, follow_directory: str = None):
+        # Plugin arguments stay flat for project.yaml, the controllers receive them grouped
+        self.settings = ControllerSettings(cache_directory=cache_directory, cache_max_bytes=cache_max_megabytes * 2**20, memmap_directory=memmap_directory,
+                                           materialize_aggregates=materialize_aggregates, heatmap_cache_max_bytes=heatmap_cache_megabytes * 2**20,
+                                           lod_max_models=lod_max_models, tile_threshold_cells=tile_threshold_cells,
+                                           tile_cache_max_bytes=tile_cache_megabytes * 2**20, heatmap_workers=heatmap_workers,
+                                           staging_directory=os.path.join(upload_jobs_directory, 'staging'),
+                                           upload_directory=os.path.join(upload_jobs_directory, 'uploads'), lazy_loading=lazy_loading,
+                                           shared_directory=shared_directory, shared_max_bytes=shared_max_megabytes * 2**20,
+                                           follow_directory=follow_directory)
+        self.snapshot_loader = SnapshotLoader(self.settings) # Shared by the controllers, stages background uploads
+        self.heatmap_executor = DataController.create_heatmap_executor(self.settings) # Shared by the controllers, bounds concurrent heatmap builds
+        self.empty_controller = DataController(self.settings, self.snapshot_loader, self.heatmap_executor) # Builds the layout placeholders, never holds a dataset
+        # Each session's dataset has its own controller, found by the dataset id in the session's uploaded-data store
+        self.registry = DatasetRegistry(self.create_controller, dataset_memory_megabytes * 2**20, self.snapshot_loader.shared_store)
+        self.tile_url = None # Set by set_tile_route
+        # Uploads are parsed by background callbacks, in processes managed through a disk cache
+        self.upload_manager = DiskcacheManager(diskcache.Cache(os.path.join(upload_jobs_directory, 'jobs')))
+        self.upload_spill_bytes = upload_spill_megabytes * 2**20
+        self.follow_interval_seconds = follow_interval_seconds
         self.color_scales = px.colors.named_colorscales() # Default colorscales already present in plotly
         super().__init__()
+        ResponseCompression.init_app(app.server, compress=compress_responses) # Payload sizes are logged either way
+        self.set_tile_route(app)
         self.set_callbacks(app)
 
 
+    def create_controller(self, dataset_id):
+        """
+        Creates the controller of a session's dataset, serving its tiles under the dataset id
+        """
+        controller = DataController(self.settings, self.snapshot_loader, self.heatmap_executor)
+        controller.tile_url = f"{self.tile_url}/{dataset_id}"
+        return controller
+
+
+    def set_tile_route(self, app):
+        """
+        Registers the Flask route serving the PNG tiles of tiled heatmaps on the Dash server
+        """
+        route = f"/davis/{self.uuid('tiles')}" # Unique per plugin instance, each one having its own registry
+        self.tile_url = app.get_relative_path(route)
+
+        def serve_tile(dataset_id, pyramid_id, level, tile_row, tile_column):
+            controller = self.registry.get(dataset_id, restore=False) # An evicted dataset's pyramids are gone with it
+            pyramid = controller.tile_pyramids.get(pyramid_id) if controller is not None else None
+            if pyramid is None:
+                abort(404)
+            try:
+                png = pyramid.render_tile(level, tile_row, tile_column, request.args.get('colorscale', 'bluered'))
+            except IndexError:
+                abort(404)
+            except Exception as e: # Unknown colorscale
+                print(f"[{self.__class__.__name__}] [SERVE_TILE]: Error while rendering tile: {str(e)}")
+                abort(400)
+            # Pyramid ids identify the view's data, so a tile URL always serves the same image
+            return Response(png, mimetype='image/png', headers={'Cache-Control': 'private, max-age=3600'})
+
+        app.server.add_url_rule(f"{route}/<dataset_id>/<pyramid_id>/<int:level>/<int:tile_row>/<int:tile_column>.png",
+                                endpoint=self.uuid('tiles'), view_func=serve_tile)
+
+
     @property
     def layout(self):
         """
@@ -29,6 +124,7 @@ class Heatmap(WebvizPluginABC):
         """
         return html.Div([
                 dcc.Store(id='uploaded-data', storage_type='memory'),
+                dcc.Store(id='staged-upload', storage_type='memory'), # Upload parsed in the background, to be restored by the server
                 html.Div([
                     html.Div([
                         html.H5("Upload file"),
@@ -46,6 +142,20 @@ class Heatmap(WebvizPluginABC):
                             },
                             multiple=False  # Permite apenas um arquivo
                         ),
+                        html.Div([
+                            html.Progress(id='upload-progress', value=0, max=100, style={'width': '300px'}),
+                            html.Div(id='upload-progress-status'),
+                            html.Button("Cancel upload", id='cancel-upload', n_clicks=0, disabled=True)
+                            ],
+                            id='upload-progress-container',
+                            style={'display': 'none'}),
+                        html.Div([
+                            dcc.Input(id='follow-path', type='text', placeholder="Path of a run's output file, in the follow directory", style={'width': '300px'}),
+                            html.Button("Follow file", id='follow-file', n_clicks=0)
+                            ],
+                            style={'display': 'none'} if self.settings.follow_directory is None else {}),
+                        dcc.Interval(id='follow-interval', interval=self.follow_interval_seconds * 1000, disabled=True),
+                        dcc.Store(id='followed-data', storage_type='memory'), # Iterations changed by the last refresh of the followed file
                         html.Div(id='file-upload-status', style={'marginTop': '10px', 'color': 'green'})
                     ],
                     style={'display': 'flex', 'justify-content': 'center', 'flex-direction': 'column', 
@@ -70,7 +180,7 @@ class Heatmap(WebvizPluginABC):
                 ),
 
                 html.Div([
-                    self.controller.build_filters()
+                    self.empty_controller.build_filters()
                     ],
                     id='filters-container',
                     style={'width': '100%', 'display': 'flex',
@@ -78,7 +188,7 @@ class Heatmap(WebvizPluginABC):
                     'align-items': 'center'}),
 
                 html.Div([
-                    self.controller.build_iteration_selector()
+                    self.empty_controller.build_iteration_selector()
                     ],
                     id='iterations-container',
                     style={'display': 'flex', 'margin-top': '16px'}),
@@ -88,7 +198,12 @@ class Heatmap(WebvizPluginABC):
                         options=[
                             {'label': 'MAX', 'value': "MAX"},
                             {'label': 'AVERAGE', 'value': "AVG"},
-                            {'label': 'MIN', 'value': "MIN"}                       
+                            {'label': 'MIN', 'value': "MIN"},
+                            {'label': 'STD DEV', 'value': "STD"},
+                            {'label': 'COUNT', 'value': "COUNT"},
+                            {'label': 'MEDIAN', 'value': "MEDIAN"},
+                            {'label': 'P90', 'value': "P90"},
+                            {'label': '|NQDS| > 1', 'value': "EXCEEDANCE"}
                         ],
                         value="MAX"  # Initial value: MAX
                     ),
@@ -100,6 +215,15 @@ class Heatmap(WebvizPluginABC):
                             {'label': 'DESCENDING', 'value': 'descend'}                          
                         ],
                         value='default'  # Initial value: DEFAULT
+                    ),
+                    dcc.RadioItems(
+                        id='comparison-selector',
+                        options=[
+                            {'label': 'VALUES', 'value': 'NONE'},
+                            {'label': 'CHANGE FROM PREVIOUS', 'value': 'DELTA'},
+                            {'label': 'RATIO TO PREVIOUS', 'value': 'RATIO'}
+                        ],
+                        value='NONE'  # Initial value: iteration values, no comparison
                     )
                 ], style={'display': 'flex', 'flex-direction': 'row', 'margin-top': '16px'}),
                 html.Div(
@@ -113,58 +237,196 @@ class Heatmap(WebvizPluginABC):
             ], style={'display': 'flex', 'justify-content': 'center', 'flex-direction': 'column', 'align-items': 'center'}),
         ], style={'height': '100vh'})
      
+    @staticmethod
+    def comparison_from_selector(comparison_selection):
+        """
+        Converts the comparison selector's value to a HeatmapComparison, None for plain values
+        """
+        return None if comparison_selection == 'NONE' else HeatmapComparison[comparison_selection]
+
+    @staticmethod
+    def build_filter_map(wells_filter, models_filter, attributes_filter):
+        """
+        Builds the filter map used by DataController from the filter components' values
+        """
+        return {
+            "Wells": sorted(wells_filter, key=Utilitary.natural_sort_key), # Special key for sorting strings like PROD10 and PROD2 correctly
+            "Models": sorted(models_filter),
+            "Attributes": sorted(attributes_filter)
+        }
+
+    def dataset_controller(self, dataset_id):
+        """
+        Gets the controller of a session's dataset, stopping the callback when it is no longer loaded
+        """
+        controller = self.registry.get(dataset_id)
+        if controller is None:
+            raise PreventUpdate
+        return controller
+
     def set_callbacks(self, app):
         @app.callback(
-        [Output('file-upload-status', 'children'),
-        Output('uploaded-data', 'data')],  # Saída de status do upload
+        Output('staged-upload', 'data'),
         Input('upload-data', 'contents'),          # Input: conteúdo do arquivo
-        State('upload-data', 'filename')           # Estado: nome do arquivo
+        State('upload-data', 'filename'),          # Estado: nome do arquivo
+        background=True,
+        manager=self.upload_manager,
+        progress=[Output('upload-progress', 'value'), Output('upload-progress', 'max'), Output('upload-progress-status', 'children')],
+        running=[
+            (Output('upload-progress-container', 'style'), {'display': 'block', 'marginTop': '10px'}, {'display': 'none'}),
+            (Output('cancel-upload', 'disabled'), False, True)
+        ],
+        cancel=[Input('cancel-upload', 'n_clicks')],
+        prevent_initial_call=True
         )
-        def upload_file(contents, filename):
+        def upload_file(set_progress, contents, filename):
+            """
+            Decodes and parses an uploaded file in a background process, reporting the parsing progress.
+            The upload is parsed from memory, unless it is large enough to be spilled to its own file.
+            The parsed data is staged on disk, as the background process does not share memory with the server.
+            With lazy loading, the upload is only decoded into a file, which the server indexes and parses iteration by iteration.
+            The file is handed over by its upload id, its path never leaves the server.
+            """
             if contents is None:
-                return "No file uploaded.", None
+                return None
             print(f"[{self.__class__.__name__}] [UPLOAD_FILE]: Callback received")
             try:
-                temp_dir = "/tmp"
-                os.makedirs(temp_dir, exist_ok=True)
+                if self.settings.lazy_loading:
+                    upload_id = self.snapshot_loader.staging.stage_file(contents)
+                    print(f"[{self.__class__.__name__}] [UPLOAD_FILE]: File '{filename}' decoded for lazy loading")
+                    return {'filename': filename, 'upload_id': upload_id}
 
-                content_type, content_string = contents.split(',')
-                decoded = base64.b64decode(content_string)
+                source = UploadDecoder.decode(contents, self.upload_spill_bytes, self.settings.upload_directory)
 
-                # Caminho temporário para salvar o arquivo
-                temp_path = f"/tmp/{filename}"
-                with open(temp_path, 'wb') as temp_file:
-                    temp_file.write(decoded)
+                def report_progress(bytes_read, total_bytes, rows_loaded):
+                    set_progress((bytes_read, total_bytes, f"Parsing '{filename}': {rows_loaded} rows read"))
 
-                # Atualiza o DataLoader chamando `get_data_from_file`
-                self.controller.load_uploaded_data(temp_path)
-
-                print(f"[{self.__class__.__name__}] [UPLOAD_FILE]: File '{filename}' loaded into DataLoader")
-                return f"File '{filename}' successfully uploaded!", True
+                try:
+                    cache_key, staging_key = self.snapshot_loader.staging.stage(source, report_progress)
+                finally:
+                    if isinstance(source, str): # Spilled file, no longer needed once parsed
+                        os.remove(source)
+                print(f"[{self.__class__.__name__}] [UPLOAD_FILE]: File '{filename}' parsed in the background")
+                return {'filename': filename, 'cache_key': cache_key, 'staging_key': staging_key}
 
             except Exception as e:
                 print(f"[{self.__class__.__name__}] [UPLOAD_FILE]: Error while uploading file '{filename}: {str(e)}'")
+                return {'filename': filename, 'error': str(e)}
+
+
+        @app.callback(
+        [Output('file-upload-status', 'children'),
+        Output('uploaded-data', 'data')],  # Saída de status do upload
+        Input('staged-upload', 'data')
+        )
+        def load_staged_upload(staged_upload):
+            """
+            Loads an upload parsed in the background into a new controller, restoring it from the upload cache,
+            or indexes the decoded upload file with lazy loading (the file is then removed with the data).
+            Upload ids only designate files of the upload directory, and are only accepted with lazy loading.
+            The dataset is registered, and its id kept in the session's uploaded-data store.
+            """
+            if staged_upload is None:
+                return "No file uploaded.", None
+            filename = staged_upload['filename']
+            if 'error' in staged_upload:
+                return f"Error while uploading file: {staged_upload['error']}", False
+            try:
+                # Atualiza o DataLoader com os dados processados em segundo plano
+                filepath = None
+                if staged_upload.get('upload_id') is not None:
+                    if not self.settings.lazy_loading:
+                        raise HeatmapException("Upload files are only loaded with lazy loading")
+                    filepath = self.snapshot_loader.staging.staged_file(staged_upload['upload_id'])
+                dataset_id, controller = self.registry.create()
+                controller.load_uploaded_data(filepath, cache_key=staged_upload.get('cache_key'), remove_file=filepath is not None,
+                                              staging_key=staged_upload.get('staging_key'))
+                self.registry.register(dataset_id, controller)
+
+                print(f"[{self.__class__.__name__}] [LOAD_STAGED_UPLOAD]: File '{filename}' loaded into DataLoader")
+                return f"File '{filename}' successfully uploaded!", dataset_id
+
+            except Exception as e:
+                print(f"[{self.__class__.__name__}] [LOAD_STAGED_UPLOAD]: Error while loading file '{filename}: {str(e)}'")
                 return f"Error while uploading file: {str(e)}", False
 
 
+        @app.callback(
+        [Output('file-upload-status', 'children', allow_duplicate=True),
+        Output('uploaded-data', 'data', allow_duplicate=True),
+        Output('follow-interval', 'disabled')],
+        Input('follow-file', 'n_clicks'),
+        State('follow-path', 'value'),
+        prevent_initial_call=True
+        )
+        def follow_file(n_clicks, path):
+            """
+            Loads a local file written by a run in progress, as a new dataset, and starts checking it for appended lines.
+            """
+            if not path:
+                raise PreventUpdate
+            try:
+                dataset_id, controller = self.registry.create()
+                controller.follow_file(path)
+                self.registry.register(dataset_id, controller)
+                print(f"[{self.__class__.__name__}] [FOLLOW_FILE]: Following '{path}'")
+                return f"Following '{path}'", dataset_id, False
+            except Exception as e: # Details stay in the server logs, they may reveal the server's files
+                print(f"[{self.__class__.__name__}] [FOLLOW_FILE]: Error while following file '{path}': {str(e)}")
+                return "This file cannot be followed.", False, True
+
+
+        @app.callback(
+        [Output('followed-data', 'data'),
+        Output('iterations-checklist', 'options')],
+        Input('follow-interval', 'n_intervals'),
+        [State('followed-data', 'data'),
+        State('uploaded-data', 'data')],
+        prevent_initial_call=True
+        )
+        def refresh_followed_file(n_intervals, followed_data, dataset_id):
+            """
+            Loads the lines appended to the session's followed file. Heatmaps are rebuilt when iterations changed,
+            and new iterations are added to the iteration selector, keeping the selection.
+            """
+            controller = self.dataset_controller(dataset_id)
+            snapshot = controller.snapshot
+            iterations = controller.refresh_followed_file()
+            if not iterations or snapshot is None:
+                raise PreventUpdate
+            revision = (followed_data or {}).get('revision', 0) + 1
+            known_iterations = snapshot.data_loader.get_iteration_numbers()
+            loaded_iterations = controller.data_loader.get_iteration_numbers()
+            options = no_update
+            if loaded_iterations != known_iterations:
+                options = [{'label': str(iteration), 'value': iteration} for iteration in sorted(loaded_iterations)]
+            return {'revision': revision, 'iterations': iterations}, options
+
+
         @app.callback(
         Output('graph-container', 'children'),
         [Input('uploaded-data', 'data'),  # Adiciona o estado dos dados como dependência
         Input('iterations-checklist', 'value'),
-        Input('color-scale-dropdown', 'value'),
-        Input('axis-inversion', 'n_clicks'),
         Input('data-selection', 'value'),
         Input('wells-filter', 'value'),
         Input('models-filter', 'value'),
         Input('attributes-filter', 'value'),
         Input('mode-selector', 'value'),
-        Input('ordering-selector', 'value')]
+        Input('ordering-selector', 'value'),
+        Input('comparison-selector', 'value'),
+        Input('followed-data', 'data')],
+        # Cosmetic controls are applied to the existing figures by their own callbacks
+        [State('color-scale-dropdown', 'value'),
+        State('axis-inversion', 'n_clicks')]
         )
-        def update_figure(data_loaded, iterations, colorscale, axisinvertclicks, heatmap_selection, wells_filter, models_filter, attributes_filter, graphmode, order):
+        def update_figure(data_loaded, iterations, heatmap_selection, wells_filter, models_filter, attributes_filter, graphmode, order, comparison_selection,
+                          followed_data, colorscale, axisinvertclicks):
             """
-            Callback responsible for generating heatmap(s) and updating the figure based on filter update accordingly
+            Callback responsible for generating heatmap(s) and updating the figure based on filter update accordingly.
+            Only data-affecting controls trigger it, lines appended to a followed file included; ordering sorts the cached matrices again.
             """
-            if not data_loaded or self.controller.get_state() in [DataControllerState.LOADING, DataControllerState.NULL]:
+            controller = self.registry.get(data_loaded)
+            if controller is None or controller.snapshot is None: # Reloads keep serving the previous snapshot, so only the first load waits
                 return html.Div("No data loaded. Please upload a file.", style={'color': 'red'})
             
             print(f"[{self.__class__.__name__}] [UPDATE_FIGURE]: Callback received")
@@ -179,25 +441,259 @@ class Heatmap(WebvizPluginABC):
                 transposed = True
 
             # Builds filter map
-            filters = {
-                "Wells": sorted(wells_filter, key=Utilitary.natural_sort_key), # Special key for sorting strings like PROD10 and PROD2 correctly
-                "Models": sorted(models_filter),
-                "Attributes": sorted(attributes_filter)
-            }
+            filters = self.build_filter_map(wells_filter, models_filter, attributes_filter)
 
             # Debug: print the filters dictionary
             print(f"[{self.__class__.__name__}] [UPDATE_FIGURE]: Filters dictionary: {filters}")
 
-            graphs = []
-         
-            # Builds a heatmap for each iteration selected
-            for i in iterations:
-                print(f'[{self.__class__.__name__}] [UPDATE_FIGURE]: Building iteration: {i}')
-                new_heatmap = self.controller.build_heatmap(heatmap_selection_enum, i, heatmap_mode_enum, filters, colorscale, order, transposed)
-                graphs.append(new_heatmap)
+            # Builds a heatmap for each iteration selected, concurrently
+            return controller.build_heatmaps(heatmap_selection_enum, iterations, heatmap_mode_enum, filters, colorscale, order, transposed,
+                                                  self.comparison_from_selector(comparison_selection))
+
+
+        @app.callback(
+            [Output({'type': 'heatmap', 'iteration': MATCH}, 'figure'),
+            Output({'type': 'heatmap-lod', 'iteration': MATCH}, 'data')],
+            Input({'type': 'heatmap', 'iteration': MATCH}, 'relayoutData'),
+            [State({'type': 'heatmap-lod', 'iteration': MATCH}, 'data'),
+            State({'type': 'heatmap', 'iteration': MATCH}, 'id'),
+            State('color-scale-dropdown', 'value'),
+            State('axis-inversion', 'n_clicks'),
+            State('data-selection', 'value'),
+            State('wells-filter', 'value'),
+            State('models-filter', 'value'),
+            State('attributes-filter', 'value'),
+            State('mode-selector', 'value'),
+            State('ordering-selector', 'value'),
+            State('comparison-selector', 'value'),
+            State('iterations-checklist', 'value'),
+            State('uploaded-data', 'data')],
+            prevent_initial_call=True
+        )
+        def refine_level_of_detail(relayout_data, lod_state, graph_id, colorscale, axisinvertclicks, heatmap_selection, wells_filter, models_filter, attributes_filter, graphmode, order,
+                                   comparison_selection, iterations, dataset_id):
+            """
+            Callback responsible for rebuilding a heatmap at the level of detail of the zoomed models window,
+            and back to the binned overview when the zoom is reset
+            """
+            changed, models_window = LevelOfDetail.window_from_relayout(relayout_data, lod_state)
+            # Zooming on a full resolution view is handled by the browser
+            if not changed or (models_window is not None and not lod_state['binned']) or (models_window is None and lod_state['window'] is None):
+                raise PreventUpdate
+
+            print(f"[{self.__class__.__name__}] [REFINE_LEVEL_OF_DETAIL]: Models window: {models_window}")
+            filters = self.build_filter_map(wells_filter, models_filter, attributes_filter)
+            comparison, reference_iteration = DataController.iteration_comparison(graph_id['iteration'], iterations, self.comparison_from_selector(comparison_selection))
+            heatmap_graph, new_lod_state = self.dataset_controller(dataset_id).build_heatmap_graph(
+                DataControllerState[heatmap_selection], graph_id['iteration'], HeatmapDataMode[graphmode], filters, colorscale, order,
+                axisinvertclicks % 2 != 0, models_window, comparison, reference_iteration)
+            return heatmap_graph.figure, new_lod_state
+
+
+        @app.callback(
+            [Output({'type': 'heatmap', 'iteration': ALL}, 'figure', allow_duplicate=True),
+            Output({'type': 'tiled-heatmap', 'iteration': ALL}, 'figure', allow_duplicate=True)],
+            Input('color-scale-dropdown', 'value'),
+            [State({'type': 'heatmap', 'iteration': ALL}, 'id'),
+            State({'type': 'heatmap-tiles', 'iteration': ALL}, 'data'),
+            State('uploaded-data', 'data')],
+            prevent_initial_call=True
+        )
+        def update_colorscale(colorscale, heatmap_ids, tile_states, dataset_id):
+            """
+            Callback responsible for applying a colorscale to the existing heatmaps as partial figure updates,
+            without gathering their data again
+            """
+            print(f"[{self.__class__.__name__}] [UPDATE_COLORSCALE]: Colorscale: {colorscale}")
+            resolved_colorscale = HeatmapBuilder.resolve_colorscale(colorscale)
+
+            heatmap_patches = []
+            for _ in heatmap_ids:
+                patch = Patch()
+                patch['data'][0]['colorscale'] = resolved_colorscale
+                heatmap_patches.append(patch)
+
+            tiled_patches = []
+            controller = self.registry.get(dataset_id) if tile_states else None
+            for tile_state in tile_states:
+                patch = Patch()
+                patch['data'][0]['colorscale'] = resolved_colorscale
+                images = controller.tile_images(tile_state, colorscale) if tile_state and controller is not None else None
+                if images is not None:
+                    patch['layout']['images'] = images
+                tiled_patches.append(patch)
+            return heatmap_patches, tiled_patches
+
+
+        # Transposes the heatmaps in the browser: plotly's transpose attribute swaps z, and the axes are swapped around it.
+        # Ordering sorts the rows of the transposed matrix, which the browser cannot reproduce: transpose_ordered_heatmaps rebuilds them
+        app.clientside_callback(
+            """
+            function(n_clicks, figures, lod_states, order) {
+                if (order !== 'default') {
+                    throw window.dash_clientside.PreventUpdate;
+                }
+                const transposed = n_clicks % 2 !== 0;
+                const no_update = window.dash_clientside.no_update;
+                const swapPlaceholders = (template) => template &&
+                    template.replace(/%\{x\}/g, '%{_}').replace(/%\{y\}/g, '%{x}').replace(/%\{_\}/g, '%{y}');
+                const axisTitle = (axis) => (axis.title && axis.title.text !== undefined) ? axis.title.text : axis.title;
+
+                const new_figures = [];
+                const new_states = [];
+                figures.forEach((figure, i) => {
+                    const lod_state = lod_states[i];
+                    if (!figure || !lod_state || lod_state.transposed === transposed) {
+                        new_figures.push(no_update);
+                        new_states.push(no_update);
+                        return;
+                    }
+                    const trace = figure.data[0];
+                    const layout = figure.layout;
+                    const xaxis = Object.assign({}, layout.yaxis, {autorange: true});
+                    const yaxis = Object.assign({}, layout.xaxis, {autorange: true});
+                    delete xaxis.range;
+                    delete yaxis.range;
+                    new_figures.push(Object.assign({}, figure, {
+                        data: [Object.assign({}, trace, {
+                            x: trace.y,
+                            y: trace.x,
+                            transpose: !trace.transpose,
+                            hovertemplate: swapPlaceholders(trace.hovertemplate)
+                        })].concat(figure.data.slice(1)),
+                        layout: Object.assign({}, layout, {
+                            xaxis: xaxis,
+                            yaxis: yaxis,
+                            title: {text: axisTitle(yaxis) + ' x ' + axisTitle(xaxis)}
+                        })
+                    }));
+                    const axis = {x: 'y', y: 'x'}[lod_state.axis] || null;
+                    new_states.push(Object.assign({}, lod_state, {transposed: transposed, axis: axis}));
+                });
+                return [new_figures, new_states];
+            }
+            """,
+            [Output({'type': 'heatmap', 'iteration': ALL}, 'figure', allow_duplicate=True),
+            Output({'type': 'heatmap-lod', 'iteration': ALL}, 'data', allow_duplicate=True)],
+            Input('axis-inversion', 'n_clicks'),
+            [State({'type': 'heatmap', 'iteration': ALL}, 'figure'),
+            State({'type': 'heatmap-lod', 'iteration': ALL}, 'data'),
+            State('ordering-selector', 'value')],
+            prevent_initial_call=True
+        )
+
+
+        @app.callback(
+            [Output({'type': 'heatmap', 'iteration': ALL}, 'figure', allow_duplicate=True),
+            Output({'type': 'heatmap-lod', 'iteration': ALL}, 'data', allow_duplicate=True)],
+            Input('axis-inversion', 'n_clicks'),
+            [State({'type': 'heatmap', 'iteration': ALL}, 'id'),
+            State({'type': 'heatmap-lod', 'iteration': ALL}, 'data'),
+            State('color-scale-dropdown', 'value'),
+            State('data-selection', 'value'),
+            State('wells-filter', 'value'),
+            State('models-filter', 'value'),
+            State('attributes-filter', 'value'),
+            State('mode-selector', 'value'),
+            State('ordering-selector', 'value'),
+            State('comparison-selector', 'value'),
+            State('iterations-checklist', 'value'),
+            State('uploaded-data', 'data')],
+            prevent_initial_call=True
+        )
+        def transpose_ordered_heatmaps(axisinvertclicks, graph_ids, lod_states, colorscale, heatmap_selection, wells_filter, models_filter, attributes_filter, graphmode, order,
+                                       comparison_selection, iterations, dataset_id):
+            """
+            Callback responsible for transposing sorted heatmaps, whose rows are sorted again once transposed.
+            Heatmaps in default order are transposed in the browser.
+            """
+            if order == 'default' or not graph_ids:
+                raise PreventUpdate
+            controller = self.dataset_controller(dataset_id)
+            transposed = axisinvertclicks % 2 != 0
+            filters = self.build_filter_map(wells_filter, models_filter, attributes_filter)
+
+            figures = []
+            new_lod_states = []
+            for graph_id, lod_state in zip(graph_ids, lod_states):
+                if not lod_state or lod_state['transposed'] == transposed:
+                    figures.append(no_update)
+                    new_lod_states.append(no_update)
+                    continue
+                comparison, reference_iteration = DataController.iteration_comparison(graph_id['iteration'], iterations, self.comparison_from_selector(comparison_selection))
+                heatmap_graph, new_lod_state = controller.build_heatmap_graph(
+                    DataControllerState[heatmap_selection], graph_id['iteration'], HeatmapDataMode[graphmode], filters, colorscale, order, transposed,
+                    lod_state['window'], comparison, reference_iteration)
+                figures.append(heatmap_graph.figure)
+                new_lod_states.append(new_lod_state)
+            return figures, new_lod_states
+
+
+        @app.callback(
+            [Output({'type': 'tiled-heatmap', 'iteration': ALL}, 'figure', allow_duplicate=True),
+            Output({'type': 'heatmap-tiles', 'iteration': ALL}, 'data', allow_duplicate=True)],
+            Input('axis-inversion', 'n_clicks'),
+            [State({'type': 'tiled-heatmap', 'iteration': ALL}, 'id'),
+            State({'type': 'heatmap-tiles', 'iteration': ALL}, 'data'),
+            State('color-scale-dropdown', 'value'),
+            State('data-selection', 'value'),
+            State('wells-filter', 'value'),
+            State('models-filter', 'value'),
+            State('attributes-filter', 'value'),
+            State('mode-selector', 'value'),
+            State('ordering-selector', 'value'),
+            State('comparison-selector', 'value'),
+            State('iterations-checklist', 'value'),
+            State('uploaded-data', 'data')],
+            prevent_initial_call=True
+        )
+        def transpose_tiled_heatmaps(axisinvertclicks, graph_ids, tile_states, colorscale, heatmap_selection, wells_filter, models_filter, attributes_filter, graphmode, order,
+                                     comparison_selection, iterations, dataset_id):
+            """
+            Callback responsible for transposing tiled heatmaps, whose tiles are rendered on the server
+            """
+            if not graph_ids:
+                raise PreventUpdate
+            controller = self.dataset_controller(dataset_id)
+            transposed = axisinvertclicks % 2 != 0
+            filters = self.build_filter_map(wells_filter, models_filter, attributes_filter)
+
+            figures = []
+            new_tile_states = []
+            for graph_id, tile_state in zip(graph_ids, tile_states):
+                comparison, reference_iteration = DataController.iteration_comparison(graph_id['iteration'], iterations, self.comparison_from_selector(comparison_selection))
+                heatmap_graph, new_tile_state = controller.build_tiled_heatmap_graph(
+                    DataControllerState[heatmap_selection], graph_id['iteration'], HeatmapDataMode[graphmode], filters, colorscale, order, transposed,
+                    comparison, reference_iteration)
+                figures.append(heatmap_graph.figure)
+                new_tile_states.append(new_tile_state)
+            return figures, new_tile_states
+
+
+        @app.callback(
+            [Output({'type': 'tiled-heatmap', 'iteration': MATCH}, 'figure'),
+            Output({'type': 'heatmap-tiles', 'iteration': MATCH}, 'data')],
+            Input({'type': 'tiled-heatmap', 'iteration': MATCH}, 'relayoutData'),
+            [State({'type': 'heatmap-tiles', 'iteration': MATCH}, 'data'),
+            State('color-scale-dropdown', 'value'),
+            State('uploaded-data', 'data')],
+            prevent_initial_call=True
+        )
+        def update_tiled_viewport(relayout_data, tile_state, colorscale, dataset_id):
+            """
+            Callback responsible for placing the tiles of the zoomed or panned viewport on a tiled heatmap,
+            at the pyramid level matching its resolution
+            """
+            viewport = self.dataset_controller(dataset_id).update_tiled_viewport(relayout_data, tile_state, colorscale)
+            if viewport is None:
+                raise PreventUpdate
+            images, new_tile_state = viewport
+            print(f"[{self.__class__.__name__}] [UPDATE_TILED_VIEWPORT]: {len(images)} tiles in viewport")
+            figure = Patch() # Only the images change, the zoom stays as the user left it
+            figure['layout']['images'] = images
+            return figure, new_tile_state
+
 
-            return graphs
-            
         @app.callback(
             Output('models-output', 'children'),
             Input('models-filter', 'value')
@@ -221,11 +717,12 @@ class Heatmap(WebvizPluginABC):
             """
             print(f"[{self.__class__.__name__}] [UPDATE_FILTERS_AND_ITERATIONS]: Callback received")
             # If controller is not ready or there is no data loaded, stops
-            if not data_loaded or self.controller.get_state() != DataControllerState.READY:
+            controller = self.registry.get(data_loaded)
+            if controller is None or controller.snapshot is None:
                 return html.Div("Please upload data first.", style={'color': 'red'}), None
 
             # Builds filters dynamically
-            filters = self.controller.build_filters()
-            iterations = self.controller.build_iteration_selector()
+            filters = controller.build_filters()
+            iterations = controller.build_iteration_selector()
             print(f"[{self.__class__.__name__}] [UPDATE_FILTERS_AND_ITERATIONS]: Filters and iterations built successfully")
             return filters, iterations
@@ -0,0 +1,129 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class DataCube:
+    """
+    Dense NumPy representation of the loaded data, indexed by iteration, model, attribute and well.
+    Cells without a line in the data file hold NaN.
+    \nAttributes:
+    values: float32 ndarray shaped (iterations, models, attributes, wells), possibly a read-only np.memmap
+    labels: (dictionary) sorted labels of each axis
+    positions: (dictionary) label -> position maps of each axis
+    """
+    AXES = ['Iteration', 'Models', 'Attributes', 'Wells']
+    MAX_CELLS = 250_000_000 # Cubes above this size (1 GiB in float32) are not built
+
+    def __init__(self, values, labels):
+        self.__values = values
+        self.__labels = labels
+        self.__positions = {axis: {label: position for position, label in enumerate(axis_labels)} for axis, axis_labels in labels.items()}
+
+
+    @property
+    def values(self):
+        return self.__values
+
+
+    @property
+    def labels(self):
+        return self.__labels
+
+
+    @property
+    def shape(self):
+        return self.__values.shape
+
+
+    @staticmethod
+    def from_frame(data, directory = None):
+        """
+        Builds a cube from the data loaded by DataLoader.
+        \nArgs:
+        data (DataFrame): Iteration, Models, Attributes, Wells and NQDS_Value columns
+        directory (str, optional): when given, the cube is written to a memory-mapped file in this folder
+        instead of being held in memory, and MAX_CELLS does not apply
+        \nReturns:
+        DataCube, or None when the data cannot be represented as a dense cube
+        (more than one line for the same cell, or more than MAX_CELLS cells in memory)
+        """
+        labels = {}
+        codes = []
+        for axis in DataCube.AXES:
+            column = data[axis]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                labels[axis] = column.cat.categories.tolist()
+                codes.append(column.array.codes)
+            else:
+                axis_values = column.to_numpy()
+                axis_labels = np.unique(axis_values)
+                labels[axis] = axis_labels.tolist()
+                codes.append(np.searchsorted(axis_labels, axis_values))
+
+        shape = tuple(len(labels[axis]) for axis in DataCube.AXES)
+        cell_count = int(np.prod(shape, dtype=np.int64))
+        if directory is None and cell_count > DataCube.MAX_CELLS:
+            print(f"[{DataCube.__name__}] [FROM_FRAME]: {cell_count} cells exceed the limit of {DataCube.MAX_CELLS}, cube not built")
+            return None
+
+        cell_values = data['NQDS_Value'].to_numpy()
+        valid_rows = ~np.isnan(cell_values)
+        if not valid_rows.all(): # NaN lines leave their cell empty, as groupby skips them
+            codes = [axis_codes[valid_rows] for axis_codes in codes]
+            cell_values = cell_values[valid_rows]
+        flat_positions = np.ravel_multi_index(codes, shape)
+
+        if directory is None:
+            values = np.full(shape, np.nan, dtype='float32')
+        else:
+            path = os.path.join(directory, 'cube.npy')
+            values = np.lib.format.open_memmap(path, mode='w+', dtype='float32', shape=shape)
+            values[...] = np.nan
+        values.reshape(-1)[flat_positions] = cell_values
+
+        # Repeated cells overwrite each other, leaving fewer filled cells than lines
+        filled_cells = sum(int(np.count_nonzero(~np.isnan(iteration_values))) for iteration_values in values)
+        if filled_cells < len(flat_positions):
+            print(f"[{DataCube.__name__}] [FROM_FRAME]: Data has repeated cells, cube not built")
+            return None
+
+        if directory is not None:
+            values.flush()
+            values = np.load(path, mmap_mode='r') # Read-only, pages are loaded on access
+        print(f"[{DataCube.__name__}] [FROM_FRAME]: Cube {shape} built, {values.nbytes / 2**20:.1f} MiB{' memory-mapped' if directory else ''}")
+        return DataCube(values, labels)
+
+
+    def position(self, axis, label):
+        """
+        Gets the position of a label along an axis.
+        \nArgs:
+        axis (str): axis name, one of DataCube.AXES
+        label: label of the axis
+        \nReturns:
+        int: position of the label
+        """
+        return self.__positions[axis][label]
+
+
+    def get_iteration(self, iteration):
+        """
+        Gets the (models, attributes, wells) slice of an iteration, without copying.
+        On a memory-mapped cube only the pages of this iteration are read.
+        \nArgs:
+        iteration (int): the number of the desired iteration
+        \nReturns:
+        ndarray view of the iteration
+        """
+        return self.__values[self.position('Iteration', iteration)]
+
+
+    def get_memory_usage(self):
+        """
+        Retrieves the memory footprint of the cube values.
+        \nReturns:
+        int: size in bytes
+        """
+        return int(self.__values.nbytes)
@@ -1,4 +1,26 @@
+import bz2
+import copy
+import csv
+import gzip
+import io
+import lzma
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+
+from plugins.model.data_cube import DataCube
+from plugins.model.iteration_index import IterationIndex
+from plugins.model.utilitary import Utilitary
+
+try:
+    import zstandard
+except ImportError: # Optional: only needed for zstd compressed files
+    zstandard = None
 
 class DataLoader:
     """
@@ -6,46 +28,267 @@ class DataLoader:
     \nAttributes:
     data: full DataFrame captured from loading data file
     iterations: (dictionary) DataFrames formatted by iterations
+    cube: DataCube of the data, or None when it cannot be built
+    memmap_directory: when set, data and cube are kept in memory-mapped files under this folder instead of in memory
+    index: IterationIndex of the file loaded by index_file, whose iterations are parsed on request (None when loaded in full)
+    appended: (dictionary) rows appended by with_appended_data to already loaded iterations, merged into them on request
     """
-    def __init__(self):
+    HEADER_LINES = 3 # Number of lines ignored at the beginning of every data file
+    RAW_COLUMNS = ['Iteration', 'Models', 'NQDS_Field', 'NQDS_Value'] # Layout: iteration;MODEL<n>;<nqds field>;value
+    CHUNK_SIZE = 1_000_000 # Lines parsed at a time when streaming a data file
+    PARSER_VERSION = 1 # Must be increased whenever the loaded data layout changes (invalidates DatasetCache entries)
+    COMPRESSION_MAGIC = {
+        b'\x1f\x8b': 'gzip',
+        b'BZh': 'bz2',
+        b'\xfd7zXZ\x00': 'xz',
+        b'\x28\xb5\x2f\xfd': 'zstd'
+    } # Leading bytes of compressed files -> compression
+
+    def __init__(self, memmap_directory = None):
         self.__data = None
         self.__iterations = {}
+        self.__cube = None
+        self.__memmap_directory = memmap_directory
+        self.__dataset_directory = None # Folder of the memory-mapped files of the loaded data
+        self.__index = None
+        self.__source = None # File (path or content) iterations are parsed from, when indexed
+        self.__source_owned = False # Whether the indexed file is removed when the data is cleared
+        self.__indexes = None # Filter indexes of the indexed file
+        self.__appended = {}
+        self.__parse_lock = threading.Lock() # Iterations are requested by concurrent heatmap builds
 
 
-    def get_data_from_file(self, path, maxmodels = None):
+    def get_data_from_file(self, path, maxmodels = None, chunksize = CHUNK_SIZE, progress_callback = None):
         """
-        Method for gathering data from specified path
+        Method for gathering data from specified path, or from the file's content already in memory.
+        The file is streamed in chunks of lines, so reading stops as soon as maxmodels is exceeded
+        and peak memory is bounded by the chunk size plus the loaded data.
         \nArgs:
-        path (str): Full path to the file.
+        path (str or bytes-like): Full path to the file, or its content (bytes are read without being copied).
+            gzip, bz2, xz and zstd compressed files are detected and decompressed while they are parsed.
         maxmodels (int, optional): Maximum number of models to load. Default is None (unlimited).
+        chunksize (int, optional): Number of lines parsed per chunk. None parses the whole file at once.
+        progress_callback (callable, optional): Called after each chunk with (bytes_read, total_bytes, rows_loaded).
+        """
+        chunks = []
+        rows_loaded = 0
+
+        source_file, file, total_bytes = self.open_source(path)
+        with source_file, file:
+            for raw_chunk in self.read_raw_chunks(file, chunksize):
+                chunk = self.format_file_frame(raw_chunk)
+
+                limit_reached = False
+                if maxmodels:
+                    truncated_chunk = self.truncate_at_maxmodels(chunk, maxmodels)
+                    limit_reached = len(truncated_chunk) < len(chunk)
+                    chunk = truncated_chunk
+
+                chunks.append(chunk)
+                rows_loaded += len(chunk)
+                if progress_callback:
+                    progress_callback(total_bytes if limit_reached else source_file.tell(), total_bytes, rows_loaded)
+
+                if limit_reached:
+                    print(f"[{self.__class__.__name__}] [GET_DATA_FROM_FILE]: Model limit {maxmodels} reached, stopped reading")
+                    break
+
+        self.set_data(self.concat_chunks(chunks))
+
+
+    def index_file(self, path, progress_callback = None, remove_on_clear = False):
+        """
+        Lazy alternative to get_data_from_file: indexes the byte ranges of the file's iterations (IterationIndex)
+        and parses only the first iteration, which provides the filter indexes. Other iterations are parsed
+        when get_iteration first requests them, and kept afterwards.
+        The filter indexes assume every iteration covers the same wells, attributes and models, as in DA output files.
+        \nArgs:
+        path (str or bytes-like): Full path to the file, or its content. Compressed files cannot be indexed.
+        progress_callback (callable, optional): Called once indexed with (bytes_read, total_bytes, rows_loaded).
+        remove_on_clear (bool, optional): removes the file when the data is cleared, for uploaded files
+        \nReturns:
+        bool: False when the file cannot be indexed, being compressed or its iterations not contiguous (nothing is loaded then)
+        """
+        self.clear_data()
+        source_file, file, total_bytes = self.open_source(path)
+        with source_file, file:
+            if file is not source_file:
+                print(f"[{self.__class__.__name__}] [INDEX_FILE]: Compressed files cannot be read by offset")
+                return False
+            for _ in range(DataLoader.HEADER_LINES):
+                file.readline()
+            index = IterationIndex.build(file, file.tell(), total_bytes)
+        if index is None:
+            raise ValueError("Data file does not contain any data line.")
+        if not index.is_contiguous():
+            print(f"[{self.__class__.__name__}] [INDEX_FILE]: Iterations are not contiguous in file, it must be loaded in full")
+            return False
+
+        self.__index = index
+        self.__source = path
+        self.__source_owned = remove_on_clear and isinstance(path, (str, os.PathLike))
+        first_iteration = self.get_iteration(index.iterations()[0])
+        self.__indexes = self.build_indexes(first_iteration)
+        if progress_callback:
+            progress_callback(total_bytes, total_bytes, len(first_iteration))
+        print(f"[{self.__class__.__name__}] [INDEX_FILE]: {len(index.blocks)} iteration blocks indexed, iteration {index.iterations()[0]} parsed")
+        return True
+
+
+    def _parse_iteration(self, iteration):
+        """
+        Parses the blocks of an indexed iteration, checking they only hold that iteration.
+        Non-contiguous files are never indexed (see index_file), so other iterations mean the file changed since.
+        \nReturns:
+        DataFrame of the iteration
+        """
+        ranges = self.__index.ranges(iteration)
+        if not ranges:
+            raise KeyError(iteration)
+
+        source_file, _, _ = self.open_source(self.__source)
+        with source_file:
+            blocks = []
+            for start, end in ranges:
+                source_file.seek(start)
+                blocks.append(source_file.read(end - start))
+        data = self.concat_chunks([self.parse_data_lines(block) for block in blocks])
+
+        if (data['Iteration'] != iteration).any():
+            raise ValueError(f"Data file changed since it was indexed, iteration {iteration} cannot be parsed")
+        print(f"[{self.__class__.__name__}] [PARSE_ITERATION]: Iteration {iteration} parsed, {len(data)} rows")
+        return data
+
+
+    @staticmethod
+    def parse_data_lines(content):
+        """
+        Parses complete data lines, without the file header (a block of a file, or lines appended to it).
+        \nArgs:
+        content (bytes-like): data lines, each ending with a newline
+        \nReturns:
+        DataFrame in the loaded data layout
+        """
+        return DataLoader.concat_chunks([DataLoader.format_file_frame(raw_chunk)
+                                         for raw_chunk in DataLoader.read_raw_chunks(io.BytesIO(content), None, skiprows=0)])
+
+
+    def with_appended_data(self, data):
         """
-        with open(path, 'r', encoding='utf-8') as file:
-            file_lines = file.readlines()
-
-        # Ignores first 3 lines
-        file_lines = file_lines[3:]
-
-        # Formatting
-        rows = []
-        for line in file_lines:
-            new_line = self.format_file_line(line)
-
-            if maxmodels and new_line['Models'] > maxmodels:
-                break
-            
-            rows.append(new_line)
-
-            # Update iterations dictionary
-            iteration = new_line['Iteration']
-            if iteration in self.__iterations:
-                self.__iterations[iteration] = pd.concat(
-                    [self.__iterations[iteration], pd.DataFrame([new_line])], 
-                    ignore_index=True
-                )
+        Builds a DataLoader holding the loaded data plus appended rows, for files that keep growing
+        (see DataController.refresh_followed_file). This DataLoader is not modified, so callbacks still reading it
+        are unaffected; loaded rows are shared, not copied.
+        The new DataLoader holds the data by iteration: the full DataFrame and the cube would have to be rebuilt whole,
+        so they are dropped. Rows of an already loaded iteration are kept aside and merged into it when it is
+        requested, so appending only costs the appended rows.
+        \nArgs:
+        data (DataFrame): formatted rows (see parse_data_lines)
+        \nReturns:
+        DataLoader
+        """
+        if self.__index is not None:
+            raise ValueError("Rows cannot be appended to an indexed file.")
+        wells, models, attributes = self.get_indexes()
+        new_wells, new_models, new_attributes = self.build_indexes(data)
+        known_wells, known_attributes = set(wells), set(attributes)
+
+        data_loader = copy.copy(self)
+        data_loader.__indexes = (wells + [well for well in new_wells if well not in known_wells],
+                                 [min(models[0], new_models[0]), max(models[1], new_models[1])],
+                                 attributes + [attribute for attribute in new_attributes if attribute not in known_attributes])
+        data_loader.__data = None
+        data_loader.__cube = None
+        data_loader.__parse_lock = threading.Lock()
+        with self.__parse_lock:
+            data_loader.__iterations = dict(self.__iterations)
+            data_loader.__appended = {iteration: list(appended) for iteration, appended in self.__appended.items()}
+
+        iterations = []
+        for iteration, rows in data.groupby('Iteration', sort=False):
+            iteration = int(iteration)
+            rows = rows.reset_index(drop=True)
+            if iteration in data_loader.__iterations:
+                data_loader.__appended.setdefault(iteration, []).append(rows)
             else:
-                self.__iterations[iteration] = pd.DataFrame([new_line])
+                data_loader.__iterations[iteration] = rows
+            iterations.append(iteration)
+        print(f"[{self.__class__.__name__}] [WITH_APPENDED_DATA]: {len(data)} rows appended to iterations {iterations}")
+        return data_loader
 
-        self.__data = pd.DataFrame(rows)
+
+    def set_data(self, data):
+        """
+        Replaces the loaded data with an already formatted DataFrame (e.g. restored from DatasetCache).
+        \nArgs:
+        data (DataFrame): data in the layout produced by get_data_from_file
+        """
+        self.release_memmap()
+        if self.__memmap_directory is not None:
+            os.makedirs(self.__memmap_directory, exist_ok=True)
+            self.__dataset_directory = tempfile.mkdtemp(prefix='davis_', dir=self.__memmap_directory)
+            data = self.to_memmap_frame(data, self.__dataset_directory)
+
+        self._set_frames(data, DataCube.from_frame(data, self.__dataset_directory))
+        storage = f"memory-mapped in {self.__dataset_directory}" if self.__dataset_directory else "memory-mapped"
+        print(f"[{self.__class__.__name__}] [SET_DATA]: {len(data)} rows loaded, {self.get_memory_usage() / 2**20:.1f} MiB in memory, "
+              f"{self.get_mapped_memory_usage() / 2**20:.1f} MiB {storage}")
+
+
+    def attach_shared_data(self, data, cube):
+        """
+        Replaces the loaded data with a dataset attached from SharedDatasetStore. Its memory-mapped columns and cube
+        are used as they are, so the data is not copied into this process.
+        \nArgs:
+        data (DataFrame): data in the layout produced by get_data_from_file
+        cube (DataCube): cube of the data, or None
+        """
+        self.release_files()
+        self._set_frames(data, cube)
+        print(f"[{self.__class__.__name__}] [ATTACH_SHARED_DATA]: {len(data)} rows attached from shared memory")
+
+
+    def _set_frames(self, data, cube):
+        """
+        Sets the loaded data and its cube, dropping the index of a lazily loaded file.
+        """
+        self.__data = data
+        self.__iterations = self.build_iterations(data) # Before the index is dropped, for iterations requested meanwhile
+        self.__index = None
+        self.__indexes = None
+        self.__appended = {}
+        self.__cube = cube
+
+
+    def get_data(self):
+        """
+        Gets the full loaded DataFrame. Data held by iteration (indexed or appended to) is concatenated,
+        an indexed file having every iteration parsed for it.
+        \nReturns:
+        DataFrame, or None if no data is loaded
+        """
+        if self.__data is None and self.__iterations:
+            return self.get_iterations(self.get_iteration_numbers())
+        return self.__data
+
+
+    def get_iterations(self, iterations):
+        """
+        Gets the rows of several iterations as a single DataFrame.
+        \nArgs:
+        iterations (list): desired iterations
+        \nReturns:
+        DataFrame
+        """
+        if self.__data is None:
+            return self.concat_chunks([self.get_iteration(iteration) for iteration in iterations])
+        return self.__data[self.__data['Iteration'].isin(iterations)]
+
+
+    def is_indexed(self):
+        """
+        Whether the data was loaded by index_file, its iterations being parsed on request.
+        """
+        return self.__index is not None
 
 
     def clear_data(self):
@@ -54,71 +297,370 @@ class DataLoader:
         """
         self.__data = None
         self.__iterations = {}
+        self.__cube = None
+        self.__index = None
+        self.__indexes = None
+        self.__appended = {}
+        self.release_files()
+        self.__source = None
+
+
+    def release_files(self):
+        """
+        Removes the files owned by the loaded data: its memory-mapped files and the indexed file when it was to be removed.
+        Data already read stays in memory, so a DataLoader replaced while callbacks still read it is released this way.
+        """
+        if self.__source_owned:
+            try:
+                os.remove(self.__source)
+            except OSError:
+                pass
+        self.__source_owned = False
+        self.release_memmap()
+
+
+    def release_memmap(self):
+        """
+        Removes the memory-mapped files of the loaded data, if any.
+        Arrays still referenced stay readable until released, as the files are only unlinked.
+        """
+        if self.__dataset_directory is not None:
+            shutil.rmtree(self.__dataset_directory, ignore_errors=True)
+            self.__dataset_directory = None
 
 
     @staticmethod
-    def format_file_line(line):
+    def to_memmap_frame(data, directory):
         """
-        Formats a single line from the data file into a dictionary.
+        Writes every column of the data to a .npy file and rebuilds the DataFrame over read-only memory maps of them,
+        so slices of it (such as iteration DataFrames) do not copy nor keep the data resident.
         \nArgs:
-            line (str): A single line from the file.
+            data (DataFrame): formatted data.
+            directory (str): folder receiving the files.
         \nReturns:
-            dict: Formatted line as a dictionary.
+            DataFrame: same data, backed by the files.
         """
-        separated_line = line.split(';')
-        iteration = int(separated_line[0])
-        model = int(separated_line[1][4:])
+        columns = {}
+        for column, dtype in data.dtypes.items():
+            values = data[column].array.codes if isinstance(dtype, pd.CategoricalDtype) else data[column].to_numpy()
+            path = os.path.join(directory, f'{column}.npy')
+            np.save(path, values)
+            mapped_values = np.load(path, mmap_mode='r')
+            if isinstance(dtype, pd.CategoricalDtype):
+                mapped_values = pd.Categorical.from_codes(mapped_values, dtype=dtype)
+            columns[column] = mapped_values
+        return pd.DataFrame(columns, copy=False)
 
-        separated_nqds_field = separated_line[2].split()
-        attribute = separated_nqds_field[1]
-        well = separated_nqds_field[3]
 
-        nqds_value = float(separated_line[3])
+    @staticmethod
+    def open_source(source):
+        """
+        Opens a data file, or its content in memory, as a binary file object.
+        Compressed files, detected by their leading bytes, are decompressed as a stream while being read,
+        so the uncompressed file is never held in full.
+        \nArgs:
+            source (str or bytes-like): path to the file, or its content. A bytes object is shared by the
+            file object, other buffers (bytearray, memoryview) are copied once.
+        \nReturns:
+            tuple (source file object, decompressed file object, size of the source in bytes).
+            Both file objects are the same for uncompressed files; progress is measured on the source.
+        """
+        if isinstance(source, (str, os.PathLike)):
+            source_file, total_bytes = open(source, 'rb'), os.path.getsize(source)
+        else:
+            source_file, total_bytes = io.BytesIO(source), memoryview(source).nbytes
 
-        # Creating new line with gathered data
-        return {
-        'Iteration': iteration,
-        'Models': model,
-        'Attributes': attribute,
-        'Wells': well,
-        'NQDS_Value': nqds_value
-        }
+        try:
+            compression = DataLoader.detect_compression(source_file)
+            if compression is None:
+                return source_file, source_file, total_bytes
+            print(f"[{DataLoader.__name__}] [OPEN_SOURCE]: Decompressing {compression} input while parsing")
+            return source_file, DataLoader.decompressed_file(source_file, compression), total_bytes
+        except Exception:
+            source_file.close()
+            raise
+
+
+    @staticmethod
+    def detect_compression(file):
+        """
+        Detects the compression of a file from its leading bytes, leaving the file at its start.
+        \nReturns:
+            str: 'gzip', 'bz2', 'xz' or 'zstd', or None for uncompressed files
+        """
+        leading_bytes = file.read(max(len(magic) for magic in DataLoader.COMPRESSION_MAGIC))
+        file.seek(0)
+        return next((compression for magic, compression in DataLoader.COMPRESSION_MAGIC.items()
+                     if leading_bytes.startswith(magic)), None)
+
+
+    @staticmethod
+    def decompressed_file(file, compression):
+        """
+        Wraps a compressed binary file object into a decompressing one.
+        \nArgs:
+            file (file object): compressed file, opened in binary mode
+            compression (str): compression detected by detect_compression
+        \nReturns:
+            binary file object reading the decompressed content
+        """
+        if compression == 'gzip':
+            return gzip.GzipFile(fileobj=file, mode='rb')
+        if compression == 'bz2':
+            return bz2.BZ2File(file, mode='rb')
+        if compression == 'xz':
+            return lzma.LZMAFile(file, mode='rb')
+        if zstandard is None:
+            raise ValueError("Data file is zstd compressed, which requires the zstandard package.")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(file, closefd=False))
+
+
+    @staticmethod
+    def read_raw_chunks(file, chunksize, skiprows = HEADER_LINES):
+        """
+        Reads the raw columns of a data file, skipping its header.
+        \nArgs:
+            file (file object): data file opened in binary mode.
+            chunksize (int): number of lines per chunk, or None for a single chunk.
+            skiprows (int, optional): header lines skipped, none when reading a block of data lines.
+        \nReturns:
+            iterable of DataFrames with the raw Iteration, Models, NQDS_Field and NQDS_Value columns.
+        """
+        read_options = dict(
+            sep=';',
+            header=None,
+            names=DataLoader.RAW_COLUMNS,
+            usecols=[0, 1, 2, 3],
+            skiprows=skiprows, # Ignores first 3 lines
+            dtype={'Iteration': 'int64', 'Models': str, 'NQDS_Field': str, 'NQDS_Value': 'float32'},
+            quoting=csv.QUOTE_NONE,
+            encoding='utf-8',
+            engine='c'
+        )
+        if chunksize is None:
+            yield pd.read_csv(file, **read_options)
+            return
+
+        with pd.read_csv(file, chunksize=chunksize, **read_options) as reader:
+            yield from reader
+
+
+    @staticmethod
+    def concat_chunks(chunks):
+        """
+        Concatenates formatted chunks into a single DataFrame.
+        Categorical columns are merged through their categories, so they stay dictionary encoded.
+        \nArgs:
+            chunks (list): formatted DataFrames, in file order.
+        \nReturns:
+            DataFrame: all rows from the chunks.
+        """
+        if not chunks:
+            raise ValueError("Data file does not contain any data line.")
+        if len(chunks) == 1:
+            return chunks[0]
+
+        columns = {}
+        for column, dtype in chunks[0].dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                columns[column] = union_categoricals([chunk[column] for chunk in chunks], sort_categories=True)
+            else:
+                columns[column] = np.concatenate([chunk[column].to_numpy() for chunk in chunks])
+        return pd.DataFrame(columns)
+
+
+    @staticmethod
+    def build_iterations(data):
+        """
+        Builds the iterations dictionary in a single pass over the loaded data.
+        Iterations written as contiguous blocks (the layout of DA output files) become row-offset slices
+        sharing memory with data; otherwise the rows are split by a single groupby.
+        \nArgs:
+            data (DataFrame): formatted data, in file order.
+        \nReturns:
+            dict: iteration number -> DataFrame of that iteration.
+        """
+        iteration_column = data['Iteration'].to_numpy()
+        if len(iteration_column) == 0:
+            return {}
+
+        # Row offsets where the iteration number changes
+        starts = np.concatenate(([0], np.flatnonzero(iteration_column[1:] != iteration_column[:-1]) + 1))
+        ends = np.append(starts[1:], len(iteration_column))
+        block_iterations = iteration_column[starts]
+
+        if len(np.unique(block_iterations)) == len(block_iterations):
+            return {int(iteration): data.iloc[start:end] for iteration, start, end in zip(block_iterations, starts, ends)}
+
+        print(f"[{DataLoader.__name__}] [BUILD_ITERATIONS]: Iterations are not contiguous in file, grouping rows")
+        return {int(iteration): iteration_data for iteration, iteration_data in data.groupby('Iteration', sort=False)}
+
+
+    @staticmethod
+    def format_file_frame(raw_data):
+        """
+        Formats the raw columns read from the data file, column-wise, into the loaded data layout.
+        The representation is compact: Wells and Attributes are categorical, Iteration and Models use
+        the narrowest integer type that fits and NQDS_Value is float32.
+        \nArgs:
+            raw_data (DataFrame): Iteration, Models, NQDS_Field and NQDS_Value columns as read from the file.
+        \nReturns:
+            DataFrame: Iteration, Models, Attributes, Wells and NQDS_Value columns.
+        """
+        # Distinct fields are few (attributes x wells, model names), so they are parsed once and mapped back by code
+        field_codes, fields = pd.factorize(raw_data['NQDS_Field'])
+        separated_nqds_field = pd.Series(fields).str.split(n=4, expand=True)
+        model_codes, model_names = pd.factorize(raw_data['Models'])
+        if (field_codes < 0).any() or (model_codes < 0).any():
+            raise ValueError("Data file contains lines with missing model or NQDS fields.")
+        models = pd.to_numeric(pd.Series(model_names).str.slice(4).astype('int64'), downcast='integer').to_numpy()
+
+        return pd.DataFrame({
+            'Iteration': pd.to_numeric(raw_data['Iteration'], downcast='integer').to_numpy(),
+            'Models': models[model_codes],
+            'Attributes': DataLoader.to_categorical(separated_nqds_field[1], field_codes),
+            'Wells': DataLoader.to_categorical(separated_nqds_field[3], field_codes),
+            'NQDS_Value': raw_data['NQDS_Value'].to_numpy(dtype='float32')
+        })
+
+
+    @staticmethod
+    def to_categorical(field_values, field_codes):
+        """
+        Builds a categorical column from the values parsed for each distinct field.
+        Categories are sorted, so pivots keep the same label order as plain strings.
+        \nArgs:
+            field_values (Series): value parsed from each distinct NQDS field.
+            field_codes (ndarray): distinct field code of each row.
+        \nReturns:
+            Categorical: one value per row.
+        """
+        value_codes, categories = pd.factorize(field_values, sort=True)
+        return pd.Categorical.from_codes(value_codes[field_codes], categories=categories)
+
+
+    @staticmethod
+    def truncate_at_maxmodels(data, maxmodels):
+        """
+        Drops every row from the first one whose model exceeds maxmodels onwards,
+        the same way the line by line loading stops reading the file.
+        \nArgs:
+            data (DataFrame): formatted data, in file order.
+            maxmodels (int): Maximum number of models to load.
+        \nReturns:
+            DataFrame: truncated data.
+        """
+        exceeding = (data['Models'] > maxmodels).to_numpy()
+        if exceeding.any():
+            data = data.iloc[:exceeding.argmax()]
+        return data
 
-    
 
     def get_iteration(self, iteration = 1):
         """
-        Gets DataFrame from respective iteration
+        Gets DataFrame from respective iteration. Iterations of an indexed file are parsed on their first request,
+        and rows appended to an iteration are merged into it. Both only fill in the loaded data, which never changes:
+        the loader may be read by several threads through a published DatasetSnapshot.
         \nArgs:
         iteration (int, default = 1): the number of the desired iteration
         \nReturns:
         DataFrame from respective iteration
         """
-
+        if iteration in self.__appended:
+            with self.__parse_lock:
+                appended = self.__appended.pop(iteration, [])
+                if appended:
+                    self.__iterations[iteration] = self.concat_chunks([self.__iterations[iteration]] + appended)
+        if self.__index is not None and iteration not in self.__iterations:
+            with self.__parse_lock:
+                if self.__index is not None and iteration not in self.__iterations: # Not parsed by another thread meanwhile
+                    self.__iterations[iteration] = self._parse_iteration(iteration)
         return self.__iterations[iteration]
     
+    def get_cube(self):
+        """
+        Gets the dense cube (iteration x model x attribute x well) of the loaded data
+        \nReturns:
+        DataCube, or None if no data is loaded or it could not be represented as a cube
+        """
+        return self.__cube
+
     def get_iteration_count(self):
         """
         Retrieves the total number of iterations loaded in the iterations dictionary.
         \nReturns:
             int: The number of iterations.
         """
+        return self.get_iteration_numbers()
+
+
+    def get_iteration_numbers(self):
+        """
+        Retrieves the iterations of the loaded data, including the iterations of an indexed file not parsed yet.
+        \nReturns:
+            list: iteration numbers, in file order
+        """
+        if self.__index is not None:
+            return self.__index.iterations()
         return list(self.__iterations.keys())
     
     
+    def get_memory_usage(self):
+        """
+        Retrieves the memory footprint of the loaded data held by this process.
+        Iteration DataFrames share memory with the full data, so they are not counted again, and neither are
+        memory-mapped columns and cube (see get_mapped_memory_usage).
+        \nReturns:
+            int: size in bytes, including the cube (0 if no data is loaded).
+        """
+        if self.__data is None:
+            frames = list(self.__iterations.values()) + [rows for appended in self.__appended.values() for rows in appended]
+            return int(sum(data.memory_usage(index=True, deep=True).sum() for data in frames))
+        cube_bytes = self.__cube.get_memory_usage() if self.__cube is not None else 0
+        return int(self.__data.memory_usage(index=True, deep=True).sum()) + cube_bytes - self.get_mapped_memory_usage()
+
+
+    def get_mapped_memory_usage(self):
+        """
+        Retrieves the size of the loaded data read from memory-mapped files (memmap_directory or a SharedDatasetStore).
+        Their pages are held by the operating system's page cache, which shares them between server processes
+        and reclaims them under memory pressure.
+        \nReturns:
+            int: size in bytes, including the cube
+        """
+        if self.__data is None:
+            return 0
+        arrays = [self.__data[column].array.codes if isinstance(dtype, pd.CategoricalDtype) else self.__data[column].to_numpy()
+                  for column, dtype in self.__data.dtypes.items()]
+        if self.__cube is not None:
+            arrays.append(self.__cube.values)
+        return int(sum(array.nbytes for array in arrays if Utilitary.is_memory_mapped(array)))
+
+
     def get_indexes(self):
         """
         Retrieves all unique attributes, models, and wells from the current data.
         \nReturns:
             wells, models, attributes list
         """
+        if self.__indexes is not None:
+            return self.__indexes
         if self.__data is None:
             raise ValueError("Data has not been loaded yet. Call get_data_from_file() first.")
-        
-        attributes = self.__data['Attributes'].unique().tolist()
-        min_models = self.__data['Models'].min()
-        max_models = self.__data['Models'].max()
+        return self.build_indexes(self.__data)
+
+
+    @staticmethod
+    def build_indexes(data):
+        """
+        Builds the filter indexes of loaded data.
+        \nReturns:
+            wells, models ([min, max]), attributes lists
+        """
+        attributes = data['Attributes'].unique().tolist()
+        min_models = data['Models'].min()
+        max_models = data['Models'].max()
         models = [min_models, max_models]
-        wells = self.__data['Wells'].unique().tolist()
+        wells = data['Wells'].unique().tolist()
         
-        return wells, models, attributes
\ No newline at end of file
+        return wells, models, attributes
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+class DatasetCache:
+    """
+    Persistent on-disk cache of parsed datasets, keyed by the content hash of the source file.
+    Each dataset is stored as an uncompressed .npz file, one array per column (categorical columns as codes and categories),
+    which loads in milliseconds. Files are evicted by least recent use once the cache exceeds its size cap,
+    and files written by another parser version are discarded.
+    \nAttributes:
+    directory: folder holding the cached datasets
+    max_bytes: size cap of the folder
+    version: parser version the cached datasets must match
+    """
+    DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'davis_dataset_cache')
+    DEFAULT_MAX_BYTES = 2 * 2**30 # 2 GiB
+    HASH_BLOCK_SIZE = 2**20 # Bytes read at a time while hashing files
+
+    def __init__(self, version, directory = DEFAULT_DIRECTORY, max_bytes = DEFAULT_MAX_BYTES):
+        self.__version = version
+        self.__directory = directory
+        self.__max_bytes = max_bytes
+        os.makedirs(self.__directory, exist_ok=True)
+        self.remove_stale_versions()
+
+
+    @property
+    def directory(self):
+        return self.__directory
+
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
+
+
+    @property
+    def version(self):
+        return self.__version
+
+
+    @staticmethod
+    def file_key(path):
+        """
+        Computes the cache key of a data file from its content.
+        \nArgs:
+        path (str or bytes-like): path to the data file, or its content in memory (same key as the file)
+        \nReturns:
+        str: hexadecimal content hash
+        """
+        file_hash = hashlib.blake2b(digest_size=20)
+        if not isinstance(path, (str, os.PathLike)):
+            file_hash.update(memoryview(path)) # Hashed in place, without a copy
+            return file_hash.hexdigest()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(DatasetCache.HASH_BLOCK_SIZE), b''):
+                file_hash.update(block)
+        return file_hash.hexdigest()
+
+
+    def get(self, key):
+        """
+        Loads a cached dataset, marking it as recently used.
+        \nArgs:
+        key (str): cache key of the dataset
+        \nReturns:
+        DataFrame, or None when the dataset is not cached
+        """
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            print(f"[{self.__class__.__name__}] [GET]: Cache miss for {key}")
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                data = self.arrays_to_frame(arrays)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[{self.__class__.__name__}] [GET]: Discarding unreadable cache entry {key}: {str(e)}")
+            self._remove(path)
+            return None
+
+        os.utime(path) # Updates modification time, used as last access for eviction
+        print(f"[{self.__class__.__name__}] [GET]: Cache hit for {key}")
+        return data
+
+
+    def contains(self, key):
+        """
+        Checks whether a dataset is cached, without loading it.
+        \nArgs:
+        key (str): cache key of the dataset
+        """
+        return os.path.exists(self._entry_path(key))
+
+
+    def remove(self, key):
+        """
+        Removes a dataset from the cache.
+        \nArgs:
+        key (str): cache key of the dataset
+        """
+        self._remove(self._entry_path(key))
+
+
+    def put(self, key, data):
+        """
+        Stores a dataset in the cache, evicting least recently used datasets above the size cap.
+        \nArgs:
+        key (str): cache key of the dataset
+        data (DataFrame): loaded data, as built by DataLoader
+        """
+        path = self._entry_path(key)
+        # Written under a unique name then renamed, so concurrent readers never see a partial file
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.__directory, suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                np.savez(file, **self.frame_to_arrays(data))
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"[{self.__class__.__name__}] [PUT]: Could not cache dataset {key}: {str(e)}")
+            self._remove(temp_path)
+            return
+
+        print(f"[{self.__class__.__name__}] [PUT]: Dataset {key} cached ({os.path.getsize(path) / 2**20:.1f} MiB)")
+        self.evict()
+
+
+    def evict(self):
+        """
+        Removes least recently used datasets until the cache fits its size cap.
+        The most recent dataset is always kept.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total_bytes = sum(size for _, _, size in entries)
+        while total_bytes > self.__max_bytes and len(entries) > 1:
+            path, _, size = entries.pop(0)
+            self._remove(path)
+            total_bytes -= size
+            print(f"[{self.__class__.__name__}] [EVICT]: Removed {os.path.basename(path)}")
+
+
+    def remove_stale_versions(self):
+        """
+        Removes datasets cached by a different parser version.
+        """
+        for file_name in os.listdir(self.__directory):
+            if file_name.endswith('.npz') and not file_name.startswith(self._version_prefix()):
+                self._remove(os.path.join(self.__directory, file_name))
+                print(f"[{self.__class__.__name__}] [REMOVE_STALE_VERSIONS]: Removed {file_name}")
+
+
+    @staticmethod
+    def frame_to_arrays(data):
+        """
+        Converts a DataFrame into named arrays storable without pickling.
+        \nReturns:
+        dict: array name -> ndarray
+        """
+        arrays = {'columns': np.array(data.columns.tolist(), dtype=str)}
+        for column in data.columns:
+            values = data[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                arrays[f'{column}.codes'] = values.cat.codes.to_numpy()
+                arrays[f'{column}.categories'] = np.array(values.cat.categories.tolist(), dtype=str)
+            else:
+                arrays[column] = values.to_numpy()
+        return arrays
+
+
+    @staticmethod
+    def arrays_to_frame(arrays):
+        """
+        Rebuilds a DataFrame from the arrays produced by frame_to_arrays.
+        \nReturns:
+        DataFrame
+        """
+        columns = {}
+        for column in arrays['columns'].tolist():
+            if f'{column}.codes' in arrays:
+                columns[column] = pd.Categorical.from_codes(arrays[f'{column}.codes'], categories=arrays[f'{column}.categories'].tolist())
+            else:
+                columns[column] = arrays[column]
+        return pd.DataFrame(columns)
+
+
+    def _version_prefix(self):
+        return f'v{self.__version}-'
+
+
+    def _entry_path(self, key):
+        return os.path.join(self.__directory, f'{self._version_prefix()}{key}.npz')
+
+
+    def _entries(self):
+        """
+        Lists cached datasets as (path, last access time, size) tuples.
+        """
+        entries = []
+        for file_name in os.listdir(self.__directory):
+            if file_name.endswith('.npz'):
+                path = os.path.join(self.__directory, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue # Removed concurrently
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
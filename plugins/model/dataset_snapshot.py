@@ -0,0 +1,99 @@
+import uuid
+
+
+class DatasetSnapshot:
+    """
+    Immutable state of a loaded dataset, as read by the rendering callbacks. DataController publishes a new snapshot
+    by swapping a single reference, so a callback keeps reading the snapshot it started with, without locks,
+    while the next one is being built. Nothing in a published snapshot is replaced: appending rows or loading
+    another file builds a new snapshot. Iterations of a lazily loaded file are still parsed into its DataLoader
+    on request, under the DataLoader's own lock.
+    \nAttributes:
+    data_loader: DataLoader holding the data
+    dataset_id: identity of the data, part of the heatmap cache keys
+    aggregates: HeatmapAggregates materialized at load time, or None
+    running_aggregates: RunningAggregates of a followed file, or None
+    revisions: (dictionary) iteration -> number of refreshes that appended rows to it
+    cache_key: dataset cache key of the data, when it can be restored from the cache
+    """
+    def __init__(self, data_loader, dataset_id = None, aggregates = None, running_aggregates = None, revisions = None, cache_key = None):
+        self.__data_loader = data_loader
+        self.__dataset_id = dataset_id or uuid.uuid4().hex
+        self.__aggregates = aggregates
+        self.__running_aggregates = running_aggregates
+        self.__revisions = dict(revisions or {})
+        self.__cache_key = cache_key
+
+
+    @property
+    def data_loader(self):
+        return self.__data_loader
+
+
+    @property
+    def dataset_id(self):
+        return self.__dataset_id
+
+
+    @property
+    def aggregates(self):
+        return self.__aggregates
+
+
+    @property
+    def running_aggregates(self):
+        return self.__running_aggregates
+
+
+    @property
+    def revisions(self):
+        return dict(self.__revisions)
+
+
+    @property
+    def cache_key(self):
+        return self.__cache_key
+
+
+    def appended(self, data):
+        """
+        Builds the snapshot of the data with appended rows (see DataController.refresh_followed_file).
+        Only the changed iterations get a new revision, so the cached matrices of the others are still valid.
+        \nArgs:
+        data (DataFrame): formatted rows (see DataLoader.parse_data_lines)
+        \nReturns:
+        tuple (DatasetSnapshot, list of the iterations that changed)
+        """
+        data_loader = self.__data_loader.with_appended_data(data)
+        running_aggregates, iterations = self.__running_aggregates.update(data)
+        revisions = dict(self.__revisions)
+        for iteration in iterations:
+            revisions[iteration] = revisions.get(iteration, 0) + 1
+        return DatasetSnapshot(data_loader, self.__dataset_id, None, running_aggregates, revisions), iterations
+
+
+    def iteration_key(self, iteration):
+        """
+        Identifies the content of an iteration in cache keys: its number and revision.
+        Keys of an iteration that received rows no longer match, so its stale matrices are never served.
+        """
+        return (iteration, self.__revisions.get(iteration, 0))
+
+
+    def get_memory_usage(self):
+        """
+        Retrieves the memory held by the data and its aggregates, memory-mapped data excluded (see get_mapped_memory_usage).
+        \nReturns:
+        int: size in bytes
+        """
+        aggregates = [self.__aggregates, self.__running_aggregates]
+        return self.__data_loader.get_memory_usage() + sum(aggregate.get_memory_usage() for aggregate in aggregates if aggregate is not None)
+
+
+    def get_mapped_memory_usage(self):
+        """
+        Retrieves the size of the data read from memory-mapped files (see DataLoader.get_mapped_memory_usage).
+        \nReturns:
+        int: size in bytes
+        """
+        return self.__data_loader.get_mapped_memory_usage()
@@ -0,0 +1,49 @@
+import os
+
+
+class FileFollower:
+    """
+    Reads what is appended to a file that keeps growing, such as the output of a DA run still in progress.
+    Only complete lines are read: a line still being written is read once its newline is there.
+    \nAttributes:
+    path: followed file
+    offset: bytes read so far, up to the end of the last complete line
+    """
+    def __init__(self, path):
+        self.__path = path
+        self.__offset = 0
+        self.__file_id = None # Device and inode of the followed file, to detect it being replaced
+
+
+    @property
+    def path(self):
+        return self.__path
+
+
+    @property
+    def offset(self):
+        return self.__offset
+
+
+    def read_appended(self):
+        """
+        Reads the complete lines appended since the last call, the whole file on the first call.
+        \nReturns:
+        bytes (empty when nothing was appended), or None when the file was truncated or replaced,
+        so it must be read again from its start
+        """
+        stat = os.stat(self.__path)
+        file_id = (stat.st_dev, stat.st_ino)
+        if self.__file_id is not None and (file_id != self.__file_id or stat.st_size < self.__offset):
+            print(f"[{self.__class__.__name__}] [READ_APPENDED]: {self.__path} was truncated or replaced")
+            return None
+        self.__file_id = file_id
+        if stat.st_size == self.__offset:
+            return b''
+
+        with open(self.__path, 'rb') as file:
+            file.seek(self.__offset)
+            appended = file.read(stat.st_size - self.__offset)
+        complete_bytes = appended.rfind(b'\n') + 1
+        self.__offset += complete_bytes
+        return appended[:complete_bytes]
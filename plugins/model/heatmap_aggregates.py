@@ -0,0 +1,79 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from plugins.model.heatmap_data_formatter import HeatmapDataFormatter, HeatmapDataMode
+
+
+class HeatmapAggregates:
+    """
+    Heatmap matrices of every axis pair, mode and iteration, materialized once at load time
+    so heatmap requests become lookups.
+    \nAttributes:
+    matrices: (dictionary) (iteration, index, columns, mode) -> DataFrame
+    build_seconds: time spent building the matrices
+    """
+    AXIS_PAIRS = [('Wells', 'Models'), ('Attributes', 'Models'), ('Wells', 'Attributes')]
+
+    def __init__(self, matrices, build_seconds):
+        self.__matrices = matrices
+        self.__build_seconds = build_seconds
+
+
+    @property
+    def build_seconds(self):
+        return self.__build_seconds
+
+
+    @staticmethod
+    def build(data_loader, max_workers = None):
+        """
+        Computes every axis pair and mode of every loaded iteration, all modes of a pair in one pass.
+        Iteration and axis pair combinations are computed concurrently; the NumPy reductions
+        release the GIL, so threads run in parallel across cores.
+        \nArgs:
+        data_loader (DataLoader): loader holding the data
+        max_workers (int, optional): number of threads. Default is one per core.
+        \nReturns:
+        HeatmapAggregates
+        """
+        start_time = time.perf_counter()
+        tasks = [(iteration, index, columns) for iteration in data_loader.get_iteration_numbers() for index, columns in HeatmapAggregates.AXIS_PAIRS]
+
+        def compute(task):
+            iteration, index, columns = task
+            statistics = HeatmapDataFormatter.format_statistics(data_loader, [iteration], index, columns, list(HeatmapDataMode))[iteration]
+            return {(iteration, index, columns, mode): matrix for mode, matrix in statistics.items()}
+
+        matrices = {}
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            for task_matrices in executor.map(compute, tasks):
+                matrices.update(task_matrices)
+
+        aggregates = HeatmapAggregates(matrices, time.perf_counter() - start_time)
+        print(f"[{HeatmapAggregates.__name__}] [BUILD]: {len(matrices)} matrices built in {aggregates.build_seconds:.2f}s, "
+              f"using {aggregates.get_memory_usage() / 2**20:.1f} MiB")
+        return aggregates
+
+
+    def get(self, iteration, index, columns, mode):
+        """
+        Gets a materialized matrix. It is shared between requests and must not be modified.
+        \nArgs:
+        iteration (int): desired iteration
+        index (str): axis shown as rows
+        columns (str): axis shown as columns
+        mode (HeatmapDataMode): display mode of the heatmap
+        \nReturns:
+        DataFrame, or None when it was not materialized
+        """
+        return self.__matrices.get((iteration, index, columns, mode))
+
+
+    def get_memory_usage(self):
+        """
+        Retrieves the memory footprint of the materialized matrices.
+        \nReturns:
+        int: size in bytes
+        """
+        return int(sum(matrix.memory_usage(index=True, deep=True).sum() for matrix in self.__matrices.values()))
@@ -1,43 +1,64 @@
+import plotly.colors
 import plotly.graph_objs as go
+import pandas as pd
 from dash import dcc
-import numpy as np
+
+from plugins.model.level_of_detail import LevelOfDetail
+from plugins.model.heatmap_data_formatter import HeatmapComparison, HeatmapDataFormatter, HeatmapDataMode
 
 
 class HeatmapBuilder:
     """
     Class for encapsulating Heatmap building
     """
-    def __init__(self, data, colorscale='bluered'):
+    ZMIN = 0 # minimum colorscale value
+    ZMAX = 20 # maximum colorscale value
+    COLORBAR = dict(title='Misfit Value', tickvals=[0, 2, 5, 10, 20], ticktext=['1', '2', '5', '10', '20'])
+    COMPARISON_SCALES = {
+        HeatmapComparison.DELTA: (-ZMAX, ZMAX, dict(title='Change from previous')),
+        HeatmapComparison.RATIO: (0, 2, dict(title='Ratio to previous'))
+    } # Comparison -> (zmin, zmax, colorbar)
+    MODE_SCALES = {
+        HeatmapDataMode.COUNT: (0, None, dict(title='Values per cell')),
+        HeatmapDataMode.EXCEEDANCE: (0, 1, dict(title=f'Fraction |NQDS| > {HeatmapDataFormatter.EXCEEDANCE_THRESHOLD}'))
+    } # Modes that are not misfit values -> (zmin, zmax (None fits the data), colorbar)
+
+    def __init__(self, data, colorscale='bluered', comparison=None, mode=None):
         self.__data = data
 
         self.__colorscale = colorscale
+        zmin, zmax, colorbar = HeatmapBuilder.value_scale(comparison, mode)
 
         self.__title = self._generate_title()
         self.__xaxis = self.__data.index.name
         self.__yaxis = self.__data.columns.name
 
-        x_tickvals, x_ticktext = self._adjust_ticks(self.__data.columns, self.__yaxis)
-        y_tickvals, y_ticktext = self._adjust_ticks(self.__data.index, self.__xaxis)
+        # Axes are categorical, labelled by the DataFrame's columns and index, so hover can show them without per-cell text
+        x_labels = self._axis_labels(self.__data.columns)
+        y_labels = self._axis_labels(self.__data.index)
+
+        x_tickvals, x_ticktext = self._adjust_ticks(self.__data.columns, x_labels, self.__yaxis)
+        y_tickvals, y_ticktext = self._adjust_ticks(self.__data.index, y_labels, self.__xaxis)
 
         self.__layout = go.Layout(
                 title= self.__title,
                 # Building the x and y axis "captions"
-                xaxis=dict(title=self.__yaxis, tickvals=x_tickvals, ticktext=x_ticktext),
-                yaxis=dict(title=self.__xaxis, tickvals=y_tickvals, ticktext=y_ticktext),
+                xaxis=dict(title=self.__yaxis, type='category', tickvals=x_tickvals, ticktext=x_ticktext),
+                yaxis=dict(title=self.__xaxis, type='category', tickvals=y_tickvals, ticktext=y_ticktext),
                 width=1200,
                 height=800,
                 margin=dict(l=100, r=100, t=100, b=100),
             )
         self.__heatmap = go.Heatmap(
-                z=data,
+                # NumPy values are sent as a base64 typed array instead of a JSON list, float32 halving it again
+                z=self.__data.to_numpy(dtype='float32'),
+                x=x_labels,
+                y=y_labels,
                 colorscale=self.__colorscale,
-                colorbar=dict(title='Misfit Value',
-                                tickvals=[0, 2, 5, 10, 20],
-                                ticktext=['1', '2', '5', '10', '20']),
-                zmin=0,  # minimum colorscale value
-                zmax=20,  # maximum colorscale value
-                hoverinfo='text',
-                hovertext=self._build_hovertext()
+                colorbar=colorbar,
+                zmin=zmin,  # minimum colorscale value
+                zmax=zmax,  # maximum colorscale value
+                hovertemplate=self._build_hovertemplate()
                 )
 
 
@@ -64,44 +85,78 @@ class HeatmapBuilder:
         y_axis = self.__data.index.name
         return f"{y_axis} x {x_axis}"
     
-    def _adjust_ticks(self, axis_values, axis_name):
+    @staticmethod
+    def value_scale(comparison=None, mode=None):
+        """
+        Gets the colorscale range and colorbar of the heatmap values in a mode, or of a comparison between iterations.
+        \nReturns:
+        tuple (zmin, zmax, colorbar), zmax None when the range fits the data
+        """
+        if comparison is not None:
+            return HeatmapBuilder.COMPARISON_SCALES[comparison]
+        return HeatmapBuilder.MODE_SCALES.get(mode, (HeatmapBuilder.ZMIN, HeatmapBuilder.ZMAX, HeatmapBuilder.COLORBAR))
+
+
+    @staticmethod
+    def resolve_colorscale(colorscale):
+        """
+        Resolves a colorscale name into its list of [position, color] pairs, as plotly.js only knows some of the names.
+        \nReturns:
+        list of [position, color] pairs
+        """
+        return [[position, color] for position, color in plotly.colors.get_colorscale(colorscale)]
+
+
+    @staticmethod
+    def _axis_labels(axis_values):
+        """
+        Builds the category labels of an axis. Models bins (IntervalIndex) are labelled as 'first-last'.
+        """
+        if isinstance(axis_values, pd.IntervalIndex):
+            return [str(first) if first == last else f"{first}-{last}" for first, last in zip(axis_values.left, axis_values.right)]
+        return [str(label) for label in axis_values]
+
+
+    @staticmethod
+    def _adjust_ticks(axis_values, axis_labels, axis_name):
         """
         Adjusts tickvals and ticktext for axes.
-        If the axis is named 'Models', it displays a tick every 25 elements.
+        If the axis is named 'Models', it displays a tick on every model multiple of 25,
+        labelled with the original model number, on the entry (model or bin of models) holding it.
 
         Args:
-            axis_values (pd.Index or list): The axis values.
+            axis_values (pd.Index): The axis values.
+            axis_labels (list): The axis category labels.
             axis_name (str): The name of the axis.
 
         Returns:
-            tuple: Adjusted tickvals and ticktext.
+            tuple: Adjusted tickvals (category labels) and ticktext.
         """
         if axis_name == "Models":
             # Shows multiple of 25 values
-            tickvals = [i for i in range(24, len(axis_values), 25)]  # 0-based index
-            ticktext = [str(i + 1) for i in tickvals] # Adapts to 1-based index
+            tickvals = []
+            ticktext = []
+            for label, (first_model, last_model) in zip(axis_labels, LevelOfDetail.model_ranges(axis_values)):
+                multiple = -(-first_model // 25) * 25 # First multiple of 25 from first_model
+                if multiple <= last_model:
+                    tickvals.append(label)
+                    ticktext.append(str(multiple))
         else:
             # Shows full values
-            tickvals = list(range(len(axis_values)))
-            ticktext = axis_values.tolist()
+            tickvals = list(axis_labels)
+            ticktext = list(axis_labels)
 
         return tickvals, ticktext
 
 
-    def _build_hovertext(self):
+    def _build_hovertemplate(self):
         """
-        Creates a hovertext matrix with cell information.
+        Creates the hovertemplate showing cell information.
+        Plotly fills in the cell's labels and value on the browser, so no per-cell text is built or sent.
         """
         index_name = self.__data.index.name[:-1]
         column_name = self.__data.columns.name[:-1]
-        hovertext = []
-        for i, row in enumerate(self.__data.index):
-            hovertext_row = []
-            for j, col in enumerate(self.__data.columns):
-                value = self.__data.iloc[i, j]
-                hovertext_row.append(f"{index_name}: {row}<br>{column_name}: {col}<br>Value: {value:.2f}")
-            hovertext.append(hovertext_row)
-        return np.array(hovertext)
+        return f"{index_name}: %{{y}}<br>{column_name}: %{{x}}<br>Value: %{{z:.2f}}<extra></extra>"
 
     def buildHeatmap(self, target_id):
         """
@@ -109,11 +164,21 @@ class HeatmapBuilder:
         All Heatmap data and details are given in the class HeatmapBuild's initialization
 
         \nArgs:
-        id (str): id of the to-be built graph
+        id (str or dict): id of the to-be built graph
         \nReturns:
         A Dash Graph component containing the heatmap.
         """
-        figure = go.Figure(
+        figure = self.buildFigure()
+        print(f"[{self.__class__.__name__}] [BUILD_HEATMAP]: Figure {self.__data.shape} built") # Payload sizes are logged by ResponseCompression
+        return dcc.Graph(id=target_id, figure=figure)
+
+
+    def buildFigure(self):
+        """
+        Builds the Heatmap figure in plotly.go
+        \nReturns:
+        A plotly Figure containing the heatmap.
+        """
+        return go.Figure(
                 data=[self.heatmap], layout=self.layout
             )
-        return dcc.Graph(id=target_id, figure=figure)
@@ -1,108 +1,289 @@
 from enum import Enum, auto
+import warnings
+
+import numpy as np
+import pandas as pd
 
 
 class HeatmapDataMode(Enum):
     """
-    Enum representing the display mode of the heatmap.
+    Enum representing the display mode of the heatmap: the statistic of the |NQDS| values reduced into each cell.
     """
     AVG = auto() # AVERAGE
     MIN = auto() # MINIMUM
     MAX = auto() # MAXIMUM
+    STD = auto() # STANDARD DEVIATION
+    COUNT = auto() # NUMBER OF VALUES
+    MEDIAN = auto() # 50TH PERCENTILE
+    P90 = auto() # 90TH PERCENTILE
+    EXCEEDANCE = auto() # FRACTION OF VALUES ABOVE HeatmapDataFormatter.EXCEEDANCE_THRESHOLD
+
+
+class HeatmapComparison(Enum):
+    """
+    Enum representing the comparison of an iteration's heatmap with the previous iteration's.
+    """
+    DELTA = auto() # Iteration value minus previous iteration value (negative is an improvement)
+    RATIO = auto() # Iteration value divided by previous iteration value (below 1 is an improvement)
 
 
 class HeatmapDataFormatter():
     """
     Class responsible for formatting heatmap data based on heatmap type and mode.
+    Every mode is a statistic computed by the same engine, for any pair of axes: a new HeatmapDataMode
+    only needs its reducers in CUBE_REDUCERS (NaN-aware, over an ndarray axis) and FRAME_REDUCERS (over a groupby).
     """
+    EXCEEDANCE_THRESHOLD = 1 # |NQDS| above it is a misfit
+    CUBE_REDUCERS = {
+        HeatmapDataMode.AVG: lambda values, axis: np.nanmean(values, axis=axis),
+        HeatmapDataMode.MIN: lambda values, axis: np.nanmin(values, axis=axis),
+        HeatmapDataMode.MAX: lambda values, axis: np.nanmax(values, axis=axis),
+        HeatmapDataMode.STD: lambda values, axis: np.nanstd(values, axis=axis, ddof=1), # Sample deviation, as pandas
+        HeatmapDataMode.COUNT: lambda values, axis: HeatmapDataFormatter._count(values, axis),
+        HeatmapDataMode.MEDIAN: lambda values, axis: HeatmapDataFormatter._quantile(values, 0.5, axis),
+        HeatmapDataMode.P90: lambda values, axis: HeatmapDataFormatter._quantile(values, 0.9, axis),
+        HeatmapDataMode.EXCEEDANCE: lambda values, axis: (np.sum(values > HeatmapDataFormatter.EXCEEDANCE_THRESHOLD, axis=axis)
+                                                          / HeatmapDataFormatter._count(values, axis))
+    } # Mode -> reduction of |NQDS| values over an axis
+    FRAME_REDUCERS = {
+        HeatmapDataMode.AVG: lambda groups: groups['NQDS_Value'].mean(),
+        HeatmapDataMode.MIN: lambda groups: groups['NQDS_Value'].min(),
+        HeatmapDataMode.MAX: lambda groups: groups['NQDS_Value'].max(),
+        HeatmapDataMode.STD: lambda groups: groups['NQDS_Value'].std(),
+        HeatmapDataMode.COUNT: lambda groups: groups['NQDS_Value'].count().replace(0, np.nan),
+        HeatmapDataMode.MEDIAN: lambda groups: groups['NQDS_Value'].median(),
+        HeatmapDataMode.P90: lambda groups: groups['NQDS_Value'].quantile(0.9),
+        HeatmapDataMode.EXCEEDANCE: lambda groups: groups['Exceeds'].mean()
+    } # Mode -> aggregation of grouped |NQDS| values (and of their Exceeds indicator)
+
     def __init__(self):
         pass
 
     @staticmethod
-    def wells_models(data, mode):
+    def _count(values, axis):
+        """
+        Counts the values along an axis. Cells without any value are NaN, as for the other statistics.
+        """
+        counts = np.sum(~np.isnan(values), axis=axis, dtype='float32')
+        counts[counts == 0] = np.nan
+        return counts
+
+
+    @staticmethod
+    def _quantile(values, quantile, axis):
+        """
+        Quantile of the values along an axis, ignoring NaN, with linear interpolation as pandas.
+        Sorts the whole array at once: np.nanquantile loops over cells, which is slow for the short axes of the cube.
+        """
+        ordered = np.sort(np.moveaxis(values, axis, -1), axis=-1) # NaN sorted last
+        counts = np.sum(~np.isnan(ordered), axis=-1)
+        positions = quantile * np.maximum(counts - 1, 0)
+        lower = np.floor(positions).astype('intp')
+        upper = np.ceil(positions).astype('intp')
+        lower_values = np.take_along_axis(ordered, lower[..., None], axis=-1)[..., 0]
+        upper_values = np.take_along_axis(ordered, upper[..., None], axis=-1)[..., 0]
+        result = lower_values + (upper_values - lower_values) * (positions - lower).astype(values.dtype)
+        result[counts == 0] = np.nan
+        return result
+
+
+    @staticmethod
+    def aggregate(data, keys, modes):
+        """
+        Computes several statistics of the |NQDS| values grouped by keys, sharing a single grouping of the data
+        \nArgs:
+        data (DataFrame): loaded data, not modified
+        keys (list): columns grouped by, e.g. ['Wells', 'Models']
+        modes (list): HeatmapDataMode values computed
+        \nReturns:
+        dictionary mode -> Series indexed by keys
+        """
+        for mode in modes:
+            HeatmapDataFormatter.check_mode(mode)
+
+        values = data['NQDS_Value'].abs()
+        exceeds = (values > HeatmapDataFormatter.EXCEEDANCE_THRESHOLD).astype('float32').where(values.notna())
+        # A new frame: loaded data is shared with DataLoader, must not be modified
+        groups = pd.DataFrame({**{key: data[key] for key in keys}, 'NQDS_Value': values, 'Exceeds': exceeds}).groupby(keys, observed=True)
+        return {mode: HeatmapDataFormatter.FRAME_REDUCERS[mode](groups) for mode in modes}
+
+
+    @staticmethod
+    def reduce_values(values, axis, modes):
+        """
+        Computes several statistics of |NQDS| values over an ndarray axis, ignoring NaN.
+        All-NaN cells (combinations absent from the file) stay NaN.
+        \nArgs:
+        values (ndarray): |NQDS| values
+        axis (int): axis reduced
+        modes (list): HeatmapDataMode values computed
+        \nReturns:
+        dictionary mode -> ndarray
+        """
+        for mode in modes:
+            HeatmapDataFormatter.check_mode(mode)
+
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return {mode: HeatmapDataFormatter.CUBE_REDUCERS[mode](values, axis) for mode in modes}
+
+
+    @staticmethod
+    def format_iteration(data_loader, iteration, index, columns, mode):
         """
-        Returns Wells by Models dataframe based on provided data
+        Returns index by columns dataframe of an iteration
         \nArgs:
-        data (DataFrame): provided data to be formatted
+        data_loader (DataLoader): loader holding the data
+        iteration (int): desired iteration
+        index (str): axis shown as rows
+        columns (str): axis shown as columns
+        mode (HeatmapDataMode): display mode of the heatmap
         """
-        print('[HEATMAP_FORMATTER] Wells x Models')
-        HeatmapDataFormatter.check_mode(mode)
-        print(f'[HEATMAP_FORMATTER] Heatmap Mode: {mode}')
-        
-        data['NQDS_Value'] = data['NQDS_Value'].abs()
-        final_df = None
+        return HeatmapDataFormatter.format_iterations(data_loader, [iteration], index, columns, mode)[iteration]
 
-        if mode is HeatmapDataMode.AVG:
-            final_df = data.groupby(['Wells', 'Models'])['NQDS_Value'].mean().reset_index()
 
-        # MIN view
-        elif mode is HeatmapDataMode.MIN:
-            final_df = data.groupby(['Wells', 'Models'])['NQDS_Value'].min().reset_index()
+    @staticmethod
+    def format_iterations(data_loader, iterations, index, columns, mode):
+        """
+        Returns index by columns dataframes of several iterations in one mode
+        \nArgs:
+        data_loader (DataLoader): loader holding the data
+        iterations (list): desired iterations
+        index (str): axis shown as rows
+        columns (str): axis shown as columns
+        mode (HeatmapDataMode): display mode of the heatmap
+        \nReturns:
+        dictionary iteration -> DataFrame
+        """
+        statistics = HeatmapDataFormatter.format_statistics(data_loader, iterations, index, columns, [mode])
+        return {iteration: matrices[mode] for iteration, matrices in statistics.items()}
 
-        # MAX view
-        elif mode is HeatmapDataMode.MAX:
-            final_df = data.groupby(['Wells', 'Models'])['NQDS_Value'].max().reset_index()
 
-        pivot_df = final_df.pivot(index='Wells', columns='Models', values='NQDS_Value')
-        return pivot_df
-    
     @staticmethod
-    def wells_attributes(data, mode):
+    def format_statistics(data_loader, iterations, index, columns, modes):
         """
-        Returns Wells by Attributes dataframe based on provided data
+        Returns index by columns dataframes of several iterations in several modes, computed in a single pass over the data:
+        one extraction of the DataCube's selected iterations when it is available, one groupby over
+        (Iteration, index, columns) otherwise
         \nArgs:
-        data (DataFrame): provided data to be formatted
+        data_loader (DataLoader): loader holding the data
+        iterations (list): desired iterations
+        index (str): axis shown as rows
+        columns (str): axis shown as columns
+        modes (list): HeatmapDataMode values computed
+        \nReturns:
+        dictionary iteration -> (dictionary mode -> DataFrame)
         """
-        print('[HEATMAP_FORMATTER] Wells x Attributes')
-        print(f'[HEATMAP_FORMATTER] Heatmap Mode: {mode}')
+        cube = data_loader.get_cube()
+        if cube is not None:
+            return HeatmapDataFormatter.from_cube_statistics(cube, iterations, index, columns, modes)
 
-        HeatmapDataFormatter.check_mode(mode)
-        
-        data['NQDS_Value'] = data['NQDS_Value'].abs()
-        final_df = None
+        print(f'[HEATMAP_FORMATTER] {index} x {columns} of iterations {list(iterations)}, modes {[mode.name for mode in modes]}')
+        statistics = HeatmapDataFormatter.aggregate(data_loader.get_iterations(iterations), ['Iteration', index, columns], modes)
 
-        if mode is HeatmapDataMode.AVG:
-            final_df = data.groupby(['Wells', 'Attributes'])['NQDS_Value'].mean().reset_index()
+        matrices = {}
+        for mode, grouped in statistics.items():
+            for iteration, iteration_values in grouped.groupby(level='Iteration', observed=True):
+                matrices.setdefault(iteration, {})[mode] = iteration_values.droplevel('Iteration').unstack(columns)
+        return matrices
 
-        # MIN view
-        elif mode is HeatmapDataMode.MIN:
-            final_df = data.groupby(['Wells', 'Attributes'])['NQDS_Value'].min().reset_index()
 
-        # MAX view
-        elif mode is HeatmapDataMode.MAX:
-            final_df = data.groupby(['Wells', 'Attributes'])['NQDS_Value'].max().reset_index()
+    @staticmethod
+    def from_cube(cube, iteration, index, columns, mode):
+        """
+        Returns index by columns dataframe of an iteration, reducing the remaining axis of the DataCube
+        with a single NaN-aware reduction
+        \nArgs:
+        cube (DataCube): dense representation of the loaded data
+        iteration (int): desired iteration
+        index (str): axis shown as rows (Wells, Models or Attributes)
+        columns (str): axis shown as columns (Wells, Models or Attributes)
+        mode (HeatmapDataMode): reduction applied over the remaining axis
+        """
+        return HeatmapDataFormatter.from_cube_statistics(cube, [iteration], index, columns, [mode])[iteration][mode]
 
-        pivot_df = final_df.pivot(index='Wells', columns='Attributes', values='NQDS_Value')
-        return pivot_df
-    
 
     @staticmethod
-    def attributes_models(data, mode):
+    def from_cube_statistics(cube, iterations, index, columns, modes):
         """
-        Returns Attributes by Models dataframe based on provided data
+        Returns index by columns dataframes of several iterations in several modes, reducing the remaining axis
+        of the DataCube slice of the selected iterations, read once
         \nArgs:
-        data (DataFrame): provided data to be formatted
+        cube (DataCube): dense representation of the loaded data
+        iterations (list): desired iterations
+        index (str): axis shown as rows (Wells, Models or Attributes)
+        columns (str): axis shown as columns (Wells, Models or Attributes)
+        modes (list): reductions applied over the remaining axis
+        \nReturns:
+        dictionary iteration -> (dictionary mode -> DataFrame)
         """
-        print('[HEATMAP_FORMATTER] Attributes x Models')
-        print(f'[HEATMAP_FORMATTER] Heatmap Mode: {mode}')
+        print(f'[HEATMAP_FORMATTER] {index} x {columns} (cube), modes {[mode.name for mode in modes]}')
 
-        HeatmapDataFormatter.check_mode(mode)
-        
-        data['NQDS_Value'] = data['NQDS_Value'].abs()
-        final_df = None
+        cube_axes = ['Models', 'Attributes', 'Wells'] # Axes of an iteration slice
+        reduced_axis = next(axis for axis in cube_axes if axis not in (index, columns))
+        positions = [cube.position('Iteration', iteration) for iteration in iterations]
+        if positions == list(range(positions[0], positions[0] + len(positions))):
+            values = np.abs(cube.values[positions[0]:positions[0] + len(positions)]) # Consecutive iterations are read as one slice
+        else:
+            values = np.abs(cube.values[positions])
 
-        if mode is HeatmapDataMode.AVG:
-            final_df = data.groupby(['Attributes', 'Models'])['NQDS_Value'].mean().reset_index()
+        statistics = HeatmapDataFormatter.reduce_values(values, 1 + cube_axes.index(reduced_axis), modes)
+
+        remaining_axes = [axis for axis in cube_axes if axis != reduced_axis]
+        matrices = {iteration: {} for iteration in iterations}
+        for mode, mode_matrices in statistics.items():
+            if remaining_axes != [index, columns]:
+                mode_matrices = mode_matrices.transpose(0, 2, 1)
+            for iteration, matrix in zip(iterations, mode_matrices):
+                matrices[iteration][mode] = HeatmapDataFormatter._matrix_to_frame(cube, matrix, index, columns)
+        return matrices
+
+
+    @staticmethod
+    def _matrix_to_frame(cube, matrix, index, columns):
+        """
+        Labels a reduced cube matrix as an index by columns dataframe.
+        As in a groupby, only labels with values in the matrix are kept.
+        """
+        observed = ~np.isnan(matrix)
+        rows = observed.any(axis=1)
+        cols = observed.any(axis=0)
+        return pd.DataFrame(
+            matrix[rows][:, cols],
+            index=pd.Index(np.asarray(cube.labels[index])[rows], name=index),
+            columns=pd.Index(np.asarray(cube.labels[columns])[cols], name=columns)
+        )
+
+
+    @staticmethod
+    def compare_iterations(matrices, comparison):
+        """
+        Compares each iteration's matrix with the previous one, all pairs at once on matrices aligned to the same labels
+        \nArgs:
+        matrices (list): DataFrames of consecutive compared iterations, with the same index and columns axes
+        comparison (HeatmapComparison): DELTA (matrix minus previous) or RATIO (matrix divided by previous)
+        \nReturns:
+        list of DataFrames, one per matrix after the first. Cells missing in either iteration are NaN,
+        as are ratios to a zero value.
+        """
+        if not isinstance(comparison, HeatmapComparison):
+            raise ValueError(f"[HeatmapDataFormatter] Invalid comparison: {comparison}. Must be a HeatmapComparison Enum value.")
 
-        # MIN view
-        elif mode is HeatmapDataMode.MIN:
-            final_df = data.groupby(['Attributes', 'Models'])['NQDS_Value'].min().reset_index()
+        index_labels = matrices[0].index
+        column_labels = matrices[0].columns
+        for matrix in matrices[1:]:
+            index_labels = index_labels.union(matrix.index)
+            column_labels = column_labels.union(matrix.columns)
+        stacked = np.stack([matrix.reindex(index=index_labels, columns=column_labels).to_numpy(dtype='float32') for matrix in matrices])
 
-        # MAX view
-        elif mode is HeatmapDataMode.MAX:
-            final_df = data.groupby(['Attributes', 'Models'])['NQDS_Value'].max().reset_index()
+        previous, following = stacked[:-1], stacked[1:]
+        if comparison is HeatmapComparison.DELTA:
+            compared = following - previous
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                compared = np.where(previous > 0, following / previous, np.nan).astype('float32')
 
-        pivot_df = final_df.pivot(index='Attributes', columns='Models', values='NQDS_Value')
-        return pivot_df
+        return [pd.DataFrame(values, index=index_labels, columns=column_labels) for values in compared]
 
 
     @staticmethod
@@ -0,0 +1,127 @@
+import numpy as np
+
+
+class IterationIndex:
+    """
+    Byte-offset index of the iteration blocks of a data file, so iterations can be parsed on their own.
+    The file is scanned once, block of bytes by block of bytes: only the iteration field of each line is decoded,
+    with numpy, and a block ends wherever it changes. Every line is checked, so a file whose iterations are not
+    contiguous (e.g. 1, 2 then 1 again) is detected, see is_contiguous.
+    \nAttributes:
+    blocks: list of (iteration, start offset, end offset), in file order, ends excluded
+    """
+    SCAN_BYTES = 16 * 2**20 # Bytes of the file scanned at a time
+
+    def __init__(self, blocks):
+        self.__blocks = blocks
+
+
+    @property
+    def blocks(self):
+        return self.__blocks
+
+
+    @staticmethod
+    def build(file, data_start, total_bytes):
+        """
+        Indexes the iteration blocks of a data file.
+        \nArgs:
+        file (file object): seekable data file, opened in binary mode
+        data_start (int): offset of the first data line, after the header
+        total_bytes (int): size of the file
+        \nReturns:
+        IterationIndex, or None when the file has no data line
+        """
+        blocks = [] # [iteration, start offset], ends added once the whole file is scanned
+        file.seek(data_start)
+        offset = data_start # File offset of the bytes being scanned, always at a line start
+        remainder = b'' # Incomplete last line of the previous scanned bytes
+        while offset + len(remainder) < total_bytes:
+            read = file.read(IterationIndex.SCAN_BYTES)
+            if not read: # Shrunk while being indexed, the remaining bytes never come
+                raise ValueError(f"Data file changed while it was indexed: {offset + len(remainder)} of {total_bytes} bytes read")
+            scanned = remainder + read
+            at_end = file.tell() >= total_bytes
+            if not at_end:
+                complete = scanned.rfind(b'\n') + 1
+                if complete == 0: # A single line longer than the scanned bytes
+                    remainder = scanned
+                    continue
+                scanned, remainder = scanned[:complete], scanned[complete:]
+            else:
+                remainder = b''
+            for line_start, iteration in IterationIndex._iteration_changes(scanned, blocks[-1][0] if blocks else None):
+                blocks.append([iteration, offset + line_start])
+            offset += len(scanned)
+
+        if not blocks:
+            return None
+        ends = [start for _, start in blocks[1:]] + [total_bytes]
+        return IterationIndex([(iteration, start, end) for (iteration, start), end in zip(blocks, ends)])
+
+
+    def is_contiguous(self):
+        """
+        Whether each iteration is written in a single block, as in DA output files.
+        """
+        return len(self.iterations()) == len(self.__blocks)
+
+
+    def iterations(self):
+        """
+        Lists the indexed iterations, in file order.
+        """
+        return list(dict.fromkeys(iteration for iteration, _, _ in self.__blocks))
+
+
+    def ranges(self, iteration):
+        """
+        Lists the byte ranges of an iteration's blocks.
+        \nReturns:
+        list of (start offset, end offset)
+        """
+        return [(start, end) for block_iteration, start, end in self.__blocks if block_iteration == iteration]
+
+
+    @staticmethod
+    def _iteration_changes(scanned, previous_iteration):
+        """
+        Finds the lines of scanned bytes whose iteration differs from the previous line's.
+        \nArgs:
+        scanned (bytes): complete lines of the file
+        previous_iteration (int): iteration of the line before them, or None
+        \nReturns:
+        list of (offset of the line in scanned, iteration)
+        """
+        values = np.frombuffer(scanned, dtype=np.uint8)
+        line_ends = np.flatnonzero(values == ord('\n'))
+        if len(line_ends) == 0 or line_ends[-1] != len(values) - 1:
+            line_ends = np.append(line_ends, len(values)) # Last line of the file, without a newline
+        line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+        blank = (line_starts == line_ends) | (values[np.minimum(line_starts, len(values) - 1)] == ord('\r'))
+        line_starts, line_ends = line_starts[~blank], line_ends[~blank]
+        if len(line_starts) == 0:
+            return []
+
+        # The iteration field is read digit by digit, on all lines at once, up to its ';'
+        iterations = np.zeros(len(line_starts), dtype=np.int64)
+        reading = np.ones(len(line_starts), dtype=bool) # Lines whose ';' is not reached yet
+        for position in range(19): # Iterations fit int64
+            positions = line_starts + position
+            characters = values[np.minimum(positions, len(values) - 1)]
+            digits = characters.astype(np.int64) - ord('0')
+            digit = reading & (positions < line_ends) & (digits >= 0) & (digits <= 9)
+            ended = reading & (positions < line_ends) & (characters == ord(';')) & (position > 0)
+            invalid = reading & ~digit & ~ended
+            if invalid.any() or (position == 18 and digit.any()):
+                line_start = int(line_starts[np.argmax(invalid | digit)])
+                raise ValueError(f"Data file line does not start with an iteration: {scanned[line_start:line_start + 40]!r}")
+            iterations = np.where(digit, iterations * 10 + digits, iterations)
+            reading = digit
+            if not reading.any():
+                break
+
+        changes = np.flatnonzero(np.diff(iterations) != 0) + 1
+        if previous_iteration != iterations[0]:
+            changes = np.concatenate(([0], changes))
+        return [(int(line_starts[change]), int(iterations[change])) for change in changes]
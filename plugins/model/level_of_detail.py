@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+from plugins.model.heatmap_data_formatter import HeatmapDataMode
+
+
+class LevelOfDetail:
+    """
+    Level-of-detail reduction of the Models axis of heatmap DataFrames.
+    Consecutive models are binned so the axis has at most a target number of entries, each bin aggregated
+    with the heatmap mode (MAX keeps maxima, MIN keeps minima, other modes average). Binned axes are IntervalIndexes
+    holding the first and last original model of each bin.
+    """
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def downsample_models(dataframe, max_models, mode):
+        """
+        Bins the Models axis (index or columns) of a DataFrame down to max_models entries.
+        \nArgs:
+        dataframe (DataFrame): heatmap data, with models in ascending order
+        max_models (int): maximum number of entries on the Models axis. None disables the reduction.
+        mode (HeatmapDataMode): display mode of the heatmap, selecting the bin aggregation
+        \nReturns:
+        DataFrame with the Models axis binned, or the same DataFrame when it already fits
+        """
+        if max_models is None:
+            return dataframe
+
+        models_on_index = dataframe.index.name == 'Models'
+        if models_on_index:
+            dataframe = dataframe.transpose()
+        elif dataframe.columns.name != 'Models':
+            return dataframe
+
+        model_count = len(dataframe.columns)
+        if model_count <= max_models:
+            return dataframe.transpose() if models_on_index else dataframe
+
+        bin_size = -(-model_count // max_models) # Ceiling division
+        starts = np.arange(0, model_count, bin_size)
+        ends = np.append(starts[1:], model_count) - 1
+        values = dataframe.to_numpy()
+
+        with np.errstate(invalid='ignore'): # Bins without any value stay NaN
+            if mode is HeatmapDataMode.MAX:
+                binned_values = np.fmax.reduceat(values, starts, axis=1)
+            elif mode is HeatmapDataMode.MIN:
+                binned_values = np.fmin.reduceat(values, starts, axis=1)
+            else:
+                sums = np.add.reduceat(np.nan_to_num(values), starts, axis=1)
+                counts = np.add.reduceat(~np.isnan(values), starts, axis=1)
+                binned_values = sums / counts
+
+        models = dataframe.columns.to_numpy()
+        binned_models = pd.IntervalIndex.from_arrays(models[starts], models[ends], closed='both', name='Models')
+        binned = pd.DataFrame(binned_values, index=dataframe.index, columns=binned_models)
+        print(f"[{LevelOfDetail.__name__}] [DOWNSAMPLE_MODELS]: {model_count} models binned into {len(starts)} columns of {bin_size}")
+        return binned.transpose() if models_on_index else binned
+
+
+    @staticmethod
+    def restrict_models(dataframe, models_window):
+        """
+        Keeps only the models inside a window on the Models axis (index or columns) of a DataFrame.
+        \nArgs:
+        dataframe (DataFrame): heatmap data
+        models_window (list): first and last model to keep. None keeps every model.
+        \nReturns:
+        DataFrame restricted to the window
+        """
+        if models_window is None:
+            return dataframe
+        first_model, last_model = models_window
+        if dataframe.columns.name == 'Models':
+            return dataframe.loc[:, (dataframe.columns >= first_model) & (dataframe.columns <= last_model)]
+        if dataframe.index.name == 'Models':
+            return dataframe.loc[(dataframe.index >= first_model) & (dataframe.index <= last_model)]
+        return dataframe
+
+
+    @staticmethod
+    def model_ranges(axis_values):
+        """
+        Lists the first and last original model of each entry of a Models axis.
+        \nArgs:
+        axis_values (pd.Index): Models axis, binned (IntervalIndex) or not
+        \nReturns:
+        list of [first model, last model] pairs
+        """
+        if isinstance(axis_values, pd.IntervalIndex):
+            return [[int(first), int(last)] for first, last in zip(axis_values.left, axis_values.right)]
+        return [[int(model), int(model)] for model in axis_values]
+
+
+    @staticmethod
+    def describe(dataframe, models_window = None):
+        """
+        Describes the Models axis of a heatmap DataFrame, so zooming on the figure can be mapped back to models.
+        \nArgs:
+        dataframe (DataFrame): heatmap data as displayed
+        models_window (list, optional): model window the DataFrame was restricted to
+        \nReturns:
+        dict with the figure axis holding models ('x', 'y' or None), the model range of each axis entry,
+        whether the axis is binned and the model window
+        """
+        if dataframe.columns.name == 'Models':
+            axis, axis_values = 'x', dataframe.columns
+        elif dataframe.index.name == 'Models':
+            axis, axis_values = 'y', dataframe.index
+        else:
+            return {'axis': None, 'ranges': [], 'binned': False, 'window': models_window}
+        return {
+            'axis': axis,
+            'ranges': LevelOfDetail.model_ranges(axis_values),
+            'binned': isinstance(axis_values, pd.IntervalIndex),
+            'window': models_window
+        }
+
+
+    @staticmethod
+    def window_from_relayout(relayout_data, lod_state):
+        """
+        Maps a zoom on a heatmap figure back to the window of original models it shows.
+        \nArgs:
+        relayout_data (dict): relayoutData of the dcc.Graph
+        lod_state (dict): description of the figure's Models axis, as built by describe
+        \nReturns:
+        tuple (changed, window): changed is False when the event does not affect the Models axis;
+        window is [first model, last model], or None to show every model again
+        """
+        axis = lod_state.get('axis') if lod_state else None
+        if not relayout_data or axis is None:
+            return False, None
+
+        if relayout_data.get(f'{axis}axis.autorange'):
+            return True, None
+
+        axis_range = relayout_data.get(f'{axis}axis.range')
+        if axis_range is None and f'{axis}axis.range[0]' in relayout_data:
+            axis_range = [relayout_data[f'{axis}axis.range[0]'], relayout_data[f'{axis}axis.range[1]']]
+        if axis_range is None:
+            return False, None
+
+        # Category axes place entries at integer positions
+        ranges = lod_state['ranges']
+        first_position = min(max(int(np.ceil(min(axis_range))), 0), len(ranges) - 1)
+        last_position = max(min(int(np.floor(max(axis_range))), len(ranges) - 1), first_position)
+        visible_models = [model for model_range in ranges[first_position:last_position + 1] for model in model_range]
+        return True, [min(visible_models), max(visible_models)]
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe key-value cache bounded by the total size of its values, evicting the least recently used entries first.
+    \nAttributes:
+    max_bytes: size budget of the cache
+    sizeof: function returning the size in bytes of a value
+    hits, misses: lookup counters
+    """
+    def __init__(self, max_bytes, sizeof):
+        self.__max_bytes = max_bytes
+        self.__sizeof = sizeof
+        self.__entries = OrderedDict() # key -> (value, size), least recently used first
+        self.__total_bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = threading.Lock()
+
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
+
+
+    @property
+    def hits(self):
+        return self.__hits
+
+
+    @property
+    def misses(self):
+        return self.__misses
+
+
+    def get(self, key):
+        """
+        Gets a cached value, marking it as recently used.
+        \nReturns:
+        the value, or None when the key is not cached
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return entry[0]
+
+
+    def put(self, key, value):
+        """
+        Caches a value, evicting least recently used values above the size budget.
+        Values larger than the whole budget are not cached.
+        """
+        size = self.__sizeof(value)
+        with self.__lock:
+            if key in self.__entries:
+                self.__total_bytes -= self.__entries.pop(key)[1]
+            if size > self.__max_bytes:
+                return
+            self.__entries[key] = (value, size)
+            self.__total_bytes += size
+            while self.__total_bytes > self.__max_bytes:
+                _, (_, evicted_size) = self.__entries.popitem(last=False)
+                self.__total_bytes -= evicted_size
+
+
+    def pop(self, key):
+        """
+        Removes a value from the cache.
+        \nReturns:
+        the removed value, or None when the key was not cached
+        """
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is None:
+                return None
+            self.__total_bytes -= entry[1]
+            return entry[0]
+
+
+    def keys(self):
+        """
+        Lists the cached keys, least recently used first.
+        """
+        with self.__lock:
+            return list(self.__entries.keys())
+
+
+    def clear(self):
+        """
+        Removes every cached value. Counters are kept.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__total_bytes = 0
+
+
+    def get_memory_usage(self):
+        """
+        Retrieves the total size of the cached values.
+        \nReturns:
+        int: size in bytes
+        """
+        return self.__total_bytes
+
+
+    def __len__(self):
+        return len(self.__entries)
@@ -0,0 +1,130 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from plugins.model.heatmap_aggregates import HeatmapAggregates
+from plugins.model.heatmap_data_formatter import HeatmapDataFormatter, HeatmapDataMode
+
+
+class RunningAggregates:
+    """
+    Mergeable statistics of the |NQDS| values of every axis pair and iteration, updated with appended rows only
+    (see DataController.follow_file). Counts, sums, sums of squares, minimums, maximums and exceedances of two sets
+    of rows merge into those of their union, so appending rows costs their own grouping plus a merge per updated matrix.
+    Instances are not modified once built: update returns new statistics, sharing those of the other iterations.
+    Medians and percentiles do not merge: they are computed from the iteration's rows by HeatmapDataFormatter.
+    \nAttributes:
+    partials: (dictionary) (iteration, index, columns) -> DataFrame of partial statistics indexed by (index, columns)
+    """
+    MODES = [HeatmapDataMode.AVG, HeatmapDataMode.MIN, HeatmapDataMode.MAX, HeatmapDataMode.STD,
+             HeatmapDataMode.COUNT, HeatmapDataMode.EXCEEDANCE] # Modes computed from the partial statistics
+    SUMMED = ['count', 'sum', 'squares', 'exceeds'] # Partial statistics merged by addition, the others are min and max
+
+    def __init__(self):
+        self.__partials = {}
+
+
+    @staticmethod
+    def build(data):
+        """
+        Computes the partial statistics of loaded data.
+        \nArgs:
+        data (DataFrame): loaded data
+        \nReturns:
+        RunningAggregates
+        """
+        return RunningAggregates().update(data)[0]
+
+
+    def update(self, data):
+        """
+        Merges the statistics of appended rows into those of their iterations.
+        \nArgs:
+        data (DataFrame): appended rows, in the loaded data layout
+        \nReturns:
+        tuple (RunningAggregates with the merged statistics, list of the updated iterations)
+        """
+        values = data['NQDS_Value'].abs().astype('float64') # Sums of squares lose precision in float32
+        frame = pd.DataFrame({
+            'Iteration': data['Iteration'],
+            # Labels of appended rows have their own categories, so partials are indexed by plain labels
+            **{axis: data[axis].astype(str) if isinstance(data[axis].dtype, pd.CategoricalDtype) else data[axis]
+               for axis in ('Wells', 'Models', 'Attributes')},
+            'Value': values,
+            'Square': values ** 2,
+            'Exceeds': (values > HeatmapDataFormatter.EXCEEDANCE_THRESHOLD).astype('float64').where(values.notna())
+        })
+
+        aggregates = RunningAggregates()
+        aggregates.__partials = dict(self.__partials)
+        iterations = set()
+        for index, columns in HeatmapAggregates.AXIS_PAIRS:
+            groups = frame.groupby(['Iteration', index, columns])
+            partials = pd.DataFrame({
+                'count': groups['Value'].count(),
+                'sum': groups['Value'].sum(),
+                'squares': groups['Square'].sum(),
+                'exceeds': groups['Exceeds'].sum(),
+                'min': groups['Value'].min(),
+                'max': groups['Value'].max()
+            })
+            for iteration, iteration_partials in partials.groupby(level='Iteration'):
+                key = (int(iteration), index, columns)
+                iteration_partials = iteration_partials.droplevel('Iteration')
+                existing = self.__partials.get(key)
+                aggregates.__partials[key] = iteration_partials if existing is None else self.merge(existing, iteration_partials)
+                iterations.add(int(iteration))
+        return aggregates, sorted(iterations)
+
+
+    @staticmethod
+    def merge(partials, other):
+        """
+        Merges the partial statistics of two sets of rows.
+        \nReturns:
+        DataFrame of the partial statistics of their union
+        """
+        partials, other = partials.align(other, join='outer')
+        merged = {column: partials[column].add(other[column], fill_value=0) for column in RunningAggregates.SUMMED}
+        merged['min'] = np.fmin(partials['min'], other['min'])
+        merged['max'] = np.fmax(partials['max'], other['max'])
+        return pd.DataFrame(merged)
+
+
+    def statistics(self, iteration, index, columns):
+        """
+        Computes the index by columns matrices of an iteration in every mode of MODES.
+        \nArgs:
+        iteration (int): desired iteration
+        index (str): axis shown as rows
+        columns (str): axis shown as columns
+        \nReturns:
+        dictionary mode -> DataFrame, empty when the iteration has no statistics
+        """
+        partials = self.__partials.get((iteration, index, columns))
+        if partials is None:
+            return {}
+
+        count = partials['count'].where(partials['count'] > 0) # Cells without any value are NaN
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)
+            variance = (partials['squares'] - partials['sum'] ** 2 / count).clip(lower=0) / (count - 1) # Sample variance, as pandas
+            cells = {
+                HeatmapDataMode.AVG: partials['sum'] / count,
+                HeatmapDataMode.MIN: partials['min'],
+                HeatmapDataMode.MAX: partials['max'],
+                HeatmapDataMode.STD: np.sqrt(variance.where(count > 1)),
+                HeatmapDataMode.COUNT: count,
+                HeatmapDataMode.EXCEEDANCE: partials['exceeds'] / count
+            }
+        return {mode: values.astype('float32').unstack(columns) for mode, values in cells.items()}
+
+
+    def get_memory_usage(self):
+        """
+        Retrieves the memory footprint of the partial statistics.
+        \nReturns:
+        int: size in bytes
+        """
+        return int(sum(partials.memory_usage(index=True, deep=True).sum() for partials in self.__partials.values()))
@@ -0,0 +1,200 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from plugins.model.data_cube import DataCube
+from plugins.model.dataset_cache import DatasetCache
+
+
+class SharedDatasetStore:
+    """
+    Parsed datasets shared by the server's worker processes through memory-mapped files, keyed by the content hash
+    of the source file. The first worker loading a file publishes its columns and cube as .npy files with a small
+    manifest; every worker, the publishing one included, then attaches them as read-only memory maps. The pages of
+    a dataset are held once by the operating system whatever the number of workers, so memory scales with the number
+    of datasets. On a tmpfs folder such as /dev/shm the files are shared memory themselves.
+    Session dataset ids are recorded next to the datasets, so a worker receiving a request for a dataset loaded
+    by another one finds it (see DatasetRegistry.get).
+    \nAttributes:
+    directory: folder holding the shared datasets
+    max_bytes: size cap of the folder, least recently attached datasets being removed above it
+    version: parser version the shared datasets must match
+    """
+    MANIFEST = 'manifest.json'
+    DATASETS_FOLDER = 'datasets' # Session dataset id -> key of its shared dataset
+
+    def __init__(self, version, directory, max_bytes):
+        self.__version = version
+        self.__directory = directory
+        self.__max_bytes = max_bytes
+        os.makedirs(os.path.join(self.__directory, SharedDatasetStore.DATASETS_FOLDER), exist_ok=True)
+
+
+    @property
+    def directory(self):
+        return self.__directory
+
+
+    @property
+    def max_bytes(self):
+        return self.__max_bytes
+
+
+    @property
+    def version(self):
+        return self.__version
+
+
+    def contains(self, key):
+        """
+        Checks whether a dataset is published, without attaching it.
+        """
+        return key is not None and os.path.exists(os.path.join(self._entry_path(key), SharedDatasetStore.MANIFEST))
+
+
+    def publish(self, key, data, cube = None):
+        """
+        Publishes a dataset, unless another worker already did, and attaches it.
+        Files are written in a private folder renamed once complete, so other workers never attach a partial dataset.
+        \nArgs:
+        key (str): content hash of the source file (see DatasetCache.file_key)
+        data (DataFrame): loaded data, as built by DataLoader
+        cube (DataCube, optional): cube of the data, shared along with it
+        \nReturns:
+        tuple (DataFrame, DataCube or None) over the shared files, or None when the dataset could not be published
+        """
+        if not self.contains(key):
+            temp_path = tempfile.mkdtemp(prefix='.publishing-', dir=self.__directory)
+            try:
+                arrays = DatasetCache.frame_to_arrays(data)
+                for name, values in arrays.items():
+                    np.save(os.path.join(temp_path, f'{name}.npy'), values)
+                manifest = {'arrays': list(arrays), 'rows': len(data), 'cube': None}
+                if cube is not None:
+                    np.save(os.path.join(temp_path, 'cube.npy'), cube.values)
+                    manifest['cube'] = cube.labels
+                with open(os.path.join(temp_path, SharedDatasetStore.MANIFEST), 'w') as file:
+                    json.dump(manifest, file)
+                os.rename(temp_path, self._entry_path(key))
+                print(f"[{self.__class__.__name__}] [PUBLISH]: Dataset {key} published ({self._entry_size(self._entry_path(key)) / 2**20:.1f} MiB)")
+            except (OSError, TypeError) as e: # Published by another worker meanwhile, the folder is full, or labels are not JSON
+                shutil.rmtree(temp_path, ignore_errors=True)
+                if not self.contains(key):
+                    print(f"[{self.__class__.__name__}] [PUBLISH]: Could not publish dataset {key}: {str(e)}")
+                    return None
+            self.evict(key)
+        return self.attach(key)
+
+
+    def attach(self, key):
+        """
+        Attaches a published dataset without copying it: columns and cube are read-only memory maps of the shared files.
+        \nArgs:
+        key (str): content hash of the source file
+        \nReturns:
+        tuple (DataFrame, DataCube or None), or None when the dataset is not published
+        """
+        if not self.contains(key):
+            return None
+        path = self._entry_path(key)
+        try:
+            with open(os.path.join(path, SharedDatasetStore.MANIFEST)) as file:
+                manifest = json.load(file)
+            arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in manifest['arrays']}
+            data = SharedDatasetStore.arrays_to_frame(arrays)
+            cube = None
+            if manifest['cube'] is not None:
+                cube = DataCube(np.load(os.path.join(path, 'cube.npy'), mmap_mode='r'), manifest['cube'])
+        except (OSError, ValueError, KeyError) as e: # Removed by another worker meanwhile
+            print(f"[{self.__class__.__name__}] [ATTACH]: Dataset {key} cannot be attached: {str(e)}")
+            return None
+
+        os.utime(os.path.join(path, SharedDatasetStore.MANIFEST)) # Last access, used for eviction
+        print(f"[{self.__class__.__name__}] [ATTACH]: Dataset {key} attached, {manifest['rows']} rows")
+        return data, cube
+
+
+    @staticmethod
+    def arrays_to_frame(arrays):
+        """
+        Rebuilds a DataFrame over the arrays of DatasetCache.frame_to_arrays, without copying them.
+        \nReturns:
+        DataFrame
+        """
+        columns = {}
+        for column in arrays['columns'].tolist():
+            if f'{column}.codes' in arrays:
+                columns[column] = pd.Categorical.from_codes(arrays[f'{column}.codes'], categories=arrays[f'{column}.categories'].tolist())
+            else:
+                columns[column] = arrays[column]
+        return pd.DataFrame(columns, copy=False)
+
+
+    def register_dataset(self, dataset_id, key):
+        """
+        Records the shared dataset of a session's dataset id, for the other workers.
+        """
+        path = self._dataset_path(dataset_id)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w') as file:
+            json.dump({'key': key}, file)
+        os.replace(temp_path, path)
+
+
+    def dataset_key(self, dataset_id):
+        """
+        Gets the key of the shared dataset of a session's dataset id.
+        \nReturns:
+        str, or None when the dataset id was not registered by any worker
+        """
+        try:
+            with open(self._dataset_path(dataset_id)) as file:
+                return json.load(file)['key']
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+    def evict(self, kept_key = None):
+        """
+        Removes least recently attached datasets until the folder fits its size cap.
+        Workers still attached to a removed dataset keep reading it, as its files are only unlinked.
+        """
+        entries = []
+        for file_name in os.listdir(self.__directory):
+            path = os.path.join(self.__directory, file_name)
+            if file_name.startswith(self._version_prefix()) and path != self._entry_path(kept_key):
+                try:
+                    entries.append((path, os.stat(os.path.join(path, SharedDatasetStore.MANIFEST)).st_mtime, self._entry_size(path)))
+                except OSError:
+                    continue # Removed concurrently
+        entries.sort(key=lambda entry: entry[1])
+        total_bytes = sum(size for _, _, size in entries) + (self._entry_size(self._entry_path(kept_key)) if kept_key else 0)
+        while total_bytes > self.__max_bytes and entries:
+            path, _, size = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total_bytes -= size
+            print(f"[{self.__class__.__name__}] [EVICT]: Removed {os.path.basename(path)}")
+
+
+    def _version_prefix(self):
+        return f'v{self.__version}-'
+
+
+    def _entry_path(self, key):
+        return os.path.join(self.__directory, f'{self._version_prefix()}{key}')
+
+
+    def _dataset_path(self, dataset_id):
+        return os.path.join(self.__directory, SharedDatasetStore.DATASETS_FOLDER, f'{os.path.basename(dataset_id)}.json')
+
+
+    @staticmethod
+    def _entry_size(path):
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(path))
+        except OSError:
+            return 0
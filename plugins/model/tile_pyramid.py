@@ -0,0 +1,222 @@
+import re
+import struct
+import zlib
+from functools import lru_cache
+
+import numpy as np
+import plotly.colors
+
+from plugins.model.heatmap_data_formatter import HeatmapDataMode
+
+
+class TilePyramid:
+    """
+    Multi-resolution pyramid of a heatmap matrix, served as PNG image tiles.
+    Level 0 holds the matrix itself; each following level aggregates 2x2 blocks of the previous one with the
+    heatmap mode, until the whole matrix fits a single tile. A viewport is drawn from the coarsest level that
+    still has about one cell per screen pixel, so the tiles fetched depend on the viewport size, not on the matrix size.
+    \nAttributes:
+    levels: list of float32 matrices, from full resolution to coarsest
+    zmin, zmax: value range mapped onto the colorscale
+    """
+    TILE_SIZE = 256 # Cells per tile side, at every level
+    PIXELS_PER_CELL = 2 # Image pixels per cell side, so zoomed-in tiles stay sharp when the browser stretches them
+
+    def __init__(self, matrix, mode, zmin, zmax):
+        """
+        \nArgs:
+        matrix (ndarray): heatmap values, rows by columns, NaN for empty cells
+        mode (HeatmapDataMode): display mode of the heatmap, selecting how cells are aggregated between levels
+        zmin, zmax (float): value range mapped onto the colorscale
+        """
+        levels = [np.asarray(matrix, dtype='float32')]
+        while max(levels[-1].shape) > TilePyramid.TILE_SIZE:
+            levels.append(TilePyramid._downsample(levels[-1], mode))
+        self.__levels = levels
+        self.__zmin = zmin
+        self.__zmax = zmax
+
+
+    @staticmethod
+    def _downsample(level, mode):
+        """
+        Aggregates the 2x2 blocks of a level, ignoring NaN values. Blocks without any value stay NaN.
+        MAX and MIN keep the extreme of each block, other modes average it.
+        """
+        rows, columns = level.shape
+        if rows % 2 or columns % 2: # Pads with empty cells so every block is complete
+            padded = np.full((rows + rows % 2, columns + columns % 2), np.nan, dtype='float32')
+            padded[:rows, :columns] = level
+            level = padded
+        corners = [level[0::2, 0::2], level[0::2, 1::2], level[1::2, 0::2], level[1::2, 1::2]]
+
+        if mode is HeatmapDataMode.MAX:
+            return np.fmax(np.fmax(corners[0], corners[1]), np.fmax(corners[2], corners[3]))
+        if mode is HeatmapDataMode.MIN:
+            return np.fmin(np.fmin(corners[0], corners[1]), np.fmin(corners[2], corners[3]))
+        sums = np.zeros(corners[0].shape, dtype='float32')
+        counts = np.zeros(corners[0].shape, dtype='float32')
+        for corner in corners:
+            valid = ~np.isnan(corner)
+            counts += valid
+            sums += np.where(valid, corner, 0)
+        with np.errstate(invalid='ignore'):
+            return sums / counts
+
+
+    @property
+    def levels(self):
+        return self.__levels
+
+
+    @property
+    def value_range(self):
+        return self.__zmin, self.__zmax
+
+
+    @property
+    def shape(self):
+        return self.__levels[0].shape
+
+
+    def level_count(self):
+        return len(self.__levels)
+
+
+    def tile_count(self, level):
+        """
+        Gets the number of tiles of a level.
+        \nReturns:
+        tuple (tile rows, tile columns)
+        """
+        rows, columns = self.__levels[level].shape
+        return -(-rows // TilePyramid.TILE_SIZE), -(-columns // TilePyramid.TILE_SIZE)
+
+
+    def tile_extent(self, level, tile_row, tile_column):
+        """
+        Gets the cells of the full resolution matrix covered by a tile.
+        The last cell of a coarse level may extend past the end of the matrix.
+        \nReturns:
+        tuple (first row, end row, first column, end column), ends excluded
+        """
+        size = TilePyramid.TILE_SIZE
+        scale = 2**level
+        rows, columns = self.__levels[level].shape
+        return (tile_row * size * scale, min((tile_row + 1) * size, rows) * scale,
+                tile_column * size * scale, min((tile_column + 1) * size, columns) * scale)
+
+
+    def select_level(self, visible_rows, visible_columns, width_px, height_px):
+        """
+        Selects the coarsest level with at least one screen pixel per cell.
+        \nArgs:
+        visible_rows, visible_columns (float): number of full resolution cells in the viewport
+        width_px, height_px (int): size of the plot area in pixels
+        \nReturns:
+        int: pyramid level
+        """
+        cells_per_pixel = max(visible_columns / width_px, visible_rows / height_px, 1)
+        return min(int(np.floor(np.log2(cells_per_pixel))), self.level_count() - 1)
+
+
+    def visible_tiles(self, row_range, column_range, width_px, height_px):
+        """
+        Lists the tiles covering a viewport, at the level matching its resolution.
+        \nArgs:
+        row_range, column_range (list): visible [start, end] of each axis, in full resolution cell positions
+        width_px, height_px (int): size of the plot area in pixels
+        \nReturns:
+        tuple (level, list of (tile row, tile column))
+        """
+        rows, columns = self.shape
+        row_start, row_end = max(min(row_range), 0), min(max(row_range), rows)
+        column_start, column_end = max(min(column_range), 0), min(max(column_range), columns)
+        level = self.select_level(row_end - row_start, column_end - column_start, width_px, height_px)
+
+        span = TilePyramid.TILE_SIZE * 2**level
+        tile_rows, tile_columns = self.tile_count(level)
+        first_row, last_row = int(row_start // span), min(int(row_end // span), tile_rows - 1)
+        first_column, last_column = int(column_start // span), min(int(column_end // span), tile_columns - 1)
+        return level, [(tile_row, tile_column) for tile_row in range(first_row, last_row + 1)
+                       for tile_column in range(first_column, last_column + 1)]
+
+
+    def render_tile(self, level, tile_row, tile_column, colorscale):
+        """
+        Renders a tile as a PNG image. Empty cells are transparent.
+        The image is flipped vertically, as heatmap rows grow upwards and image rows downwards.
+        \nArgs:
+        level (int): pyramid level
+        tile_row, tile_column (int): position of the tile in the level
+        colorscale (str): plotly colorscale name
+        \nReturns:
+        bytes: PNG image
+        """
+        if not 0 <= level < self.level_count():
+            raise IndexError(f"Pyramid level {level} does not exist")
+        tile_rows, tile_columns = self.tile_count(level)
+        if not (0 <= tile_row < tile_rows and 0 <= tile_column < tile_columns):
+            raise IndexError(f"Tile ({tile_row}, {tile_column}) does not exist at level {level}")
+
+        size = TilePyramid.TILE_SIZE
+        values = self.__levels[level][tile_row * size:(tile_row + 1) * size, tile_column * size:(tile_column + 1) * size]
+
+        with np.errstate(invalid='ignore'):
+            scaled = (values - self.__zmin) / (self.__zmax - self.__zmin) * 255
+        color_indexes = np.clip(np.nan_to_num(scaled), 0, 255).astype('uint8')
+        pixels = TilePyramid.colorscale_lut(colorscale)[color_indexes]
+        pixels[np.isnan(values), 3] = 0
+
+        pixels = pixels[::-1].repeat(TilePyramid.PIXELS_PER_CELL, axis=0).repeat(TilePyramid.PIXELS_PER_CELL, axis=1)
+        return TilePyramid.encode_png(pixels)
+
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def colorscale_lut(colorscale):
+        """
+        Samples a plotly colorscale into a lookup table of 256 RGBA colors.
+        \nArgs:
+        colorscale (str): plotly colorscale name (a '_r' suffix reverses it)
+        \nReturns:
+        uint8 ndarray shaped (256, 4)
+        """
+        colors = plotly.colors.sample_colorscale(plotly.colors.get_colorscale(colorscale), np.linspace(0, 1, 256).tolist())
+        lut = np.full((256, 4), 255, dtype='uint8')
+        for position, color in enumerate(colors):
+            lut[position, :3] = [round(float(channel)) for channel in re.findall(r'[\d.]+', color)[:3]]
+        lut.setflags(write=False)
+        return lut
+
+
+    @staticmethod
+    def encode_png(pixels):
+        """
+        Encodes an RGBA image as PNG.
+        \nArgs:
+        pixels (ndarray): uint8 array shaped (height, width, 4)
+        \nReturns:
+        bytes: PNG image
+        """
+        height, width, _ = pixels.shape
+        scanlines = np.zeros((height, width * 4 + 1), dtype='uint8') # Each scanline starts with filter type 0
+        scanlines[:, 1:] = pixels.reshape(height, -1)
+
+        def chunk(chunk_type, chunk_data):
+            return (struct.pack('>I', len(chunk_data)) + chunk_type + chunk_data
+                    + struct.pack('>I', zlib.crc32(chunk_type + chunk_data) & 0xFFFFFFFF))
+
+        return (b'\x89PNG\r\n\x1a\n'
+                + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) # 8-bit RGBA
+                + chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 6))
+                + chunk(b'IEND', b''))
+
+
+    def get_memory_usage(self):
+        """
+        Retrieves the memory footprint of the pyramid levels.
+        \nReturns:
+        int: size in bytes
+        """
+        return int(sum(level.nbytes for level in self.__levels))
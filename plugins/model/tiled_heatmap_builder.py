@@ -0,0 +1,175 @@
+import plotly.graph_objs as go
+from dash import dcc
+
+from plugins.model.heatmap_builder import HeatmapBuilder
+
+
+class TiledHeatmapBuilder:
+    """
+    Class for encapsulating tiled Heatmap building.
+    The heatmap is drawn from TilePyramid image tiles placed as layout images, instead of a plotly heatmap trace,
+    so the figure only holds the tiles covering the viewport. Cells are placed at integer positions on numeric axes.
+    """
+    PLOT_WIDTH = 1000 # Plot area in pixels: figure size minus margins, as in HeatmapBuilder
+    PLOT_HEIGHT = 600
+
+    def __init__(self, data, pyramid, tile_url, colorscale='bluered', comparison=None, mode=None):
+        """
+        \nArgs:
+        data (DataFrame): heatmap data the pyramid was built from, used for titles and ticks
+        pyramid (TilePyramid): pyramid of the data values
+        tile_url (str): URL of the pyramid's tiles, followed by /level/row/column.png
+        colorscale (str): plotly colorscale name
+        comparison (HeatmapComparison, optional): comparison shown, selecting the colorbar
+        mode (HeatmapDataMode, optional): display mode of the heatmap, selecting the colorbar
+        """
+        self.__data = data
+        self.__pyramid = pyramid
+        self.__tile_url = tile_url
+        self.__colorscale = colorscale
+        self.__comparison = comparison
+        self.__mode = mode
+
+        rows, columns = pyramid.shape
+        self.__row_range = [-0.5, rows - 0.5]
+        self.__column_range = [-0.5, columns - 0.5]
+
+        x_tickvals, x_ticktext = self._axis_ticks(self.__data.columns)
+        y_tickvals, y_ticktext = self._axis_ticks(self.__data.index)
+
+        self.__layout = go.Layout(
+                title=f"{self.__data.index.name} x {self.__data.columns.name}",
+                xaxis=dict(title=self.__data.columns.name, range=self.__column_range, tickvals=x_tickvals, ticktext=x_ticktext,
+                           showgrid=False, zeroline=False),
+                yaxis=dict(title=self.__data.index.name, range=self.__row_range, tickvals=y_tickvals, ticktext=y_ticktext,
+                           showgrid=False, zeroline=False),
+                width=1200,
+                height=800,
+                margin=dict(l=100, r=100, t=100, b=100),
+                images=TiledHeatmapBuilder.build_images(pyramid, tile_url, colorscale, self.__row_range, self.__column_range),
+            )
+
+
+    @property
+    def layout(self):
+        return self.__layout
+
+
+    @staticmethod
+    def _axis_ticks(axis_values):
+        """
+        Builds the ticks of an axis at cell positions, with the same labels as HeatmapBuilder.
+        """
+        axis_labels = HeatmapBuilder._axis_labels(axis_values)
+        tick_labels, ticktext = HeatmapBuilder._adjust_ticks(axis_values, axis_labels, axis_values.name)
+        positions = {label: position for position, label in enumerate(axis_labels)}
+        return [positions[label] for label in tick_labels], ticktext
+
+
+    @staticmethod
+    def build_images(pyramid, tile_url, colorscale, row_range, column_range):
+        """
+        Builds the layout images of the tiles covering a viewport.
+        \nArgs:
+        pyramid (TilePyramid): pyramid of the heatmap
+        tile_url (str): URL of the pyramid's tiles
+        colorscale (str): plotly colorscale name
+        row_range, column_range (list): visible range of the y and x axes
+        \nReturns:
+        list of plotly layout image dicts
+        """
+        # Cell i spans [i - 0.5, i + 0.5] on the axes
+        level, tiles = pyramid.visible_tiles([value + 0.5 for value in row_range], [value + 0.5 for value in column_range],
+                                             TiledHeatmapBuilder.PLOT_WIDTH, TiledHeatmapBuilder.PLOT_HEIGHT)
+        images = []
+        for tile_row, tile_column in tiles:
+            first_row, end_row, first_column, end_column = pyramid.tile_extent(level, tile_row, tile_column)
+            images.append(dict(
+                source=f"{tile_url}/{level}/{tile_row}/{tile_column}.png?colorscale={colorscale}",
+                xref='x', yref='y',
+                x=first_column - 0.5, y=end_row - 0.5,
+                sizex=end_column - first_column, sizey=end_row - first_row,
+                xanchor='left', yanchor='top',
+                sizing='stretch', layer='below'
+            ))
+        return images
+
+
+    @staticmethod
+    def viewport_from_relayout(relayout_data, tile_state):
+        """
+        Gets the viewport of a tiled heatmap after a zoom or pan.
+        \nArgs:
+        relayout_data (dict): relayoutData of the dcc.Graph
+        tile_state (dict): state of the tiled heatmap, holding its full and current axis ranges
+        \nReturns:
+        tuple (changed, row_range, column_range): changed is False when the event does not move the axes
+        """
+        ranges = {'y': tile_state['row_range'], 'x': tile_state['column_range']}
+        changed = False
+        for axis, full_range in (('y', tile_state['full_row_range']), ('x', tile_state['full_column_range'])):
+            if relayout_data.get(f'{axis}axis.autorange'):
+                ranges[axis] = full_range
+                changed = True
+            elif f'{axis}axis.range' in relayout_data:
+                ranges[axis] = list(relayout_data[f'{axis}axis.range'])
+                changed = True
+            elif f'{axis}axis.range[0]' in relayout_data:
+                ranges[axis] = [relayout_data[f'{axis}axis.range[0]'], relayout_data[f'{axis}axis.range[1]']]
+                changed = True
+        return changed, ranges['y'], ranges['x']
+
+
+    def describe(self):
+        """
+        Describes the tiled heatmap, so the viewport callback can fetch the tiles of a zoomed view.
+        \nReturns:
+        dict with the tile URL, the full axis ranges and the current (full) viewport
+        """
+        return {
+            'tile_url': self.__tile_url,
+            'full_row_range': self.__row_range,
+            'full_column_range': self.__column_range,
+            'row_range': self.__row_range,
+            'column_range': self.__column_range
+        }
+
+
+    def buildHeatmap(self, target_id):
+        """
+        Builds the tiled Heatmap and returns a dash component (dcc.Graph)
+        \nArgs:
+        target_id (str or dict): id of the to-be built graph
+        \nReturns:
+        A Dash Graph component containing the heatmap.
+        """
+        return dcc.Graph(id=target_id, figure=self.buildFigure())
+
+
+    def buildFigure(self):
+        """
+        Builds the tiled Heatmap figure in plotly.go.
+        An empty heatmap trace carries the colorbar, and an invisible line spanning every cell
+        lets autorange (double click) return to the whole heatmap, as layout images are not autoranged.
+        \nReturns:
+        A plotly Figure containing the heatmap.
+        """
+        _, _, colorbar = HeatmapBuilder.value_scale(self.__comparison, self.__mode)
+        zmin, zmax = self.__pyramid.value_range # The range the tiles were colored with
+        colorbar_trace = go.Heatmap(
+                z=[[None]],
+                colorscale=self.__colorscale,
+                colorbar=colorbar,
+                zmin=zmin,
+                zmax=zmax,
+                hoverinfo='skip'
+            )
+        extent_trace = go.Scatter(
+                x=self.__column_range,
+                y=self.__row_range,
+                mode='lines',
+                line=dict(width=0),
+                hoverinfo='skip',
+                showlegend=False
+            )
+        return go.Figure(data=[colorbar_trace, extent_trace], layout=self.layout)
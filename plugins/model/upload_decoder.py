@@ -0,0 +1,57 @@
+import binascii
+import os
+import tempfile
+
+
+class UploadDecoder:
+    """
+    Decodes the base64 data URL sent by dcc.Upload into a source DataLoader reads from.
+    Uploads are decoded block by block: small ones are kept in memory as a single bytes object,
+    large ones are written to a unique file instead of being held decoded, so concurrent uploads
+    never share a file, whatever their names.
+    """
+    DEFAULT_SPILL_BYTES = 256 * 2**20 # 256 MiB decoded
+    BLOCK_CHARS = 4 * 2**20 # Base64 characters decoded at a time, a multiple of 4
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def decode(contents, spill_bytes = DEFAULT_SPILL_BYTES, spill_directory = None):
+        """
+        Decodes an upload, in memory or into a file depending on its size.
+        \nArgs:
+        contents (str): dcc.Upload contents, 'data:<type>;base64,<payload>'
+        spill_bytes (int, optional): decoded size above which the upload is written to a file. None keeps every upload in memory.
+        spill_directory (str, optional): folder of the spilled files. Default is the system's temporary folder.
+        \nReturns:
+        bytes with the file content, or str path of the spilled file, to be removed by the caller
+        """
+        payload_start = contents.index(',') + 1
+        decoded_size = (len(contents) - payload_start) // 4 * 3
+        blocks = UploadDecoder._decode_blocks(contents, payload_start)
+
+        if spill_bytes is None or decoded_size <= spill_bytes:
+            return b''.join(blocks)
+
+        if spill_directory is not None:
+            os.makedirs(spill_directory, exist_ok=True)
+        file_descriptor, path = tempfile.mkstemp(prefix='davis_upload_', dir=spill_directory)
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                for block in blocks:
+                    file.write(block)
+        except BaseException:
+            os.remove(path)
+            raise
+        print(f"[{UploadDecoder.__name__}] [DECODE]: {decoded_size / 2**20:.1f} MiB upload spilled to {path}")
+        return path
+
+
+    @staticmethod
+    def _decode_blocks(contents, payload_start):
+        """
+        Yields the decoded payload in blocks, so only one block of the payload is copied at a time.
+        """
+        for block_start in range(payload_start, len(contents), UploadDecoder.BLOCK_CHARS):
+            yield binascii.a2b_base64(contents[block_start:block_start + UploadDecoder.BLOCK_CHARS])
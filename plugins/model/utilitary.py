@@ -1,5 +1,8 @@
+import mmap
 import re
 
+import numpy as np
+
 class Utilitary:
     def __init__(self):
         pass
@@ -10,4 +13,16 @@ class Utilitary:
         Extracts numeric parts of a string for natural sorting.
         Example: 'PROD10' -> ['PROD', 10]
         """
-        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', value)]
\ No newline at end of file
+        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', value)]
+
+
+    @staticmethod
+    def is_memory_mapped(array):
+        """
+        Checks whether an array, or the array it is a view of, reads its values from a memory-mapped file.
+        """
+        while array is not None:
+            if isinstance(array, (np.memmap, mmap.mmap)):
+                return True
+            array = getattr(array, 'base', None)
+        return False
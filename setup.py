@@ -1,7 +1,7 @@
 from setuptools import setup, find_packages
 
 setup(
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests', 'tests.*']),
     entry_points={
         "webviz_config_plugins": [
             "Heatmap = plugins.main:Heatmap"
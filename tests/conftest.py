@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+
+HEADER = "header1\nheader2\nheader3\n" # DataLoader.HEADER_LINES lines, ignored by the loader
+
+
+def nqds_lines(iterations = (1, 2, 3), models = 12, attributes = ('QO', 'QW', 'BHP'), wells = ('PROD1', 'PROD2', 'PROD10', 'INJ1'),
+               missing = 0.1, seed = 0):
+    """
+    Builds the data lines of an NQDS file, laid out as DA output files: iteration, model, attribute then well order.
+    \nArgs:
+    missing (float): fraction of the lines left out, as combinations absent from real files
+    seed (int): seed of the values and of the missing lines
+    \nReturns:
+    list of lines, with their newline
+    """
+    rng = np.random.default_rng(seed)
+    lines = []
+    for iteration in iterations:
+        for model in range(1, models + 1):
+            for attribute in attributes:
+                for well in wells:
+                    if rng.random() >= missing:
+                        lines.append(f"{iteration};MOD_{model:03d};NQDS {attribute} - {well};{rng.normal(0, 2):.4f}\n")
+    return lines
+
+
+@pytest.fixture
+def write_data_file(tmp_path):
+    """
+    Writes an NQDS file with its header, from given lines or from nqds_lines arguments, and returns its path.
+    """
+    def write(name = 'data.txt', lines = None, **kwargs):
+        path = tmp_path / name
+        path.write_text(HEADER + ''.join(nqds_lines(**kwargs) if lines is None else lines))
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def make_lines():
+    """
+    Gives nqds_lines to tests laying lines out themselves (e.g. interleaved iterations, appended lines).
+    """
+    return nqds_lines
@@ -0,0 +1,91 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from plugins.model.data_loader import DataLoader
+
+
+def reference_frame(path, maxmodels = None):
+    """
+    Parses a data file line by line, stopping at the first model above maxmodels, as DataLoader did before
+    it read files column-wise and in chunks.
+    """
+    rows = []
+    with open(path, encoding='utf-8') as file:
+        for line in file.readlines()[DataLoader.HEADER_LINES:]:
+            fields = line.split(';')
+            nqds_field = fields[2].split()
+            row = {'Iteration': int(fields[0]), 'Models': int(fields[1][4:]), 'Attributes': nqds_field[1],
+                   'Wells': nqds_field[3], 'NQDS_Value': float(fields[3])}
+            if maxmodels and row['Models'] > maxmodels:
+                break
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def plain_frame(data):
+    """
+    Converts loaded data (categorical and narrowed columns) to the reference's dtypes.
+    """
+    return pd.DataFrame({
+        'Iteration': data['Iteration'].astype('int64').to_numpy(),
+        'Models': data['Models'].astype('int64').to_numpy(),
+        'Attributes': data['Attributes'].astype(str).to_numpy(),
+        'Wells': data['Wells'].astype(str).to_numpy(),
+        'NQDS_Value': data['NQDS_Value'].astype('float64').to_numpy()
+    })
+
+
+def assert_same_rows(data, reference):
+    pd.testing.assert_frame_equal(plain_frame(data), reference, check_exact=False, rtol=1e-6)
+
+
+@pytest.mark.parametrize('chunksize', [None, 7, 1000])
+@pytest.mark.parametrize('maxmodels', [None, 5])
+def test_chunked_parsing_matches_line_parsing(write_data_file, chunksize, maxmodels):
+    path = write_data_file()
+    data_loader = DataLoader()
+    data_loader.get_data_from_file(path, maxmodels=maxmodels, chunksize=chunksize)
+
+    reference = reference_frame(path, maxmodels)
+    assert_same_rows(data_loader.get_data(), reference)
+    assert data_loader.get_iteration_count() == list(reference['Iteration'].unique())
+    for iteration, rows in reference.groupby('Iteration'):
+        assert_same_rows(data_loader.get_iteration(iteration), rows.reset_index(drop=True))
+
+
+def test_maxmodels_stops_at_first_model_above_it(write_data_file):
+    path = write_data_file(iterations=(1, 2), models=8)
+    data_loader = DataLoader()
+    data_loader.get_data_from_file(path, maxmodels=3, chunksize=5)
+
+    assert data_loader.get_data()['Models'].max() == 3
+    assert data_loader.get_iteration_count() == [1] # Iteration 2 starts after the first model above the limit
+
+
+def test_content_in_memory_and_compressed_file_match_path(write_data_file, tmp_path):
+    path = write_data_file()
+    with open(path, 'rb') as file:
+        content = file.read()
+    compressed_path = tmp_path / 'data.txt.gz'
+    compressed_path.write_bytes(gzip.compress(content))
+    reference = reference_frame(path)
+
+    for source in (content, str(compressed_path)):
+        data_loader = DataLoader()
+        data_loader.get_data_from_file(source, chunksize=50)
+        assert_same_rows(data_loader.get_data(), reference)
+
+
+def test_progress_reaches_total_bytes(write_data_file):
+    path = write_data_file()
+    progress = []
+    data_loader = DataLoader()
+    data_loader.get_data_from_file(path, chunksize=40, progress_callback=lambda *report: progress.append(report))
+
+    assert len(progress) > 1
+    assert progress[-1][0] == progress[-1][1]
+    assert progress[-1][2] == len(data_loader.get_data())
+    assert [report[2] for report in progress] == sorted(report[2] for report in progress)
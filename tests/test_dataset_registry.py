@@ -0,0 +1,81 @@
+import pytest
+
+from plugins.controller.controller_settings import ControllerSettings
+from plugins.controller.data_controller import DataController
+from plugins.controller.dataset_registry import DatasetRegistry
+from plugins.controller.snapshot_loader import SnapshotLoader
+
+
+def build_registry(settings, max_bytes):
+    snapshot_loader = SnapshotLoader(settings)
+    return DatasetRegistry(lambda dataset_id: DataController(settings, snapshot_loader), max_bytes, snapshot_loader.shared_store)
+
+
+def register_file(registry, path):
+    dataset_id, controller = registry.create()
+    controller.load_uploaded_data(path)
+    registry.register(dataset_id, controller)
+    return dataset_id, controller
+
+
+@pytest.fixture
+def data_files(write_data_file):
+    return [write_data_file(f'data{seed}.txt', seed=seed) for seed in range(3)]
+
+
+def dataset_bytes(path):
+    controller = DataController(ControllerSettings(cache_directory=None))
+    controller.load_uploaded_data(path)
+    return controller.get_memory_usage()
+
+
+def test_evicts_least_recently_used_datasets_above_budget(data_files):
+    registry = build_registry(ControllerSettings(cache_directory=None), int(dataset_bytes(data_files[0]) * 2.5))
+    first_id, _ = register_file(registry, data_files[0])
+    second_id, _ = register_file(registry, data_files[1])
+    assert registry.get(first_id) is not None # The second dataset becomes the least recently used
+    third_id, _ = register_file(registry, data_files[2])
+
+    assert len(registry) == 2
+    assert registry.get(second_id) is None # Not in any cache, cannot be restored
+    assert registry.get(first_id) is not None and registry.get(third_id) is not None
+    assert registry.get_memory_usage() <= registry.max_bytes
+
+
+def test_registered_dataset_is_kept_over_budget(data_files):
+    registry = build_registry(ControllerSettings(cache_directory=None), 1)
+    register_file(registry, data_files[0])
+    dataset_id, controller = register_file(registry, data_files[1])
+
+    assert len(registry) == 1
+    assert registry.get(dataset_id) is controller
+
+
+def test_evicted_dataset_is_restored_from_dataset_cache(data_files, tmp_path):
+    registry = build_registry(ControllerSettings(cache_directory=str(tmp_path / 'cache')), 1)
+    first_id, first = register_file(registry, data_files[0])
+    rows = len(first.data_loader.get_data())
+    register_file(registry, data_files[1])
+
+    assert registry.get(first_id, restore=False) is None
+    restored = registry.get(first_id)
+    assert restored is not None and restored is not first
+    assert len(restored.data_loader.get_data()) == rows
+
+
+def test_memory_mapped_data_is_not_counted_in_budget(data_files, tmp_path):
+    registry = build_registry(ControllerSettings(cache_directory=None, memmap_directory=str(tmp_path / 'memmap')),
+                              dataset_bytes(data_files[0]) // 2)
+    dataset_ids = [register_file(registry, path)[0] for path in data_files]
+
+    assert all(registry.get(dataset_id, restore=False) is not None for dataset_id in dataset_ids)
+    assert registry.get_mapped_memory_usage() > registry.get_memory_usage()
+
+
+def test_remove_clears_dataset(data_files):
+    registry = build_registry(ControllerSettings(cache_directory=None), 2**30)
+    dataset_id, controller = register_file(registry, data_files[0])
+    registry.remove(dataset_id)
+
+    assert registry.get(dataset_id) is None
+    assert controller.snapshot is None
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from plugins.controller.followed_file import FollowedFile
+from plugins.model.file_follower import FileFollower
+from plugins.model.heatmap_exception import HeatmapException
+from tests.conftest import HEADER
+
+
+def append(path, content):
+    with open(path, 'ab') as file:
+        file.write(content)
+
+
+def test_reads_only_complete_lines(tmp_path):
+    path = tmp_path / 'run.txt'
+    path.write_bytes(b'header\n1;MOD_001;NQDS QO - PROD1;0.5\n1;MOD_001;NQDS')
+    follower = FileFollower(str(path))
+
+    assert follower.read_appended() == b'header\n1;MOD_001;NQDS QO - PROD1;0.5\n'
+    assert follower.read_appended() == b'' # The last line is still being written
+    append(path, b' QO - PROD2;1.5')
+    assert follower.read_appended() == b''
+    append(path, b'\n1;MOD_002;')
+    assert follower.read_appended() == b'1;MOD_001;NQDS QO - PROD2;1.5\n'
+    assert follower.offset == path.stat().st_size - len(b'1;MOD_002;')
+
+
+def test_truncated_file_is_read_again(tmp_path):
+    path = tmp_path / 'run.txt'
+    path.write_bytes(b'line 1\nline 2\n')
+    follower = FileFollower(str(path))
+    follower.read_appended()
+
+    path.write_bytes(b'line\n') # Truncated in place: same file, smaller than the bytes read
+    assert follower.read_appended() is None
+
+
+def test_replaced_file_is_read_again(tmp_path):
+    path = tmp_path / 'run.txt'
+    path.write_bytes(b'line 1\n')
+    follower = FileFollower(str(path))
+    follower.read_appended()
+
+    replacement = tmp_path / 'new.txt'
+    replacement.write_bytes(b'line 1\nline 2\n')
+    os.replace(replacement, path)
+    assert follower.read_appended() is None
+
+
+def test_followed_paths_must_be_inside_follow_directory(tmp_path):
+    directory = tmp_path / 'runs'
+    directory.mkdir()
+    (directory / 'run.txt').write_bytes(b'')
+    (tmp_path / 'secret.txt').write_bytes(b'')
+    os.symlink(tmp_path / 'secret.txt', directory / 'link.txt')
+
+    assert FollowedFile.resolve('run.txt', str(directory)) == os.path.realpath(directory / 'run.txt')
+    assert FollowedFile.resolve(str(directory / 'run.txt'), str(directory)) == os.path.realpath(directory / 'run.txt')
+    for path in ('../secret.txt', str(tmp_path / 'secret.txt'), 'link.txt', '.', 'missing.txt'):
+        with pytest.raises(HeatmapException):
+            FollowedFile.resolve(path, str(directory))
+
+
+def test_truncated_followed_file_reports_its_iterations(make_lines, write_data_file):
+    path = write_data_file(iterations=(1, 2, 3))
+    followed_file = FollowedFile(path)
+    snapshot = followed_file.load()
+
+    with open(path, 'w') as file:
+        file.write(HEADER + ''.join(make_lines(iterations=(4, 5))))
+    reloaded, iterations, was_reloaded = followed_file.refresh(snapshot)
+
+    assert was_reloaded
+    assert iterations == [4, 5]
+    assert reloaded.data_loader.get_iteration_numbers() == [4, 5]
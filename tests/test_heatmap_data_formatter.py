@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from plugins.model.data_loader import DataLoader
+from plugins.model.heatmap_data_formatter import HeatmapComparison, HeatmapDataFormatter, HeatmapDataMode
+
+
+AXIS_PAIRS = [('Wells', 'Models'), ('Attributes', 'Models'), ('Wells', 'Attributes'), ('Models', 'Wells')]
+
+
+class FrameOnlyLoader:
+    """
+    Loader without a cube, so HeatmapDataFormatter takes its groupby path.
+    """
+    def __init__(self, data_loader):
+        self.__data_loader = data_loader
+
+    def get_cube(self):
+        return None
+
+    def get_iterations(self, iterations):
+        return self.__data_loader.get_iterations(iterations)
+
+
+@pytest.fixture
+def data_loader(write_data_file):
+    data_loader = DataLoader()
+    data_loader.get_data_from_file(write_data_file(missing=0.2))
+    assert data_loader.get_cube() is not None
+    return data_loader
+
+
+def comparable(matrix):
+    """
+    Sorts a matrix by its labels, as plain values, so cube and groupby matrices line up.
+    """
+    matrix = matrix.copy()
+    matrix.index = matrix.index.astype(str)
+    matrix.columns = matrix.columns.astype(str)
+    return matrix.sort_index().sort_index(axis=1).astype('float64')
+
+
+@pytest.mark.parametrize('index, columns', AXIS_PAIRS)
+def test_cube_statistics_match_groupby_for_every_mode(data_loader, index, columns):
+    modes = list(HeatmapDataMode)
+    iterations = [1, 3] # Not consecutive, read with a fancy index of the cube
+    from_cube = HeatmapDataFormatter.format_statistics(data_loader, iterations, index, columns, modes)
+    from_groupby = HeatmapDataFormatter.format_statistics(FrameOnlyLoader(data_loader), iterations, index, columns, modes)
+
+    for iteration in iterations:
+        for mode in modes:
+            pd.testing.assert_frame_equal(comparable(from_cube[iteration][mode]), comparable(from_groupby[iteration][mode]),
+                                          check_exact=False, rtol=1e-5, atol=1e-6, check_names=False, obj=f"{mode.name} {index} x {columns}")
+
+
+def test_consecutive_iterations_match_single_iterations(data_loader):
+    both = HeatmapDataFormatter.format_iterations(data_loader, [1, 2], 'Wells', 'Models', HeatmapDataMode.P90)
+    for iteration in (1, 2):
+        single = HeatmapDataFormatter.format_iteration(data_loader, iteration, 'Wells', 'Models', HeatmapDataMode.P90)
+        pd.testing.assert_frame_equal(both[iteration], single)
+
+
+def test_cells_without_values_are_nan(write_data_file):
+    data_loader = DataLoader()
+    data_loader.get_data_from_file(write_data_file(missing=0.6, attributes=('QO',)))
+    matrix = HeatmapDataFormatter.format_iteration(data_loader, 1, 'Wells', 'Models', HeatmapDataMode.COUNT)
+    counts = data_loader.get_iteration(1).groupby(['Wells', 'Models'], observed=True).size()
+
+    assert matrix.notna().sum().sum() == len(counts) # COUNT has no zeros: absent cells are NaN
+    assert (matrix.stack().dropna() == 1).all()
+
+
+def test_compare_iterations():
+    previous = pd.DataFrame([[1.0, 2.0]], index=['PROD1'], columns=[1, 2])
+    current = pd.DataFrame([[0.5, 4.0]], index=['PROD1'], columns=[1, 3]) # Model 2 missing, model 3 new
+
+    delta, = HeatmapDataFormatter.compare_iterations([previous, current], HeatmapComparison.DELTA)
+    ratio, = HeatmapDataFormatter.compare_iterations([previous, current], HeatmapComparison.RATIO)
+    assert list(delta.columns) == [1, 2, 3]
+    np.testing.assert_allclose(delta.to_numpy(), [[-0.5, np.nan, np.nan]])
+    np.testing.assert_allclose(ratio.to_numpy(), [[0.5, np.nan, np.nan]])
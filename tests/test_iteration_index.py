@@ -0,0 +1,134 @@
+import io
+
+import pytest
+
+from plugins.controller.controller_settings import ControllerSettings
+from plugins.controller.snapshot_loader import SnapshotLoader
+from plugins.model.dataset_cache import DatasetCache
+from plugins.model.data_loader import DataLoader
+from plugins.model.iteration_index import IterationIndex
+from tests.conftest import HEADER
+
+
+def build_index(content):
+    file = io.BytesIO(content)
+    for _ in range(DataLoader.HEADER_LINES):
+        file.readline()
+    return IterationIndex.build(file, file.tell(), len(content))
+
+
+def line_blocks(content):
+    """
+    Reference blocks, from a plain scan of the lines.
+    """
+    blocks = []
+    offset = len(HEADER)
+    for line in content[offset:].splitlines(keepends=True):
+        if line.strip():
+            iteration = int(line.split(b';')[0])
+            if not blocks or blocks[-1][0] != iteration:
+                blocks.append([iteration, offset])
+        offset += len(line)
+    ends = [start for _, start in blocks[1:]] + [len(content)]
+    return [(iteration, start, end) for (iteration, start), end in zip(blocks, ends)]
+
+
+@pytest.fixture(params=[64, IterationIndex.SCAN_BYTES])
+def scan_bytes(request, monkeypatch):
+    monkeypatch.setattr(IterationIndex, 'SCAN_BYTES', request.param) # Small scans split lines across reads
+    return request.param
+
+
+def test_contiguous_file(make_lines, scan_bytes):
+    content = (HEADER + ''.join(make_lines(iterations=(1, 2, 10)))).encode()
+    index = build_index(content)
+
+    assert index.blocks == line_blocks(content)
+    assert index.iterations() == [1, 2, 10]
+    assert index.is_contiguous()
+
+
+def test_interleaved_file(make_lines, scan_bytes):
+    lines = make_lines(iterations=(1, 2))
+    one = [line for line in lines if line.startswith('1;')]
+    two = [line for line in lines if line.startswith('2;')]
+    content = (HEADER + ''.join(one[:10] + two + one[10:])).encode() # First and last lines of the same iteration
+    index = build_index(content)
+
+    assert index.blocks == line_blocks(content)
+    assert index.iterations() == [1, 2]
+    assert index.ranges(1) == [(start, end) for iteration, start, end in index.blocks if iteration == 1]
+    assert not index.is_contiguous()
+
+
+@pytest.mark.parametrize('ending', ['\r\n', '\n\n', ''])
+def test_line_endings_and_blank_lines(make_lines, scan_bytes, ending):
+    lines = [line.rstrip('\n') + ending for line in make_lines(iterations=(1, 2), models=3)]
+    lines[-1] = lines[-1].rstrip() # No newline at the end of the file
+    content = (HEADER + ''.join(lines)).encode()
+
+    assert build_index(content).blocks == line_blocks(content)
+
+
+@pytest.mark.parametrize('line', ['x;MOD_001;NQDS QO - PROD1;1.0\n', ';MOD_001;NQDS QO - PROD1;1.0\n', '12\n'])
+def test_line_without_iteration_is_rejected(line):
+    with pytest.raises(ValueError):
+        build_index((HEADER + '1;MOD_001;NQDS QO - PROD1;1.0\n' + line).encode())
+
+
+def test_file_without_data_lines():
+    assert build_index((HEADER + '\n\n').encode()) is None
+
+
+def test_interleaved_file_is_loaded_in_full(make_lines, write_data_file):
+    lines = make_lines(iterations=(1, 2))
+    one = [line for line in lines if line.startswith('1;')]
+    two = [line for line in lines if line.startswith('2;')] + ['2;MOD_099;NQDS QO - NEW1;1.0\n']
+    path = write_data_file(lines=one[:10] + two + one[10:])
+    snapshot = SnapshotLoader(ControllerSettings(cache_directory=None, lazy_loading=True)).load(path)
+
+    data_loader = snapshot.data_loader
+    assert not data_loader.is_indexed()
+    assert len(data_loader.get_iteration(1)) == len(one)
+    wells, models, _ = data_loader.get_indexes()
+    assert 'NEW1' in wells and 99 in models # Filters come from every iteration, not from the first one
+
+
+def test_contiguous_file_is_parsed_lazily(write_data_file):
+    path = write_data_file(iterations=(1, 2, 3))
+    data_loader = DataLoader()
+    assert data_loader.index_file(path)
+
+    eager = DataLoader()
+    eager.get_data_from_file(path)
+    assert data_loader.get_iteration_count() == [1, 2, 3]
+    for iteration in (3, 1):
+        assert data_loader.get_iteration(iteration)['NQDS_Value'].tolist() == eager.get_iteration(iteration)['NQDS_Value'].tolist()
+
+
+def test_indexed_files_are_not_hashed(make_lines, write_data_file, tmp_path, monkeypatch):
+    hashed = []
+    file_key = DatasetCache.file_key
+    monkeypatch.setattr(DatasetCache, 'file_key', staticmethod(lambda source: hashed.append(source) or file_key(source)))
+    snapshot_loader = SnapshotLoader(ControllerSettings(cache_directory=str(tmp_path / 'cache'), lazy_loading=True))
+
+    contiguous = write_data_file('contiguous.txt')
+    assert snapshot_loader.load(contiguous).data_loader.is_indexed()
+    assert hashed == [] # Hashing would read the whole file before the first heatmap
+
+    lines = make_lines(iterations=(1, 2))
+    interleaved = write_data_file('interleaved.txt', lines=lines[:10] + lines[-10:] + lines[10:-10])
+    snapshot = snapshot_loader.load(interleaved)
+    assert hashed == [interleaved] # Loaded in full, then cached by content
+    assert snapshot.cache_key is not None
+
+
+def test_file_shrinking_while_indexed_is_rejected(make_lines, monkeypatch):
+    monkeypatch.setattr(IterationIndex, 'SCAN_BYTES', 64)
+    content = (HEADER + ''.join(make_lines(iterations=(1, 2)))).encode()
+    file = io.BytesIO(content[:len(content) // 2].rstrip(b'\n')) # No newline left to complete the last line
+    for _ in range(DataLoader.HEADER_LINES):
+        file.readline()
+
+    with pytest.raises(ValueError):
+        IterationIndex.build(file, file.tell(), len(content))
@@ -0,0 +1,61 @@
+from plugins.model.lru_cache import LRUCache
+
+
+def sized_cache(max_bytes):
+    return LRUCache(max_bytes, len) # Values are strings, sized by their length
+
+
+def test_evicts_least_recently_used_above_budget():
+    cache = sized_cache(10)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'xxxx')
+    assert cache.get('a') == 'xxxx' # b becomes the least recently used
+    cache.put('c', 'xxxx')
+
+    assert cache.keys() == ['a', 'c']
+    assert cache.get('b') is None
+    assert cache.get_memory_usage() == 8
+
+
+def test_evicts_as_many_entries_as_needed():
+    cache = sized_cache(10)
+    for key in 'abcde':
+        cache.put(key, 'xx')
+    cache.put('f', 'xxxxxxxx')
+
+    assert cache.keys() == ['e', 'f']
+    assert cache.get_memory_usage() == 10
+
+
+def test_replacing_a_key_updates_its_size():
+    cache = sized_cache(10)
+    cache.put('a', 'xxxxxx')
+    cache.put('a', 'xx')
+    cache.put('b', 'xxxxxxxx')
+
+    assert cache.keys() == ['a', 'b']
+    assert cache.get_memory_usage() == 10
+
+
+def test_value_larger_than_budget_is_not_cached():
+    cache = sized_cache(10)
+    cache.put('a', 'xxxx')
+    cache.put('a', 'x' * 11)
+
+    assert len(cache) == 0 # The previous value of the key is dropped too
+    assert cache.get_memory_usage() == 0
+
+
+def test_pop_clear_and_counters():
+    cache = sized_cache(10)
+    cache.put('a', 'xxx')
+    cache.put('b', 'xxx')
+    assert cache.pop('a') == 'xxx'
+    assert cache.pop('a') is None
+    assert cache.get_memory_usage() == 3
+
+    cache.get('b')
+    cache.get('a')
+    cache.clear()
+    assert len(cache) == 0 and cache.get_memory_usage() == 0
+    assert (cache.hits, cache.misses) == (1, 1) # Kept by clear
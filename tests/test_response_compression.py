@@ -0,0 +1,38 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from plugins.controller.response_compression import ResponseCompression
+
+
+def callback_client(compress, body):
+    server = Flask(__name__)
+    server.add_url_rule('/_dash-update-component', 'callback', lambda: (body, 200, {'Content-Type': 'application/json'}),
+                        methods=['POST'])
+    ResponseCompression.init_app(server, compress=compress)
+    return server.test_client()
+
+
+def logged_sizes(capsys):
+    return [line for line in capsys.readouterr().out.splitlines() if '[PAYLOAD_SIZE]' in line]
+
+
+def test_compressed_responses_log_both_sizes(capsys):
+    body = '{"z": "' + 'A' * 5000 + '"}'
+    response = callback_client(True, body).post('/_dash-update-component', headers={'Accept-Encoding': 'gzip'})
+
+    assert gzip.decompress(response.data).decode() == body
+    assert logged_sizes(capsys) == [f"[ResponseCompression] [PAYLOAD_SIZE]: Callback response {len(body)} bytes, {len(response.data)} gzipped"]
+
+
+@pytest.mark.parametrize('compress, body, accept_encoding', [
+    (False, '{"z": "' + 'A' * 5000 + '"}', 'gzip'), # Compression disabled
+    (True, '{"z": "A"}', 'gzip'), # Under MIN_BYTES
+    (True, '{"z": "' + 'A' * 5000 + '"}', 'identity') # Client without gzip
+])
+def test_uncompressed_responses_log_their_size(capsys, compress, body, accept_encoding):
+    response = callback_client(compress, body).post('/_dash-update-component', headers={'Accept-Encoding': accept_encoding})
+
+    assert response.data.decode() == body
+    assert logged_sizes(capsys) == [f"[ResponseCompression] [PAYLOAD_SIZE]: Callback response {len(body)} bytes"]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from plugins.model.data_loader import DataLoader
+from plugins.model.heatmap_aggregates import HeatmapAggregates
+from plugins.model.heatmap_data_formatter import HeatmapDataFormatter
+from plugins.model.running_aggregates import RunningAggregates
+
+
+def parse(lines):
+    return DataLoader.parse_data_lines(''.join(lines).encode())
+
+
+def comparable(matrix):
+    matrix = matrix.copy()
+    matrix.index = matrix.index.astype(str)
+    matrix.columns = matrix.columns.astype(str)
+    return matrix.sort_index().sort_index(axis=1).astype('float64')
+
+
+def assert_same_statistics(aggregates, reference, iterations):
+    for iteration in iterations:
+        for index, columns in HeatmapAggregates.AXIS_PAIRS:
+            statistics = aggregates.statistics(iteration, index, columns)
+            expected = reference.statistics(iteration, index, columns)
+            assert statistics.keys() == expected.keys()
+            for mode in statistics:
+                pd.testing.assert_frame_equal(comparable(statistics[mode]), comparable(expected[mode]), check_exact=False, rtol=1e-5,
+                                              check_names=False, obj=f"{mode.name} {index} x {columns}")
+
+
+@pytest.mark.parametrize('parts', [2, 5])
+def test_merged_statistics_match_full_recompute(make_lines, parts):
+    lines = make_lines(missing=0.2, seed=3)
+    rng = np.random.default_rng(parts)
+    cuts = sorted(rng.choice(np.arange(1, len(lines)), size=parts - 1, replace=False)) # Appends end anywhere, mid-iteration included
+    chunks = np.split(np.array(lines, dtype=object), cuts)
+
+    aggregates = RunningAggregates.build(parse(chunks[0]))
+    for chunk in chunks[1:]:
+        aggregates, updated = aggregates.update(parse(chunk))
+        assert updated == sorted(parse(chunk)['Iteration'].unique())
+
+    assert_same_statistics(aggregates, RunningAggregates.build(parse(lines)), [1, 2, 3])
+
+
+def test_statistics_match_heatmap_data_formatter(make_lines):
+    data = parse(make_lines(missing=0.2, seed=4))
+    aggregates = RunningAggregates.build(data)
+
+    for index, columns in HeatmapAggregates.AXIS_PAIRS:
+        expected = HeatmapDataFormatter.aggregate(data[data['Iteration'] == 2], [index, columns], RunningAggregates.MODES)
+        statistics = aggregates.statistics(2, index, columns)
+        for mode in RunningAggregates.MODES:
+            pd.testing.assert_frame_equal(comparable(statistics[mode]), comparable(expected[mode].unstack(columns)), check_exact=False,
+                                          rtol=1e-5, atol=1e-6, check_names=False, obj=f"{mode.name} {index} x {columns}")
+
+
+def test_update_leaves_previous_statistics_unchanged(make_lines):
+    lines = make_lines(iterations=(1,), seed=5)
+    half = len(lines) // 2
+    aggregates = RunningAggregates.build(parse(lines[:half]))
+    before = aggregates.statistics(1, 'Wells', 'Models')
+    updated, _ = aggregates.update(parse(lines[half:]))
+
+    after = aggregates.statistics(1, 'Wells', 'Models')
+    for mode in before:
+        pd.testing.assert_frame_equal(before[mode], after[mode])
+    assert updated.statistics(1, 'Wells', 'Models') != {}
+    assert aggregates.statistics(2, 'Wells', 'Models') == {}
@@ -0,0 +1,90 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from plugins.controller.controller_settings import ControllerSettings
+from plugins.controller.snapshot_loader import SnapshotLoader
+from plugins.model.data_loader import DataLoader
+from plugins.model.shared_dataset_store import SharedDatasetStore
+from plugins.model.utilitary import Utilitary
+
+
+@pytest.fixture
+def loaded(write_data_file):
+    data_loader = DataLoader()
+    data_loader.get_data_from_file(write_data_file())
+    assert data_loader.get_cube() is not None
+    return data_loader
+
+
+def test_published_dataset_is_attached_by_other_stores(loaded, tmp_path):
+    publisher = SharedDatasetStore(DataLoader.PARSER_VERSION, str(tmp_path), 2**30)
+    assert publisher.attach('key') is None
+    publisher.publish('key', loaded.get_data(), loaded.get_cube())
+
+    data, cube = SharedDatasetStore(DataLoader.PARSER_VERSION, str(tmp_path), 2**30).attach('key') # Another worker
+    assert data.equals(loaded.get_data())
+    assert cube.labels == loaded.get_cube().labels
+    np.testing.assert_array_equal(cube.values, loaded.get_cube().values)
+    assert Utilitary.is_memory_mapped(cube.values)
+    assert all(Utilitary.is_memory_mapped(data[column].array.codes) for column in ('Attributes', 'Wells'))
+    assert Utilitary.is_memory_mapped(data['NQDS_Value'].to_numpy())
+
+
+def test_publishing_twice_keeps_the_first_dataset(loaded, write_data_file, tmp_path):
+    store = SharedDatasetStore(DataLoader.PARSER_VERSION, str(tmp_path), 2**30)
+    store.publish('key', loaded.get_data())
+    other = DataLoader()
+    other.get_data_from_file(write_data_file('other.txt', seed=1))
+    data, cube = store.publish('key', other.get_data())
+
+    assert data.equals(loaded.get_data())
+    assert cube is None
+
+
+def test_other_parser_versions_are_ignored(loaded, tmp_path):
+    SharedDatasetStore(DataLoader.PARSER_VERSION, str(tmp_path), 2**30).publish('key', loaded.get_data())
+    store = SharedDatasetStore(DataLoader.PARSER_VERSION + 1, str(tmp_path), 2**30)
+
+    assert not store.contains('key')
+    assert store.attach('key') is None
+
+
+def test_dataset_ids_are_shared(tmp_path):
+    SharedDatasetStore(DataLoader.PARSER_VERSION, str(tmp_path), 2**30).register_dataset('dataset-1', 'key')
+    store = SharedDatasetStore(DataLoader.PARSER_VERSION, str(tmp_path), 2**30)
+
+    assert store.dataset_key('dataset-1') == 'key'
+    assert store.dataset_key('dataset-2') is None
+
+
+def test_least_recently_attached_datasets_are_evicted(loaded, tmp_path):
+    store = SharedDatasetStore(DataLoader.PARSER_VERSION, str(tmp_path), 2**30)
+    store.publish('first', loaded.get_data())
+    entry_bytes = sum(entry.stat().st_size for entry in os.scandir(store._entry_path('first')))
+    store = SharedDatasetStore(DataLoader.PARSER_VERSION, str(tmp_path), int(entry_bytes * 2.5))
+    store.publish('second', loaded.get_data())
+    time.sleep(0.01) # Distinct access times
+    data, _ = store.attach('first') # The second dataset becomes the least recently attached
+    store.publish('third', loaded.get_data())
+
+    assert store.contains('first') and store.contains('third')
+    assert not store.contains('second')
+    assert data.equals(loaded.get_data()) # Still readable once its files are removed
+
+
+def test_snapshot_loaders_attach_instead_of_parsing(write_data_file, tmp_path, monkeypatch):
+    path = write_data_file()
+    settings = ControllerSettings(cache_directory=None, shared_directory=str(tmp_path))
+    first = SnapshotLoader(settings).load(path)
+
+    def parse(*args, **kwargs):
+        raise AssertionError("Shared dataset parsed again")
+    monkeypatch.setattr(DataLoader, 'get_data_from_file', parse)
+    second = SnapshotLoader(settings).load(path) # Another worker
+
+    assert second.data_loader.get_data().equals(first.data_loader.get_data())
+    assert second.data_loader.get_mapped_memory_usage() > 0
+    assert second.cache_key == first.cache_key
@@ -0,0 +1,87 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from plugins.model.heatmap_data_formatter import HeatmapDataMode
+from plugins.model.tile_pyramid import TilePyramid
+
+
+def decode_png(png):
+    """
+    Decodes the 8-bit RGBA, unfiltered PNG images written by TilePyramid.encode_png, checking every chunk.
+    """
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    position, chunks = 8, {}
+    while position < len(png):
+        length, = struct.unpack('>I', png[position:position + 4])
+        chunk_type = png[position + 4:position + 8]
+        chunk_data = png[position + 8:position + 8 + length]
+        crc, = struct.unpack('>I', png[position + 8 + length:position + 12 + length])
+        assert crc == zlib.crc32(chunk_type + chunk_data) & 0xFFFFFFFF
+        chunks.setdefault(chunk_type, b'')
+        chunks[chunk_type] += chunk_data
+        position += 12 + length
+
+    width, height, bit_depth, color_type, _, _, _ = struct.unpack('>IIBBBBB', chunks[b'IHDR'])
+    assert (bit_depth, color_type) == (8, 6) and b'IEND' in chunks
+    scanlines = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype='uint8').reshape(height, width * 4 + 1)
+    assert not scanlines[:, 0].any() # Filter type 0 on every scanline
+    return scanlines[:, 1:].reshape(height, width, 4)
+
+
+@pytest.fixture
+def matrix():
+    values = np.random.default_rng(0).uniform(0, 10, (600, 300)).astype('float32')
+    values[::7, ::5] = np.nan
+    values[:2, :2] = np.nan # One fully empty block at every level
+    return values
+
+
+def test_encoded_png_round_trips():
+    pixels = np.random.default_rng(1).integers(0, 256, (5, 3, 4), dtype='uint8')
+
+    np.testing.assert_array_equal(decode_png(TilePyramid.encode_png(pixels)), pixels)
+
+
+def test_tiles_round_trip_to_the_colorscale(matrix):
+    pyramid = TilePyramid(matrix, HeatmapDataMode.AVG, 0, 10)
+    size, scale = TilePyramid.TILE_SIZE, TilePyramid.PIXELS_PER_CELL
+    lut = TilePyramid.colorscale_lut('Viridis')
+
+    for tile_row, tile_column in [(0, 0), (2, 1)]: # Full and partial tiles
+        image = decode_png(pyramid.render_tile(0, tile_row, tile_column, 'Viridis'))
+        values = matrix[tile_row * size:(tile_row + 1) * size, tile_column * size:(tile_column + 1) * size]
+        assert image.shape == (values.shape[0] * scale, values.shape[1] * scale, 4)
+
+        cells = image[::-1][::scale, ::scale] # Heatmap rows grow upwards
+        empty = np.isnan(values)
+        assert not cells[empty, 3].any()
+        expected = lut[np.clip(np.nan_to_num(values / 10 * 255), 0, 255).astype('uint8')]
+        np.testing.assert_array_equal(cells[~empty], expected[~empty])
+
+
+@pytest.mark.filterwarnings('ignore:All-NaN slice', 'ignore:Mean of empty slice')
+@pytest.mark.parametrize('mode, reduce', [(HeatmapDataMode.AVG, np.nanmean), (HeatmapDataMode.MAX, np.nanmax),
+                                          (HeatmapDataMode.MIN, np.nanmin)])
+def test_levels_aggregate_blocks_of_the_previous_level(matrix, mode, reduce):
+    pyramid = TilePyramid(matrix, mode, 0, 10)
+    assert pyramid.level_count() > 2
+    assert max(pyramid.levels[-1].shape) <= TilePyramid.TILE_SIZE
+
+    for previous, level in zip(pyramid.levels, pyramid.levels[1:]):
+        expected = np.full(level.shape, np.nan, dtype='float32')
+        for row in range(expected.shape[0]):
+            for column in range(expected.shape[1]):
+                expected[row, column] = reduce(previous[row * 2:row * 2 + 2, column * 2:column * 2 + 2])
+        np.testing.assert_allclose(level, expected, rtol=1e-6)
+
+
+def test_out_of_range_tiles_are_rejected(matrix):
+    pyramid = TilePyramid(matrix, HeatmapDataMode.AVG, 0, 10)
+
+    with pytest.raises(IndexError):
+        pyramid.render_tile(pyramid.level_count(), 0, 0, 'Viridis')
+    with pytest.raises(IndexError):
+        pyramid.render_tile(0, *pyramid.tile_count(0), 'Viridis')
@@ -0,0 +1,72 @@
+import base64
+import binascii
+import gzip
+import os
+
+import pytest
+
+from plugins.model.data_loader import DataLoader
+from plugins.model.upload_decoder import UploadDecoder
+from tests.conftest import HEADER
+
+
+def data_url(content):
+    return 'data:application/octet-stream;base64,' + base64.b64encode(content).decode()
+
+
+@pytest.fixture
+def content(make_lines):
+    return (HEADER + ''.join(make_lines())).encode()
+
+
+@pytest.fixture(params=[8, UploadDecoder.BLOCK_CHARS])
+def block_chars(request, monkeypatch):
+    monkeypatch.setattr(UploadDecoder, 'BLOCK_CHARS', request.param) # Small blocks decode the payload in many pieces
+    return request.param
+
+
+def test_small_upload_is_decoded_in_memory(content, block_chars):
+    decoded = UploadDecoder.decode(data_url(content), spill_bytes=len(content) + 3)
+
+    assert decoded == content
+
+
+def test_large_upload_is_spilled(content, block_chars, tmp_path):
+    path = UploadDecoder.decode(data_url(content), spill_bytes=len(content) // 2, spill_directory=str(tmp_path / 'spill'))
+
+    assert os.path.dirname(path) == str(tmp_path / 'spill')
+    with open(path, 'rb') as file:
+        assert file.read() == content
+
+
+def test_spilled_files_are_unique(content, tmp_path):
+    paths = {UploadDecoder.decode(data_url(content), spill_bytes=0, spill_directory=str(tmp_path)) for _ in range(3)}
+
+    assert len(paths) == 3
+
+
+def test_no_spill_limit_keeps_upload_in_memory(content):
+    assert UploadDecoder.decode(data_url(content), spill_bytes=None) == content
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_spilled_and_in_memory_uploads_load_the_same(content, tmp_path, compress):
+    if compress:
+        content = gzip.compress(content)
+    contents = data_url(content)
+
+    in_memory = DataLoader()
+    in_memory.get_data_from_file(UploadDecoder.decode(contents, spill_bytes=None))
+    spilled = DataLoader()
+    spilled.get_data_from_file(UploadDecoder.decode(contents, spill_bytes=0, spill_directory=str(tmp_path)))
+
+    assert in_memory.get_data().equals(spilled.get_data())
+    assert len(in_memory.get_data()) > 0
+
+
+def test_failed_spill_removes_the_file(content, tmp_path):
+    contents = data_url(content)[:-3] # Truncated payload, its last block cannot be decoded
+
+    with pytest.raises(binascii.Error):
+        UploadDecoder.decode(contents, spill_bytes=0, spill_directory=str(tmp_path))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,39 @@
+import base64
+import os
+
+import pytest
+
+from plugins.controller.upload_staging import UploadStaging
+from plugins.model.heatmap_exception import HeatmapException
+
+
+@pytest.fixture
+def staging(tmp_path):
+    return UploadStaging(None, persistent=False, upload_directory=str(tmp_path / 'uploads'))
+
+
+def test_staged_files_are_found_by_upload_id(staging):
+    upload_id = staging.stage_file('data:text/plain;base64,' + base64.b64encode(b'content').decode())
+
+    assert os.sep not in upload_id
+    with open(staging.staged_file(upload_id), 'rb') as file:
+        assert file.read() == b'content'
+
+
+@pytest.mark.parametrize('upload_id', ['/etc/passwd', '../secret.txt', '..', '.', '', 'missing', None, ['secret.txt']])
+def test_upload_ids_outside_the_upload_directory_are_rejected(staging, tmp_path, upload_id):
+    os.makedirs(staging.upload_directory)
+    (tmp_path / 'secret.txt').write_text('secret')
+
+    with pytest.raises(HeatmapException):
+        staging.staged_file(upload_id)
+    assert (tmp_path / 'secret.txt').exists()
+
+
+def test_links_leading_outside_the_upload_directory_are_rejected(staging, tmp_path):
+    os.makedirs(staging.upload_directory)
+    (tmp_path / 'secret.txt').write_text('secret')
+    os.symlink(tmp_path / 'secret.txt', os.path.join(staging.upload_directory, 'link'))
+
+    with pytest.raises(HeatmapException):
+        staging.staged_file('link')